@@ -0,0 +1,108 @@
+"""
+File table memory benchmark.
+
+Usage (from backend/):
+    python -m benchmarks.file_table [directory] [--files N]
+
+Measures bytes per file of a scan held as one FileInfo model per file
+against the columnar ScanIndex with interned extensions, and the time to
+build each. Without a directory, N synthetic rows are generated so the
+comparison does not depend on the disk.
+"""
+import argparse
+import gc
+import mimetypes
+import os
+import random
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from models.schemas import FileInfo
+from services.scan_index import ScanIndex, build_scan_index
+
+EXTENSIONS = [".jpg", ".png", ".txt", ".pdf", ".docx", ".mp4", ".py", ".json", ""]
+
+
+def _stat(size: int, mtime_ns: int, dev: int, ino: int) -> SimpleNamespace:
+    return SimpleNamespace(st_size=size, st_mtime_ns=mtime_ns, st_dev=dev, st_ino=ino)
+
+
+def _synthetic_rows(count: int):
+    rng = random.Random(0)
+    now = int(time.time() * 1e9)
+    for i in range(count):
+        path = f"/data/projects/p{i % 97}/dir{i % 1009}/file_{i}{rng.choice(EXTENSIONS)}"
+        yield path, _stat(rng.randint(0, 1 << 30), now - rng.randint(0, 10 ** 17), 2049, i)
+
+
+def _file_info(path: str, size: int, mtime_ns: int) -> FileInfo:
+    name = os.path.basename(path)
+    ext = os.path.splitext(name)[1].lower()
+    return FileInfo(
+        path=path,
+        name=name,
+        size=size,
+        extension=ext,
+        last_modified=mtime_ns / 1e9,
+        mime_type=mimetypes.guess_type(path)[0] or "application/octet-stream",
+    )
+
+
+def _measure(label: str, build, count: int) -> None:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    table = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<34} {size / count:8.1f} bytes/file  {count / elapsed:12,.0f} files/s")
+    del table
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", nargs="?")
+    parser.add_argument("--files", type=int, default=500_000, help="synthetic rows (default 500000)")
+    args = parser.parse_args()
+
+    if args.directory:
+        source = build_scan_index(args.directory)
+        rows = [
+            (source.paths[i], _stat(source.sizes[i], source.mtimes_ns[i], source.devices[i], source.inodes[i]))
+            for i in range(len(source))
+        ]
+    else:
+        rows = list(_synthetic_rows(args.files))
+    count = len(rows)
+    if not count:
+        print("No files found")
+        return
+    print(f"{count:,} files")
+
+    def file_infos():
+        # One model per file, with a MIME lookup each
+        return [_file_info(path, st.st_size, st.st_mtime_ns) for path, st in rows]
+
+    def scan_index():
+        index = ScanIndex("/")
+        for path, st in rows:
+            index.append(path, st)
+        return index
+
+    # Path strings are shared by both tables, so they are counted in neither
+    _measure("FileInfo per file", file_infos, count)
+    _measure("ScanIndex columns", scan_index, count)
+
+    index = scan_index()
+    sample = range(0, count, max(1, count // 1000))
+    start = time.perf_counter()
+    for i in sample:
+        index.file_info(i)
+    elapsed = time.perf_counter() - start
+    print(f"{'FileInfo at the API boundary':<34} {len(sample) / elapsed:12,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Image decode throughput benchmark.
+
+Usage (from backend/):
+    python -m benchmarks.image_decode /path/to/photos [--limit N] [--workers N]
+
+Compares full-resolution decoding with JPEG draft-mode decoding, in one
+process and across the decode process pool, and reports images/sec. Also
+reports how far draft-mode pHashes drift from full-decode ones.
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from functools import partial
+
+from services.image_similarity import decode_image_features
+from services.scan_index import FILE_TYPE_IMAGE, build_scan_index
+
+
+def _run(label: str, paths, func, pool=None) -> list:
+    start = time.perf_counter()
+    if pool is not None:
+        results = list(pool.map(func, paths, chunksize=8))
+    else:
+        results = [func(p) for p in paths]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {len(paths) / elapsed:10.1f} images/s  ({elapsed:.2f}s)")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--limit", type=int, default=500, help="images to decode (default 500)")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    index = build_scan_index(args.directory)
+    paths = [index.paths[i] for i in index.rows_of_type(FILE_TYPE_IMAGE)][:args.limit]
+    if not paths:
+        raise SystemExit(f"No images found in {args.directory}")
+    print(f"{len(paths)} images, {args.workers} workers")
+
+    full = partial(decode_image_features, draft=False)
+    draft = partial(decode_image_features, draft=True)
+    full_results = _run("full decode, 1 process", paths, full)
+    draft_results = _run("draft decode, 1 process", paths, draft)
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        pool.submit(int).result()  # Start workers outside the timing
+        _run("full decode, pool", paths, full, pool)
+        _run("draft decode, pool", paths, draft, pool)
+
+    distances = [a.phash - b.phash for a, b in zip(full_results, draft_results) if a and b]
+    if distances:
+        print(f"pHash drift (draft vs full): mean {sum(distances) / len(distances):.2f} bits, max {max(distances)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Text encoder throughput benchmark.
+
+Usage (from backend/):
+    python -m benchmarks.text_encode /path/to/documents [--limit N] [--backends torch,int8,onnx]
+
+Encodes the same documents with each CPU backend, once with fixed-size
+batches in file order and once with token-length-aware batching, and
+reports documents/sec, tokens/sec and padding waste for each.
+"""
+import argparse
+import time
+
+from services.scan_index import FILE_TYPE_TEXT, build_scan_index
+from services.text_encoder import encode_texts, load_model
+from services.text_similarity import read_text_file
+import services.text_encoder as text_encoder
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--limit", type=int, default=1000, help="documents to encode (default 1000)")
+    parser.add_argument("--backends", default="torch,int8")
+    parser.add_argument("--batch-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    index = build_scan_index(args.directory)
+    texts = []
+    for i in index.rows_of_type(FILE_TYPE_TEXT):
+        content = read_text_file(index.paths[i])
+        if content:
+            texts.append(content)
+        if len(texts) >= args.limit:
+            break
+    if not texts:
+        raise SystemExit(f"No text documents found in {args.directory}")
+    print(f"{len(texts)} documents")
+
+    for backend in args.backends.split(","):
+        try:
+            model = load_model(backend)
+        except (ImportError, ValueError) as e:
+            print(f"{backend:<6} unavailable: {e}")
+            continue
+        model.encode(["warm up"], show_progress_bar=False)
+
+        start = time.perf_counter()
+        model.encode(texts, batch_size=32, show_progress_bar=False)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:<6} fixed batches of 32   {len(texts) / elapsed:8.1f} docs/s")
+
+        encode_texts(texts, model=model, token_budget=args.batch_tokens)
+        print(f"{backend:<6} token-aware batching  {text_encoder.last_encode_stats}")
+
+
+if __name__ == "__main__":
+    main()
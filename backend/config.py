@@ -0,0 +1,103 @@
+"""
+Runtime configuration read from environment variables.
+"""
+import os
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Persistent hash cache (SQLite)
+CACHE_ENABLED = _env_bool("DUPFINDER_CACHE_ENABLED", True)
+CACHE_PATH = os.environ.get(
+    "DUPFINDER_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "dupfinder", "cache.sqlite3"),
+)
+CACHE_MAX_BYTES = int(os.environ.get("DUPFINDER_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Directory walk snapshots used by incremental rescans
+SNAPSHOT_DIR = os.environ.get(
+    "DUPFINDER_SNAPSHOT_DIR",
+    os.path.join(os.path.dirname(CACHE_PATH), "snapshots"),
+)
+
+# Seconds a scan index is reused by later requests for the same directory
+SCAN_INDEX_TTL = float(os.environ.get("DUPFINDER_SCAN_INDEX_TTL", "30"))
+
+# Threads listing directories in parallel during a walk (1 walks serially);
+# mostly helps network filesystems, where every listing is a round-trip
+WALK_WORKERS = int(os.environ.get("DUPFINDER_WALK_WORKERS", "8"))
+
+# Default full-content digest: sha256, blake3 or xxh3_128
+HASH_ALGORITHM = os.environ.get("DUPFINDER_HASH_ALGORITHM", "sha256")
+
+# Hashing thread pool and per-device concurrency limits
+HASH_WORKERS = int(os.environ.get("DUPFINDER_HASH_WORKERS", str(min(32, (os.cpu_count() or 1) * 2))))
+HASH_HDD_CONCURRENCY = int(os.environ.get("DUPFINDER_HASH_HDD_CONCURRENCY", "1"))
+HASH_SSD_CONCURRENCY = int(os.environ.get("DUPFINDER_HASH_SSD_CONCURRENCY", "4"))
+HASH_NVME_CONCURRENCY = int(os.environ.get("DUPFINDER_HASH_NVME_CONCURRENCY", "16"))
+
+# Leave blocks a duplicate already shares with another file (reflinks,
+# snapshots; read with FIEMAP on Linux) out of recoverable space
+DETECT_SHARED_EXTENTS = _env_bool("DUPFINDER_DETECT_SHARED_EXTENTS", True)
+
+# Exact duplicate grouping in bounded memory: trees whose bookkeeping would
+# exceed this many MB are grouped by external merge sort, spilling sorted
+# runs to SPILL_DIR (0 keeps grouping in memory; default temp directory)
+GROUPING_MEMORY_BUDGET = int(os.environ.get("DUPFINDER_GROUPING_MEMORY_MB", "0")) * 1024 * 1024
+SPILL_DIR = os.environ.get("DUPFINDER_SPILL_DIR") or None
+
+# Default I/O limits for hashing jobs, overridable per request: read
+# bandwidth and read calls per second (0 for no cap), idle I/O and CPU
+# priority, and dropping each hashed file from the page cache
+IO_BYTES_PER_SEC = int(float(os.environ.get("DUPFINDER_IO_MAX_MBPS", "0")) * 1024 * 1024)
+IO_OPS_PER_SEC = int(os.environ.get("DUPFINDER_IO_MAX_IOPS", "0"))
+IO_IDLE = _env_bool("DUPFINDER_IO_IDLE", False)
+IO_DROP_CACHE = _env_bool("DUPFINDER_IO_DROP_CACHE", False)
+
+# Background scan jobs
+JOB_MAX_CONCURRENT = int(os.environ.get("DUPFINDER_JOB_MAX_CONCURRENT", "2"))
+JOB_MAX_QUEUED = int(os.environ.get("DUPFINDER_JOB_MAX_QUEUED", "32"))
+JOB_HISTORY = int(os.environ.get("DUPFINDER_JOB_HISTORY", "100"))
+# Seconds a finished background job's result is kept
+JOB_RESULT_TTL = float(os.environ.get("DUPFINDER_JOB_RESULT_TTL", "3600"))
+
+# Filesystem watcher: roots kept live from startup (os.pathsep-separated),
+# backend (auto, inotify or poll) and event debouncing in seconds
+WATCH_ROOTS = [p for p in os.environ.get("DUPFINDER_WATCH_ROOTS", "").split(os.pathsep) if p]
+WATCH_BACKEND = os.environ.get("DUPFINDER_WATCH_BACKEND", "auto")
+WATCH_DEBOUNCE = float(os.environ.get("DUPFINDER_WATCH_DEBOUNCE", "2"))
+WATCH_MAX_DELAY = float(os.environ.get("DUPFINDER_WATCH_MAX_DELAY", "30"))
+WATCH_POLL_INTERVAL = float(os.environ.get("DUPFINDER_WATCH_POLL_INTERVAL", "60"))
+
+# Processes decoding images for perceptual hashing (1 decodes in-process)
+IMAGE_WORKERS = int(os.environ.get("DUPFINDER_IMAGE_WORKERS", str(os.cpu_count() or 1)))
+
+# Content-addressed embedding store (memory-mapped matrix plus SQLite index)
+EMBEDDING_STORE_DIR = os.environ.get(
+    "DUPFINDER_EMBEDDING_STORE_DIR",
+    os.path.join(os.path.dirname(CACHE_PATH), "embeddings"),
+)
+EMBEDDING_STORE_MAX_BYTES = int(os.environ.get("DUPFINDER_EMBEDDING_STORE_MAX_MB", "1024")) * 1024 * 1024
+
+# Text encoder: CPU backend (torch, int8 or onnx), load at startup, and
+# batches packed by token count (rows x longest row) up to a row limit
+TEXT_BACKEND = os.environ.get("DUPFINDER_TEXT_BACKEND", "torch")
+TEXT_WARMUP = _env_bool("DUPFINDER_TEXT_WARMUP", True)
+TEXT_BATCH_TOKENS = int(os.environ.get("DUPFINDER_TEXT_BATCH_TOKENS", "16384"))
+TEXT_MAX_BATCH = int(os.environ.get("DUPFINDER_TEXT_MAX_BATCH", "128"))
+
+# Text matching: hybrid (MinHash first, embeddings for the rest), semantic
+# (embeddings only) or lexical (MinHash only, no model needed), and the
+# estimated Jaccard similarity that counts as a lexical match
+TEXT_SIMILARITY_MODE = os.environ.get("DUPFINDER_TEXT_MODE", "hybrid")
+TEXT_LEXICAL_THRESHOLD = float(os.environ.get("DUPFINDER_TEXT_LEXICAL_THRESHOLD", "0.8"))
+
+# Paginated results: how long a cursor stays valid (seconds) and how many
+# paginated queries are kept open at once
+CURSOR_TTL = float(os.environ.get("DUPFINDER_CURSOR_TTL", "600"))
+CURSOR_MAX_OPEN = int(os.environ.get("DUPFINDER_CURSOR_MAX_OPEN", "16"))
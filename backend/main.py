@@ -2,15 +2,46 @@
 AI Smart Duplicate File Finder - Backend
 FastAPI application entry point
 """
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import scan, duplicates, analytics, recommendation
+import config
+from routers import scan, duplicates, analytics, recommendation, jobs, watch
+from services.hash_executor import shutdown_hash_executors
+from services.text_encoder import warm_up
+from services.watcher import start_watching, stop_all
+
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if config.TEXT_WARMUP and config.TEXT_SIMILARITY_MODE != "lexical":
+        try:
+            await asyncio.to_thread(warm_up)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed; text similarity is unavailable")
+        except Exception as e:
+            logger.warning("Text model warm-up failed: %s", e)
+    for root in config.WATCH_ROOTS:
+        try:
+            await start_watching(root)
+        except FileNotFoundError as e:
+            logger.warning("Not watching %s: %s", root, e)
+    yield
+    await stop_all()
+    shutdown_hash_executors()
+
 
 app = FastAPI(
     title="AI Smart Duplicate File Finder",
     description="An AI-powered Storage Intelligence System for finding and managing duplicate files.",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # Allow frontend dev server
@@ -27,6 +58,8 @@ app.include_router(scan.router)
 app.include_router(duplicates.router)
 app.include_router(analytics.router)
 app.include_router(recommendation.router)
+app.include_router(jobs.router)
+app.include_router(watch.router)
 
 
 @app.get("/health")
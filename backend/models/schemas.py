@@ -4,6 +4,19 @@ from typing import List, Optional, Dict, Any
 
 class ScanRequest(BaseModel):
     directory_path: str
+    hash_algorithm: Optional[str] = None
+    verify_hash: bool = False
+    text_mode: Optional[str] = None  # hybrid, semantic or lexical
+    # Exact duplicate hashing limits; unset fields use the configured
+    # defaults and a cap of 0 means no cap
+    io_bytes_per_sec: Optional[int] = None
+    io_ops_per_sec: Optional[int] = None
+    io_idle: Optional[bool] = None  # Idle I/O class and lowest CPU priority
+    io_drop_cache: Optional[bool] = None  # posix_fadvise(DONTNEED) after each file
+
+
+class RescanRequest(ScanRequest):
+    trust_dir_mtime: bool = False
 
 
 class FileInfo(BaseModel):
@@ -21,16 +34,73 @@ class ScanResponse(BaseModel):
     file_summary: List[FileInfo]
 
 
+class ResultQuery(ScanRequest):
+    # Sort keys: files by path, name, size or modified; duplicate groups by
+    # recoverable_space, size, files or similarity. Unsorted by default.
+    sort_by: Optional[str] = None
+    descending: bool = False
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    extensions: Optional[List[str]] = None
+    directory: Optional[str] = None  # Only files under this directory
+    cursor: Optional[str] = None  # next_cursor of the previous page
+    limit: int = 1000
+
+
+class FilePage(BaseModel):
+    total_files: int  # Files matching the filters
+    total_size: int
+    files: List[FileInfo]
+    next_cursor: Optional[str]
+
+
 class DuplicateGroup(BaseModel):
     hash: str
-    files: List[FileInfo]
+    files: List[FileInfo]  # One path per physical copy
+    recoverable_space: int
+    hardlinks: List[FileInfo] = []  # Further paths to the same inodes as files
+
+
+class HardlinkSet(BaseModel):
+    size: int
+    files: List[FileInfo]  # Paths sharing one inode; deleting one frees nothing
+
+
+class RescanResponse(BaseModel):
+    total_files: int
+    total_size: int
+    added: List[FileInfo]
+    removed: List[str]
+    modified: List[FileInfo]
+    full_scan: bool
+    directories_listed: int
+    directories_reused: int
+    changed_duplicate_groups: List[DuplicateGroup]
     recoverable_space: int
+    total_duplicate_files: int
+
+
+class HashStageStats(BaseModel):
+    stage: str
+    candidates: int
+    remaining: int
+    bytes_read: int
+    cache_hits: int = 0
 
 
 class ExactDuplicateResponse(BaseModel):
     duplicate_groups: List[DuplicateGroup]
     recoverable_space: int
     total_duplicate_files: int
+    stage_stats: List[HashStageStats] = []
+    hardlink_sets: List[HardlinkSet] = []
+
+
+class ExactDuplicatePage(BaseModel):
+    total_groups: int  # Groups matching the filters
+    recoverable_space: int
+    duplicate_groups: List[DuplicateGroup]
+    next_cursor: Optional[str]
 
 
 class ImageDuplicateGroup(BaseModel):
@@ -46,11 +116,19 @@ class ImageDuplicateResponse(BaseModel):
     recoverable_space: int
 
 
+class ImageDuplicatePage(BaseModel):
+    total_groups: int  # Groups matching the filters
+    recoverable_space: int
+    duplicate_groups: List[ImageDuplicateGroup]
+    next_cursor: Optional[str]
+
+
 class TextDuplicateGroup(BaseModel):
     representative: FileInfo
     files: List[FileInfo]
     similarity_score: float
     recoverable_space: int
+    match_method: str = "semantic"  # semantic, lexical or mixed
 
 
 class TextDuplicateResponse(BaseModel):
@@ -58,6 +136,13 @@ class TextDuplicateResponse(BaseModel):
     recoverable_space: int
 
 
+class TextDuplicatePage(BaseModel):
+    total_groups: int  # Groups matching the filters
+    recoverable_space: int
+    duplicate_groups: List[TextDuplicateGroup]
+    next_cursor: Optional[str]
+
+
 class RecommendRequest(BaseModel):
     duplicate_group: List[FileInfo]
 
@@ -103,3 +188,67 @@ class CleanModeResponse(BaseModel):
     files_to_delete: List[FileInfo]
     space_freed: int
     simulation: bool = True
+
+
+class BatchRecommendRequest(BaseModel):
+    # Either the groups themselves or the id of a finished duplicate job
+    duplicate_groups: Optional[List[List[FileInfo]]] = None
+    job_id: Optional[str] = None
+
+
+class GroupCleanPlan(BaseModel):
+    recommendation: RecommendationResponse
+    files_to_delete: List[FileInfo]
+    space_freed: int
+
+
+class CleanPlanResponse(BaseModel):
+    groups: List[GroupCleanPlan]
+    files_to_delete: int
+    space_freed: int
+    simulation: bool = True
+
+
+class JobProgressInfo(BaseModel):
+    stage: str
+    files_walked: int
+    files_processed: int
+    files_total: int
+    bytes_hashed: int
+    bytes_total: int
+    throughput: float
+    throughput_unit: str
+    eta_seconds: Optional[float]
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    kind: str
+    directory_path: str
+    status: str
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    progress: JobProgressInfo
+    error: Optional[str]
+
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+
+class WatchRequest(BaseModel):
+    directory_path: str
+
+
+class WatchStatus(BaseModel):
+    directory_path: str
+    backend: str  # inotify, poll or starting
+    ready: bool
+    total_files: int
+    events_seen: int
+    pending_changes: int
+    updates_applied: int
+    last_update: Optional[float]
+    error: Optional[str]
@@ -1,8 +1,9 @@
+import numpy as np
 from fastapi import APIRouter, HTTPException, Query
 from models.schemas import StorageAnalyticsResponse, StoragePredictionResponse, FileTypeDistribution
 from services.storage_predictor import predict_storage_growth, get_disk_usage
-from services.file_scanner import scan_directory
 from services.hash_service import find_exact_duplicates
+from services.scan_index import extension_name, load_scan_index
 from utils.helpers import bytes_to_gb, co2_from_gb
 
 router = APIRouter(prefix="/analytics", tags=["analytics"])
@@ -14,30 +15,31 @@ async def storage_analytics(directory: str = Query(..., description="Directory p
     Return comprehensive storage analytics for the given directory.
     """
     try:
-        scan = await scan_directory(directory)
-        duplicates = await find_exact_duplicates(directory)
-
-        # File type distribution
-        type_map = {}
-        for f in scan.file_summary:
-            ext = f.extension or "no extension"
-            if ext not in type_map:
-                type_map[ext] = {"count": 0, "size": 0}
-            type_map[ext]["count"] += 1
-            type_map[ext]["size"] += f.size
-
-        file_type_distribution = [
-            FileTypeDistribution(type=ext, count=data["count"], size=data["size"])
-            for ext, data in sorted(type_map.items(), key=lambda x: -x[1]["size"])
-        ]
+        # One walk shared by the totals, type distribution and duplicate search
+        index = await load_scan_index(directory)
+        duplicates = await find_exact_duplicates(directory, index=index)
+
+        # File type distribution, tallied over the interned extension ids
+        file_type_distribution = []
+        if len(index):
+            ext_ids = np.frombuffer(index.ext_ids, dtype=np.uint32)
+            counts = np.bincount(ext_ids)
+            sizes = np.bincount(ext_ids, weights=np.frombuffer(index.sizes, dtype=np.int64))
+            for ext_id in np.flatnonzero(counts)[np.argsort(-sizes[counts > 0], kind="stable")]:
+                file_type_distribution.append(FileTypeDistribution(
+                    type=extension_name(int(ext_id)) or "no extension",
+                    count=int(counts[ext_id]),
+                    size=int(sizes[ext_id]),
+                ))
 
         recoverable_gb = bytes_to_gb(duplicates.recoverable_space)
         co2 = co2_from_gb(recoverable_gb)
 
+        total_size = index.total_size
         return StorageAnalyticsResponse(
-            total_storage=scan.total_size,
+            total_storage=total_size,
             duplicate_storage=duplicates.recoverable_space,
-            unique_storage=scan.total_size - duplicates.recoverable_space,
+            unique_storage=total_size - duplicates.recoverable_space,
             file_type_distribution=file_type_distribution,
             co2_saved_kg=round(co2, 4),
             gb_recoverable=round(recoverable_gb, 3),
@@ -1,24 +1,75 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from models.schemas import (
     ScanRequest,
     ExactDuplicateResponse,
     ImageDuplicateResponse,
     TextDuplicateResponse,
+    JobSubmitResponse,
+    ResultQuery,
+    ExactDuplicatePage,
+    ImageDuplicatePage,
+    TextDuplicatePage,
 )
-from services.hash_service import find_exact_duplicates
+from services.hash_service import find_exact_duplicates, find_exact_groups
+from services.io_limits import io_limits
 from services.image_similarity import find_image_duplicates
 from services.text_similarity import find_text_duplicates
+from services.job_manager import JobProgress, JobQueueFull, get_job_manager
+from services.result_pages import CursorExpired, page_groups, stream_groups
+from services.watcher import live_exact_duplicates, live_exact_groups
 
 router = APIRouter(prefix="/duplicates", tags=["duplicates"])
 
 
+def _exact_job(request: ScanRequest, find=find_exact_duplicates):
+    def run(progress: JobProgress):
+        io = io_limits(request.io_bytes_per_sec, request.io_ops_per_sec, request.io_idle, request.io_drop_cache)
+        return find(
+            request.directory_path,
+            algorithm=request.hash_algorithm,
+            verify=request.verify_hash,
+            progress=progress,
+            io=io,
+        )
+    return run
+
+
+def _image_job(request: ScanRequest):
+    def run(progress: JobProgress):
+        return find_image_duplicates(request.directory_path, progress=progress)
+    return run
+
+
+def _text_job(request: ScanRequest):
+    def run(progress: JobProgress):
+        return find_text_duplicates(request.directory_path, progress=progress, mode=request.text_mode)
+    return run
+
+
+def _submit(kind: str, request: ScanRequest, func) -> JobSubmitResponse:
+    try:
+        job = get_job_manager().submit(kind, request.directory_path, func)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitResponse(job_id=job.id, status=job.status)
+
+
 @router.post("/exact", response_model=ExactDuplicateResponse)
 async def exact_duplicates(request: ScanRequest):
-    """Find exact duplicate files using SHA256 hashing."""
+    """Find exact duplicate files using content hashing (SHA256 by default)."""
+    live = await live_exact_duplicates(request.directory_path, request.hash_algorithm, request.verify_hash)
+    if live is not None:
+        return live
     try:
-        return await find_exact_duplicates(request.directory_path)
+        return await get_job_manager().run("exact", request.directory_path, _exact_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error finding duplicates: {str(e)}")
 
@@ -27,7 +78,9 @@ async def exact_duplicates(request: ScanRequest):
 async def image_duplicates(request: ScanRequest):
     """Find near-duplicate images using perceptual hashing."""
     try:
-        return await find_image_duplicates(request.directory_path)
+        return await get_job_manager().run("image", request.directory_path, _image_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -36,10 +89,120 @@ async def image_duplicates(request: ScanRequest):
 
 @router.post("/text", response_model=TextDuplicateResponse)
 async def text_duplicates(request: ScanRequest):
-    """Find similar text documents using sentence embeddings."""
+    """Find similar text documents using MinHash and/or sentence embeddings."""
     try:
-        return await find_text_duplicates(request.directory_path)
+        return await get_job_manager().run("text", request.directory_path, _text_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error finding text duplicates: {str(e)}")
+
+
+@router.post("/exact/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_exact_job(request: ScanRequest):
+    """Start an exact duplicate search in the background."""
+    return _submit("exact", request, _exact_job(request))
+
+
+@router.post("/image/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_image_job(request: ScanRequest):
+    """Start a near-duplicate image search in the background."""
+    return _submit("image", request, _image_job(request))
+
+
+@router.post("/text/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_text_job(request: ScanRequest):
+    """Start a similar text document search in the background."""
+    return _submit("text", request, _text_job(request))
+
+
+async def _find_groups(kind: str, query: ResultQuery):
+    """Groups to page or stream: ExactGroups rows for exact, models otherwise."""
+    if kind == "exact":
+        live = await live_exact_groups(query.directory_path, query.hash_algorithm, query.verify_hash)
+        if live is not None:
+            return live
+        return await get_job_manager().run(kind, query.directory_path, _exact_job(query, find_exact_groups))
+    jobs = {"image": _image_job, "text": _text_job}
+    result = await get_job_manager().run(kind, query.directory_path, jobs[kind](query))
+    return result.duplicate_groups
+
+
+async def _page(kind: str, query: ResultQuery, page_model):
+    try:
+        groups = None if query.cursor else await _find_groups(kind, query)
+        page, total, recoverable, next_cursor = await asyncio.to_thread(page_groups, kind, groups, query)
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding duplicates: {str(e)}")
+    return page_model(
+        total_groups=total,
+        recoverable_space=recoverable,
+        duplicate_groups=page,
+        next_cursor=next_cursor,
+    )
+
+
+async def _stream(kind: str, query: ResultQuery) -> StreamingResponse:
+    try:
+        groups = await _find_groups(kind, query)
+        lines = stream_groups(groups, query)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding duplicates: {str(e)}")
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.post("/exact/page", response_model=ExactDuplicatePage)
+async def exact_duplicates_page(query: ResultQuery):
+    """
+    One page of exact duplicate groups, filtered and sorted on the server.
+    Pass next_cursor back as cursor for the following page.
+    """
+    return await _page("exact", query, ExactDuplicatePage)
+
+
+@router.post("/image/page", response_model=ImageDuplicatePage)
+async def image_duplicates_page(query: ResultQuery):
+    """One page of near-duplicate image groups."""
+    return await _page("image", query, ImageDuplicatePage)
+
+
+@router.post("/text/page", response_model=TextDuplicatePage)
+async def text_duplicates_page(query: ResultQuery):
+    """One page of similar text document groups."""
+    return await _page("text", query, TextDuplicatePage)
+
+
+@router.post("/exact/stream")
+async def exact_duplicates_stream(query: ResultQuery):
+    """Stream exact duplicate groups as NDJSON, one group per line."""
+    return await _stream("exact", query)
+
+
+@router.post("/image/stream")
+async def image_duplicates_stream(query: ResultQuery):
+    """Stream near-duplicate image groups as NDJSON, one group per line."""
+    return await _stream("image", query)
+
+
+@router.post("/text/stream")
+async def text_duplicates_stream(query: ResultQuery):
+    """Stream similar text document groups as NDJSON, one group per line."""
+    return await _stream("text", query)
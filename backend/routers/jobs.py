@@ -0,0 +1,56 @@
+from typing import List
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
+from models.schemas import JobStatus
+from services.job_manager import JOB_COMPLETED, JOB_FAILED, Job, get_job_manager
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+def _get_job(job_id: str) -> Job:
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.get("", response_model=List[JobStatus])
+async def list_jobs():
+    """List queued, running and recently finished jobs."""
+    return [job.snapshot() for job in get_job_manager().list()]
+
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def job_status(job_id: str):
+    """Return a job's status, progress, throughput and ETA."""
+    return _get_job(job_id).snapshot()
+
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str):
+    """Return the result of a completed job."""
+    job = _get_job(job_id)
+    if job.status == JOB_FAILED:
+        raise HTTPException(status_code=500, detail=f"Job failed: {job.error}")
+    if job.status != JOB_COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result
+
+
+@router.get("/{job_id}/events")
+async def job_events(job_id: str):
+    """Stream job status as Server-Sent Events until the job finishes."""
+    job = _get_job(job_id)
+
+    async def stream():
+        async for status in get_job_manager().events(job):
+            yield f"event: progress\ndata: {status.model_dump_json()}\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@router.delete("/{job_id}", response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    _get_job(job_id)
+    return get_job_manager().cancel(job_id).snapshot()
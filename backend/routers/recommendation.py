@@ -1,6 +1,14 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
-from models.schemas import RecommendRequest, RecommendationResponse, CleanModeResponse
-from services.recommendation_engine import compute_recommendation
+from models.schemas import (
+    RecommendRequest,
+    RecommendationResponse,
+    CleanModeResponse,
+    BatchRecommendRequest,
+    CleanPlanResponse,
+)
+from services.job_manager import JOB_COMPLETED, get_job_manager
+from services.recommendation_engine import build_clean_plan, compute_recommendation
 
 router = APIRouter(prefix="/recommend", tags=["recommendation"])
 
@@ -38,3 +46,33 @@ async def smart_clean(request: RecommendRequest):
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Clean mode failed: {str(e)}")
+
+
+@router.post("/batch", response_model=CleanPlanResponse)
+async def recommend_batch(request: BatchRecommendRequest):
+    """
+    Recommend a file to keep in every duplicate group at once and return
+    the complete clean plan. Pass the groups, or the job_id of a finished
+    exact, image or text duplicate job.
+    This is a SIMULATION ONLY - no files are actually deleted.
+    """
+    if request.job_id is not None:
+        job = get_job_manager().get(request.job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job not found: {request.job_id}")
+        if job.status != JOB_COMPLETED:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        if not hasattr(job.result, "duplicate_groups"):
+            raise HTTPException(status_code=400, detail=f"Job {request.job_id} is not a duplicate search")
+        groups = [g.files for g in job.result.duplicate_groups]
+    elif request.duplicate_groups is not None:
+        groups = request.duplicate_groups
+    else:
+        raise HTTPException(status_code=400, detail="Provide duplicate_groups or job_id")
+    groups = [g for g in groups if len(g) >= 2]
+    if not groups:
+        return CleanPlanResponse(groups=[], files_to_delete=0, space_freed=0)
+    try:
+        return await asyncio.to_thread(build_clean_plan, groups)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Clean plan failed: {str(e)}")
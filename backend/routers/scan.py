@@ -1,18 +1,52 @@
+import asyncio
 from fastapi import APIRouter, HTTPException
-from models.schemas import ScanRequest, ScanResponse
-from services.file_scanner import scan_directory
+from fastapi.responses import StreamingResponse
+from models.schemas import (
+    ScanRequest,
+    ScanResponse,
+    RescanRequest,
+    RescanResponse,
+    JobSubmitResponse,
+    ResultQuery,
+    FilePage,
+)
+from services.file_scanner import rescan_directory, scan_directory
+from services.io_limits import io_limits
+from services.job_manager import JobProgress, JobQueueFull, get_job_manager
+from services.result_pages import CursorExpired, page_files, stream_files
+from services.scan_index import load_scan_index
 
 router = APIRouter(prefix="/scan", tags=["scan"])
 
 
+def _scan_job(request: ScanRequest):
+    def run(progress: JobProgress):
+        return scan_directory(request.directory_path, progress=progress)
+    return run
+
+
+def _rescan_job(request: RescanRequest):
+    def run(progress: JobProgress):
+        io = io_limits(request.io_bytes_per_sec, request.io_ops_per_sec, request.io_idle, request.io_drop_cache)
+        return rescan_directory(
+            request.directory_path,
+            trust_dir_mtime=request.trust_dir_mtime,
+            algorithm=request.hash_algorithm,
+            progress=progress,
+            io=io,
+        )
+    return run
+
+
 @router.post("", response_model=ScanResponse)
 async def scan_endpoint(request: ScanRequest):
     """
     Recursively scan a directory and return file metadata summary.
     """
     try:
-        result = await scan_directory(request.directory_path)
-        return result
+        return await get_job_manager().run("scan", request.directory_path, _scan_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except NotADirectoryError as e:
@@ -21,3 +55,96 @@ async def scan_endpoint(request: ScanRequest):
         raise HTTPException(status_code=403, detail="Permission denied accessing directory")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scan failed: {str(e)}")
+
+
+def _page_job(query: ResultQuery):
+    async def run(progress: JobProgress):
+        index = await load_scan_index(query.directory_path, progress)
+        return await asyncio.to_thread(page_files, index, query)
+    return run
+
+
+@router.post("/page", response_model=FilePage)
+async def scan_page(query: ResultQuery):
+    """
+    Return one page of a directory's files, filtered and sorted on the
+    server. Pass next_cursor back as cursor for the following page; later
+    pages come from the same scan as the first.
+    """
+    try:
+        if query.cursor:
+            page = await asyncio.to_thread(page_files, None, query)
+        else:
+            page = await get_job_manager().run("scan", query.directory_path, _page_job(query))
+    except CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (NotADirectoryError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Permission denied accessing directory")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Scan failed: {str(e)}")
+    files, total_files, total_size, next_cursor = page
+    return FilePage(total_files=total_files, total_size=total_size, files=files, next_cursor=next_cursor)
+
+
+@router.post("/stream")
+async def scan_stream(query: ResultQuery):
+    """
+    Stream a directory's files as NDJSON, one FileInfo per line. Without
+    sort_by, records are sent while the directory is still being walked.
+    """
+    try:
+        lines = await asyncio.to_thread(stream_files, query)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Permission denied accessing directory")
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
+@router.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_scan_job(request: ScanRequest):
+    """Start a scan in the background; poll /jobs/{job_id} for progress."""
+    try:
+        job = get_job_manager().submit("scan", request.directory_path, _scan_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitResponse(job_id=job.id, status=job.status)
+
+
+@router.post("/rescan", response_model=RescanResponse)
+async def rescan_endpoint(request: RescanRequest):
+    """
+    Incrementally rescan a directory against its last snapshot.
+    Returns only added, removed and modified files plus the duplicate
+    groups whose file sizes changed.
+    """
+    try:
+        return await get_job_manager().run("rescan", request.directory_path, _rescan_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Permission denied accessing directory")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rescan failed: {str(e)}")
+
+
+@router.post("/rescan/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_rescan_job(request: RescanRequest):
+    """Start an incremental rescan in the background."""
+    try:
+        job = get_job_manager().submit("rescan", request.directory_path, _rescan_job(request))
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return JobSubmitResponse(job_id=job.id, status=job.status)
@@ -0,0 +1,31 @@
+from typing import List
+from fastapi import APIRouter, HTTPException
+from models.schemas import WatchRequest, WatchStatus
+from services.watcher import list_watchers, start_watching, stop_watching
+
+router = APIRouter(prefix="/watch", tags=["watch"])
+
+
+@router.get("", response_model=List[WatchStatus])
+async def watched_directories():
+    """List watched directories and how current their duplicate groups are."""
+    return [watcher.status() for watcher in list_watchers()]
+
+
+@router.post("", response_model=WatchStatus)
+async def watch_directory(request: WatchRequest):
+    """Keep a directory's exact duplicate groups live as files change."""
+    try:
+        watcher = await start_watching(request.directory_path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return watcher.status()
+
+
+@router.delete("", response_model=WatchStatus)
+async def unwatch_directory(request: WatchRequest):
+    """Stop watching a directory."""
+    watcher = await stop_watching(request.directory_path)
+    if watcher is None:
+        raise HTTPException(status_code=404, detail=f"Not watched: {request.directory_path}")
+    return watcher.status()
@@ -0,0 +1,175 @@
+import asyncio
+from typing import Dict, List, Optional, Set, Tuple
+
+import config
+from models.schemas import DuplicateGroup, ExactDuplicateResponse, HardlinkSet
+from services.io_limits import IOLimits
+from services.hash_service import (
+    ExactGroups,
+    find_hardlink_sets,
+    group_by_size,
+    hash_size_groups,
+    new_hasher,
+    recoverable_bytes,
+    split_links,
+)
+from services.job_manager import JobProgress
+from services.scan_index import ScanIndex
+from services.scan_snapshot import ScanDiff
+
+
+# (scan index, size -> [(hash, paths, recoverable bytes, physical copies)],
+#  every file with more than one path)
+_Generation = Tuple[Optional[ScanIndex], Dict[int, List[Tuple[str, List[str], int, int]]], List[HardlinkSet]]
+
+
+class DuplicateIndex:
+    """
+    Exact duplicate groups for one tree, kept per file size so that a change
+    only re-evaluates the size buckets it touches. Each update builds a new
+    generation aside and publishes it with one assignment, so readers on
+    other threads always see a complete, consistent set of groups.
+    """
+
+    def __init__(self, root: str, algorithm: str):
+        self.root = root
+        self.algorithm = algorithm
+        self._generation: _Generation = (None, {}, [])
+
+    @property
+    def index(self) -> Optional[ScanIndex]:
+        return self._generation[0]
+
+    @property
+    def groups_by_size(self) -> Dict[int, List[Tuple[str, List[str], int, int]]]:
+        return self._generation[1]
+
+    @property
+    def hardlink_sets(self) -> List[HardlinkSet]:
+        return self._generation[2]
+
+    async def _rehash(
+        self,
+        index: ScanIndex,
+        sizes: Set[int],
+        size_map: Dict[int, List[int]],
+        progress: Optional[JobProgress] = None,
+        base: Optional[Dict[int, List[Tuple[str, List[str], int, int]]]] = None,
+        io: Optional[IOLimits] = None,
+    ) -> None:
+        size_groups = [size_map[s] for s in sizes if len(size_map.get(s, ())) >= 2]
+        hash_groups, _ = await hash_size_groups(index, size_groups, self.algorithm, progress=progress, io=io)
+
+        def _build() -> _Generation:
+            groups_by_size = {s: entries for s, entries in (base or {}).items() if s not in sizes}
+            # Recoverable space reads extent maps, so it is measured here once
+            for hash_val, rows in hash_groups:
+                inodes = split_links(index, rows)
+                groups_by_size.setdefault(index.sizes[rows[0]], []).append(
+                    (hash_val, [index.paths[i] for i in rows], recoverable_bytes(index, inodes), len(inodes))
+                )
+            return index, groups_by_size, find_hardlink_sets(index, size_map)
+
+        self._generation = await asyncio.to_thread(_build)
+
+    async def rebuild(
+        self,
+        index: ScanIndex,
+        progress: Optional[JobProgress] = None,
+        io: Optional[IOLimits] = None,
+    ) -> None:
+        """Compute every group from scratch (hashes still come from the cache)."""
+        size_map = await asyncio.to_thread(group_by_size, index)
+        await self._rehash(index, set(size_map), size_map, progress, io=io)
+
+    async def update(
+        self,
+        previous: ScanIndex,
+        index: ScanIndex,
+        diff: ScanDiff,
+        progress: Optional[JobProgress] = None,
+        io: Optional[IOLimits] = None,
+    ) -> List[int]:
+        """
+        Apply a rescan diff, re-evaluating only the size buckets that gained,
+        lost or changed a file, with io limiting the reads. Returns the
+        affected sizes.
+        """
+        sizes: Set[int] = set()
+        sizes.update(index.sizes[j] for j in diff.added)
+        sizes.update(previous.sizes[i] for i in diff.removed)
+        for i, j in diff.modified:
+            sizes.add(previous.sizes[i])
+            sizes.add(index.sizes[j])
+        sizes.discard(0)
+        if not sizes:
+            _, groups_by_size, hardlink_sets = self._generation
+            self._generation = (index, groups_by_size, hardlink_sets)
+            return []
+        size_map = await asyncio.to_thread(group_by_size, index)
+        await self._rehash(index, sizes, size_map, progress, base=self.groups_by_size, io=io)
+        return sorted(sizes)
+
+    def groups(self, sizes: Optional[List[int]] = None) -> List[DuplicateGroup]:
+        """Current groups as models, optionally limited to some sizes."""
+        exact_groups = self._exact_groups(self._generation, sizes)
+        return exact_groups.groups() if exact_groups is not None else []
+
+    def exact_groups(self) -> Optional[ExactGroups]:
+        """Every current group, with the hardlink sets of the same generation."""
+        return self._exact_groups(self._generation)
+
+    @staticmethod
+    def _exact_groups(generation: _Generation, sizes: Optional[List[int]] = None) -> Optional[ExactGroups]:
+        index, groups_by_size, hardlink_sets = generation
+        if index is None:
+            return None
+        selected = groups_by_size if sizes is None else {
+            s: groups_by_size[s] for s in sizes if s in groups_by_size
+        }
+        hash_groups = []
+        recoverable = []
+        for entries in selected.values():
+            for hash_val, paths, group_recoverable, _ in entries:
+                rows = [index.row_of(p) for p in paths]
+                rows = [r for r in rows if r is not None]
+                if len(rows) >= 2:
+                    hash_groups.append((hash_val, rows))
+                    recoverable.append(group_recoverable)
+        return ExactGroups(index, hash_groups, recoverable, hardlink_sets if sizes is None else None)
+
+    def totals(self) -> Tuple[int, int]:
+        """(recoverable bytes, duplicate file count) across all groups."""
+        recoverable = 0
+        duplicates = 0
+        for entries in self.groups_by_size.values():
+            for _, _, group_recoverable, copies in entries:
+                recoverable += group_recoverable
+                duplicates += copies - 1
+        return recoverable, duplicates
+
+    def response(self) -> ExactDuplicateResponse:
+        exact_groups = self.exact_groups()
+        if exact_groups is None:
+            return ExactDuplicateResponse(duplicate_groups=[], recoverable_space=0, total_duplicate_files=0)
+        return exact_groups.response()
+
+
+# Duplicate indexes kept up to date by rescans, by root directory. Watchers
+# update their own, so a rescan and a watcher never apply diffs to one index.
+_duplicate_indexes: Dict[str, DuplicateIndex] = {}
+
+
+def ensure_duplicate_index(root: str, algorithm: Optional[str] = None) -> Tuple[DuplicateIndex, bool]:
+    """
+    Return the duplicate index for root, creating an empty one if needed or
+    if the requested algorithm differs. The flag is True for a new index.
+    """
+    algorithm = algorithm or config.HASH_ALGORITHM
+    new_hasher(algorithm)
+    dup_index = _duplicate_indexes.get(root)
+    if dup_index is not None and dup_index.algorithm == algorithm and dup_index.index is not None:
+        return dup_index, False
+    dup_index = DuplicateIndex(root, algorithm)
+    _duplicate_indexes[root] = dup_index
+    return dup_index, True
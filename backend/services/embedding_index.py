@@ -0,0 +1,64 @@
+from typing import Iterator, Tuple
+
+import numpy as np
+
+# Peak size of one block of the similarity matrix
+BLOCK_BYTES = 64 * 1024 * 1024
+# Neighbours kept per document; union-find links the rest transitively
+TOP_K = 32
+
+
+def normalize(embeddings: np.ndarray) -> np.ndarray:
+    """Return float32 rows scaled to unit length (zero rows stay zero)."""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+
+def similar_pairs(
+    embeddings: np.ndarray,
+    threshold: float,
+    top_k: int = TOP_K,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """
+    Yield (i, j, similarity) arrays, i < j, for each row's top_k most
+    similar rows with cosine similarity >= threshold. Rows must be unit
+    length. A pair may be yielded twice. The similarity matrix is computed
+    one block of rows at a time, so memory stays around BLOCK_BYTES however
+    many documents there are.
+    """
+    n = len(embeddings)
+    if n < 2:
+        return
+    # float32 similarities, the hit mask and argpartition output per entry
+    block_rows = max(1, min(n, BLOCK_BYTES // (13 * n)))
+    for start in range(0, n, block_rows):
+        stop = min(start + block_rows, n)
+        sims = embeddings[start:stop] @ embeddings.T
+        rows = np.arange(stop - start)
+        sims[rows, rows + start] = -np.inf  # Ignore self-similarity
+        hits = sims >= threshold
+        # Only rows with more than top_k hits need ranking
+        crowded = np.flatnonzero(hits.sum(axis=1) > top_k)
+        if len(crowded):
+            cols = np.argpartition(sims[crowded], -top_k, axis=1)[:, -top_k:]
+            values = np.take_along_axis(sims[crowded], cols, axis=1)
+            keep = values >= threshold
+            i = np.broadcast_to(crowded[:, None] + start, cols.shape)[keep]
+            j = cols[keep]
+            yield np.minimum(i, j), np.maximum(i, j), values[keep]
+            hits[crowded] = False
+        r, j = np.nonzero(hits)
+        i = r + start
+        yield np.minimum(i, j), np.maximum(i, j), sims[r, j]
+
+
+def mean_pairwise_similarity(embeddings: np.ndarray) -> float:
+    """Average cosine similarity over all pairs of unit-length rows, in O(n·d)."""
+    n = len(embeddings)
+    if n < 2:
+        return 1.0
+    total = embeddings.sum(axis=0, dtype=np.float64)
+    # |sum|^2 counts every ordered pair plus n self-similarities of 1
+    return float((total @ total - n) / (n * (n - 1)))
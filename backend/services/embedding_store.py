@@ -0,0 +1,226 @@
+import glob
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+import config
+
+# Vectors are stored at half precision; cosine similarity barely notices
+STORE_DTYPE = np.float16
+DIGEST_SIZE = 16
+# Only refresh an entry's access time when it is older than this (seconds)
+TOUCH_INTERVAL = 86400
+# Compact down to this fraction of max_bytes once the limit is exceeded
+EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    digest BLOB PRIMARY KEY,
+    row INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS vectors_accessed ON vectors (accessed);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+
+def content_digest(text: str) -> bytes:
+    """Content address of a document's text as passed to the encoder."""
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=DIGEST_SIZE).digest()
+
+
+class EmbeddingStore:
+    """
+    Embeddings keyed by the content digest of the encoded text, so unchanged
+    and byte-identical documents are encoded once, wherever they live.
+
+    Vectors are appended to a flat matrix file read through np.memmap; a
+    SQLite index maps digests to rows. Compaction rewrites the matrix with
+    only the recently used rows into a new generation file, so a crash
+    midway leaves the previous generation intact.
+    """
+
+    def __init__(self, directory: str, name: str, max_bytes: int):
+        self.directory = directory
+        self.name = re.sub(r"[^A-Za-z0-9_.-]", "_", name)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(
+            os.path.join(directory, f"{self.name}.sqlite3"), check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.dim: Optional[int] = self._meta("dim")
+        self.generation: int = self._meta("generation") or 0
+        self._matrix: Optional[np.memmap] = None
+        self._remove_stale_generations()
+
+    def _meta(self, key: str):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def _matrix_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"{self.name}.{generation}.f16")
+
+    def _remove_stale_generations(self) -> None:
+        current = self._matrix_path(self.generation)
+        for path in glob.glob(os.path.join(glob.escape(self.directory), f"{glob.escape(self.name)}.*.f16")):
+            if path != current:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _rows_on_disk(self) -> int:
+        if not self.dim:
+            return 0
+        try:
+            nbytes = os.path.getsize(self._matrix_path(self.generation))
+        except FileNotFoundError:
+            return 0
+        return nbytes // (self.dim * np.dtype(STORE_DTYPE).itemsize)
+
+    def _view(self, rows_needed: int) -> np.memmap:
+        """Map the matrix file, remapping when it has grown past the current view."""
+        if self._matrix is None or len(self._matrix) < rows_needed:
+            rows = self._rows_on_disk()
+            self._matrix = np.memmap(
+                self._matrix_path(self.generation), dtype=STORE_DTYPE, mode="r", shape=(rows, self.dim)
+            )
+        return self._matrix
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+
+    def get_many(self, digests: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return float32 vectors for the digests that are stored."""
+        found: Dict[bytes, np.ndarray] = {}
+        if not digests or not self.dim:
+            return found
+        now = time.time()
+        with self._lock:
+            rows: Dict[bytes, int] = {}
+            stale: List[bytes] = []
+            for start in range(0, len(digests), 500):
+                chunk = digests[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                for digest, row, accessed in self._conn.execute(
+                    f"SELECT digest, row, accessed FROM vectors WHERE digest IN ({marks})", chunk
+                ):
+                    rows[digest] = row
+                    if now - accessed > TOUCH_INTERVAL:
+                        stale.append(digest)
+            if rows:
+                matrix = self._view(max(rows.values()) + 1)
+                for digest, row in rows.items():
+                    found[digest] = np.asarray(matrix[row], dtype=np.float32)
+            if stale:
+                self._conn.executemany(
+                    "UPDATE vectors SET accessed = ? WHERE digest = ?", [(now, d) for d in stale]
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, digests: List[bytes], vectors: np.ndarray) -> None:
+        """Append vectors for new digests; digests already stored are skipped."""
+        if not digests:
+            return
+        vectors = np.asarray(vectors)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._set_meta("dim", self.dim)
+                self._set_meta("generation", self.generation)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match store size {self.dim}")
+            new = {}
+            for digest, vector in zip(digests, vectors):
+                if digest not in new and self._conn.execute(
+                    "SELECT 1 FROM vectors WHERE digest = ?", (digest,)
+                ).fetchone() is None:
+                    new[digest] = vector
+            if not new:
+                return
+            # Rows past the indexed ones may be left over from a crash; append after them
+            first_row = self._rows_on_disk()
+            with open(self._matrix_path(self.generation), "ab") as f:
+                f.write(np.asarray(list(new.values()), dtype=STORE_DTYPE).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO vectors (digest, row, accessed) VALUES (?, ?, ?)",
+                [(digest, first_row + k, now) for k, digest in enumerate(new)],
+            )
+            self._conn.commit()
+            over_budget = (first_row + len(new)) * self.dim * np.dtype(STORE_DTYPE).itemsize > self.max_bytes
+        if over_budget:
+            self.compact(int(self.max_bytes * EVICT_TARGET))
+
+    def compact(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Rewrite the matrix without unindexed rows, keeping only the most
+        recently used vectors that fit in max_bytes. Returns rows kept.
+        """
+        with self._lock:
+            if not self.dim:
+                return 0
+            row_bytes = self.dim * np.dtype(STORE_DTYPE).itemsize
+            limit = -1 if max_bytes is None else max_bytes // row_bytes
+            keep = self._conn.execute(
+                "SELECT digest, row, accessed FROM vectors ORDER BY accessed DESC LIMIT ?", (limit,)
+            ).fetchall()
+            keep.sort(key=lambda entry: entry[1])
+            generation = self.generation + 1
+            with open(self._matrix_path(generation), "wb") as f:
+                if keep:
+                    matrix = self._view(keep[-1][1] + 1)
+                    for start in range(0, len(keep), 4096):
+                        rows = [entry[1] for entry in keep[start:start + 4096]]
+                        f.write(np.ascontiguousarray(matrix[rows]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            # Swap the index over to the new generation in one transaction
+            self._conn.execute("DELETE FROM vectors")
+            self._conn.executemany(
+                "INSERT INTO vectors (digest, row, accessed) VALUES (?, ?, ?)",
+                [(digest, new_row, accessed) for new_row, (digest, _, accessed) in enumerate(keep)],
+            )
+            self._set_meta("generation", generation)
+            self._conn.commit()
+            self.generation = generation
+            self._matrix = None
+            self._remove_stale_generations()
+            return len(keep)
+
+
+# Lazy singletons, one per model
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_embedding_store(model_name: str) -> Optional[EmbeddingStore]:
+    """Return the store for model_name, or None when caching is disabled."""
+    if not config.CACHE_ENABLED:
+        return None
+    with _stores_lock:
+        store = _stores.get(model_name)
+        if store is None:
+            store = EmbeddingStore(config.EMBEDDING_STORE_DIR, model_name, config.EMBEDDING_STORE_MAX_BYTES)
+            _stores[model_name] = store
+    return store
@@ -0,0 +1,52 @@
+import struct
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Linux FIEMAP ioctl: _IOWR('f', 11, struct fiemap)
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_EXTENT_LAST = 0x1
+# The extent's blocks are also referenced by another file or a snapshot
+FIEMAP_EXTENT_SHARED = 0x2000
+
+# struct fiemap header and struct fiemap_extent
+_FIEMAP = struct.Struct("=QQIIII")
+_EXTENT = struct.Struct("=QQQQQIIII")
+# Extents requested per ioctl call
+EXTENTS_PER_CALL = 128
+
+
+def shared_extent_bytes(path: str, size: int) -> int:
+    """
+    Bytes of path's first size bytes that live in extents shared with
+    another file (reflink copies, filesystem snapshots). Deleting the file
+    does not free those blocks. Returns 0 where extent maps cannot be read:
+    non-Linux systems and filesystems without FIEMAP support.
+    """
+    if fcntl is None or size <= 0:
+        return 0
+    shared = 0
+    start = 0
+    buf = bytearray(_FIEMAP.size + EXTENTS_PER_CALL * _EXTENT.size)
+    try:
+        with open(path, "rb") as f:
+            while start < size:
+                _FIEMAP.pack_into(buf, 0, start, size - start, 0, 0, EXTENTS_PER_CALL, 0)
+                fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, buf)
+                mapped = _FIEMAP.unpack_from(buf, 0)[3]
+                if not mapped:
+                    break
+                for k in range(mapped):
+                    fields = _EXTENT.unpack_from(buf, _FIEMAP.size + k * _EXTENT.size)
+                    logical, length, flags = fields[0], fields[2], fields[5]
+                    end = min(logical + length, size)
+                    if flags & FIEMAP_EXTENT_SHARED and end > logical:
+                        shared += end - logical
+                    start = logical + length
+                    if flags & FIEMAP_EXTENT_LAST:
+                        return shared
+    except OSError:
+        return 0
+    return min(shared, size)
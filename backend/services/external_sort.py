@@ -0,0 +1,128 @@
+import heapq
+import os
+import tempfile
+from operator import itemgetter
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Smallest buffer a sorter is given, whatever its budget
+MIN_BUFFER_RECORDS = 4096
+
+
+class ExternalSorter:
+    """
+    Sort fixed-size records (a numpy structured dtype) within a memory
+    budget. Records are buffered until the budget is reached, then sorted
+    and spilled to a run file in temp_dir; iteration merges the runs, reading
+    each in slices, so memory stays bounded however many records are added.
+    Run files are removed by close(), or on leaving a with block.
+    """
+
+    def __init__(self, dtype, order: Sequence[str], memory_budget: int, temp_dir: Optional[str] = None):
+        self.dtype = np.dtype(dtype)
+        self.order = list(order)
+        self.buffer_records = max(MIN_BUFFER_RECORDS, memory_budget // self.dtype.itemsize)
+        self.temp_dir = temp_dir
+        self.count = 0
+        self._buffer: List[np.ndarray] = []
+        self._buffered = 0
+        self._pending: List[tuple] = []
+        self._runs: List[str] = []
+        self._key = itemgetter(*[self.dtype.names.index(name) for name in self.order])
+
+    def __enter__(self) -> "ExternalSorter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def add(self, records: np.ndarray) -> None:
+        """Add an array of records."""
+        self.count += len(records)
+        self._add(records)
+
+    def _add(self, records: np.ndarray) -> None:
+        if not len(records):
+            return
+        self._buffer.append(records)
+        self._buffered += len(records)
+        if self._buffered >= self.buffer_records:
+            self._spill()
+
+    def append(self, record: tuple) -> None:
+        """Add one record given as a tuple of field values."""
+        self._pending.append(record)
+        self.count += 1
+        if len(self._pending) >= MIN_BUFFER_RECORDS:
+            self._flush_pending()
+
+    def extend(self, records: Iterable[tuple]) -> None:
+        for record in records:
+            self.append(record)
+
+    def _flush_pending(self) -> None:
+        if self._pending:
+            records = np.array(self._pending, dtype=self.dtype)
+            self._pending = []
+            self._add(records)
+
+    def _take_sorted(self) -> np.ndarray:
+        data = np.concatenate(self._buffer) if self._buffer else np.empty(0, dtype=self.dtype)
+        self._buffer = []
+        self._buffered = 0
+        return np.sort(data, order=self.order, kind="stable")
+
+    def _spill(self) -> None:
+        data = self._take_sorted()
+        fd, path = tempfile.mkstemp(prefix="dupfinder-run-", suffix=".bin", dir=self.temp_dir)
+        self._runs.append(path)
+        with os.fdopen(fd, "wb") as f:
+            data.tofile(f)
+
+    def _read_run(self, path: str, slice_records: int) -> Iterator[tuple]:
+        with open(path, "rb") as f:
+            while True:
+                chunk = np.fromfile(f, dtype=self.dtype, count=slice_records)
+                if not len(chunk):
+                    return
+                yield from chunk.tolist()
+
+    def __iter__(self) -> Iterator[tuple]:
+        """Every record in sort order, as tuples. Iterate once."""
+        self._flush_pending()
+        if not self._runs:
+            data = self._take_sorted()
+            for start in range(0, len(data), MIN_BUFFER_RECORDS):
+                yield from data[start:start + MIN_BUFFER_RECORDS].tolist()
+            return
+        if self._buffer:
+            self._spill()
+        # The budget is shared by one read slice per run
+        slice_records = max(MIN_BUFFER_RECORDS, self.buffer_records // len(self._runs))
+        yield from heapq.merge(*(self._read_run(path, slice_records) for path in self._runs), key=self._key)
+
+    def chunks(self, size: int) -> Iterator[np.ndarray]:
+        """Records in sort order, as arrays of up to size records."""
+        batch: List[tuple] = []
+        for record in self:
+            batch.append(record)
+            if len(batch) >= size:
+                yield np.array(batch, dtype=self.dtype)
+                batch = []
+        if batch:
+            yield np.array(batch, dtype=self.dtype)
+
+    @property
+    def spilled(self) -> bool:
+        return bool(self._runs)
+
+    def close(self) -> None:
+        self._buffer = []
+        self._pending = []
+        for path in self._runs:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self._runs = []
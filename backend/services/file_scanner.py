@@ -1,37 +1,79 @@
-import os
+import asyncio
 from typing import List, Optional
-from models.schemas import FileInfo, ScanResponse
-from utils.helpers import get_file_info
+from models.schemas import FileInfo, ScanResponse, RescanResponse
+from services.duplicate_index import ensure_duplicate_index
+from services.io_limits import IOLimits
+from services.job_manager import JobProgress
+from services.scan_index import ScanIndex, load_scan_index, register_scan_index
+from services.scan_snapshot import diff_indexes, incremental_scan, save_snapshot
 
 
-async def scan_directory(directory_path: str) -> ScanResponse:
+def _build_scan_response(index: ScanIndex) -> ScanResponse:
+    files: List[FileInfo] = [index.file_info(i) for i in range(len(index))]
+    return ScanResponse(
+        total_files=len(files),
+        total_size=index.total_size,
+        file_summary=files,
+    )
+
+
+async def scan_directory(
+    directory_path: str,
+    index: Optional[ScanIndex] = None,
+    progress: Optional[JobProgress] = None,
+) -> ScanResponse:
     """
     Recursively scan a directory and return file metadata.
+    Pass an existing index to reuse its walk. The walk is saved as a
+    snapshot for later incremental rescans.
     """
-    if not os.path.exists(directory_path):
-        raise FileNotFoundError(f"Directory not found: {directory_path}")
-    if not os.path.isdir(directory_path):
-        raise NotADirectoryError(f"Path is not a directory: {directory_path}")
-
-    files: List[FileInfo] = []
-    total_size = 0
-
-    for root, dirs, filenames in os.walk(directory_path):
-        # Skip hidden directories
-        dirs[:] = [d for d in dirs if not d.startswith(".")]
-        for filename in filenames:
-            if filename.startswith("."):
-                continue
-            file_path = os.path.join(root, filename)
-            try:
-                info = get_file_info(file_path)
-                files.append(info)
-                total_size += info.size
-            except (PermissionError, OSError):
-                continue
+    if index is None:
+        index = await load_scan_index(directory_path, progress)
+    try:
+        await asyncio.to_thread(save_snapshot, index)
+    except OSError:
+        pass  # Snapshots only speed up rescans
+    return await asyncio.to_thread(_build_scan_response, index)
 
-    return ScanResponse(
-        total_files=len(files),
-        total_size=total_size,
-        file_summary=files,
+
+async def rescan_directory(
+    directory_path: str,
+    trust_dir_mtime: bool = False,
+    algorithm: Optional[str] = None,
+    progress: Optional[JobProgress] = None,
+    io: Optional[IOLimits] = None,
+) -> RescanResponse:
+    """
+    Rescan a directory against its last snapshot, reporting only added,
+    removed and modified files, and update its exact duplicate groups for
+    the file sizes that changed. io limits the hashing reads (see IOLimits).
+    """
+    index, previous, diff, stats = await asyncio.to_thread(
+        incremental_scan, directory_path, trust_dir_mtime, progress
+    )
+    register_scan_index(index)
+
+    dup_index, is_new = ensure_duplicate_index(directory_path, algorithm)
+    if is_new:
+        await dup_index.rebuild(index, progress, io)
+        changed_sizes = None
+    else:
+        base = dup_index.index
+        dup_diff = diff if base is previous else await asyncio.to_thread(diff_indexes, base, index)
+        changed_sizes = await dup_index.update(base, index, dup_diff, progress, io)
+
+    recoverable, duplicate_files = dup_index.totals()
+    changed_groups = await asyncio.to_thread(dup_index.groups, changed_sizes)
+    return RescanResponse(
+        total_files=len(index),
+        total_size=index.total_size,
+        added=[index.file_info(j) for j in diff.added],
+        removed=[previous.paths[i] for i in diff.removed] if previous else [],
+        modified=[index.file_info(j) for _, j in diff.modified],
+        full_scan=previous is None,
+        directories_listed=stats.directories_listed,
+        directories_reused=stats.directories_reused,
+        changed_duplicate_groups=changed_groups,
+        recoverable_space=recoverable,
+        total_duplicate_files=duplicate_files,
     )
@@ -0,0 +1,141 @@
+from itertools import combinations
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+from utils.union_find import UnionFind
+
+HASH_BITS = 64
+# Multi-index hashing: the 64-bit hash is split into this many bands. Two
+# hashes within distance r must agree to within r // BANDS bits on some band.
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+# Below this many distinct hashes a blocked brute-force scan is cheaper
+BRUTE_FORCE_MAX = 4096
+# Larger per-band radii enumerate too many probes; brute force instead
+MAX_BAND_RADIUS = 2
+# Queries probed at once in the band index
+QUERY_BLOCK_SIZE = 65536
+# Rows compared at once in brute-force and pairwise scans
+BLOCK_SIZE = 1024
+
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Vectorized number of set bits in each uint64."""
+    values = np.asarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # SWAR popcount, for NumPy < 2.0
+    v = values - ((values >> np.uint64(1)) & _M1)
+    v = (v & _M2) + ((v >> np.uint64(2)) & _M2)
+    v = (v + (v >> np.uint64(4))) & _M4
+    return (v * _H01) >> np.uint64(56)
+
+
+def pack_hash(bits: np.ndarray) -> int:
+    """Pack a 64-element boolean hash (e.g. ImageHash.hash) into an int."""
+    flat = np.asarray(bits, dtype=bool).ravel()
+    if flat.size != HASH_BITS:
+        raise ValueError(f"Expected a {HASH_BITS}-bit hash, got {flat.size} bits")
+    return int.from_bytes(np.packbits(flat).tobytes(), "big")
+
+
+def _flip_masks(bits: int, radius: int) -> List[int]:
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return masks
+
+
+def _brute_force_pairs(values: np.ndarray, radius: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    for start in range(0, len(values), BLOCK_SIZE):
+        block = values[start:start + BLOCK_SIZE]
+        # Compare the block against itself and everything after it
+        distances = popcount64(block[:, None] ^ values[None, start:])
+        a, b = np.nonzero(distances <= radius)
+        keep = a < b
+        yield a[keep] + start, b[keep] + start
+
+
+def _band_pairs(values: np.ndarray, radius: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    masks = np.array(_flip_masks(BAND_BITS, radius // BANDS), dtype=np.int64)
+    band_mask = np.uint64((1 << BAND_BITS) - 1)
+    for band in range(BANDS):
+        keys = ((values >> np.uint64(band * BAND_BITS)) & band_mask).astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        # bucket_start[k]:bucket_start[k + 1] are the positions in order with band key k
+        bucket_start = np.searchsorted(keys[order], np.arange((1 << BAND_BITS) + 1))
+        for start in range(0, len(values), QUERY_BLOCK_SIZE):
+            queries = np.arange(start, min(start + QUERY_BLOCK_SIZE, len(values)))
+            for mask in masks:
+                probe = keys[queries] ^ mask
+                left = bucket_start[probe]
+                counts = bucket_start[probe + 1] - left
+                total = int(counts.sum())
+                if not total:
+                    continue
+                # Expand every (query, [left, right)) range into candidate pairs
+                i = np.repeat(queries, counts)
+                offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                j = order[np.repeat(left, counts) + offsets]
+                keep = i < j
+                i, j = i[keep], j[keep]
+                close = popcount64(values[i] ^ values[j]) <= radius
+                yield i[close], j[close]
+
+
+def hamming_pairs(values: np.ndarray, radius: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (i, j) index arrays, i < j, of every pair of distinct packed
+    hashes within radius bits of each other. values must be unique.
+    A pair may be yielded more than once.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if radius < 0 or len(values) < 2:
+        return iter(())
+    if len(values) <= BRUTE_FORCE_MAX or radius // BANDS > MAX_BAND_RADIUS:
+        return _brute_force_pairs(values, radius)
+    return _band_pairs(values, radius)
+
+
+def cluster_hashes(values: np.ndarray, threshold: int) -> List[List[int]]:
+    """
+    Group positions of packed hashes transitively: two hashes are linked
+    when their Hamming distance is below threshold. Returns groups of 2 or more.
+    """
+    if len(values) < 2:
+        return []
+    values = np.asarray(values, dtype=np.uint64)
+    unique, inverse = np.unique(values, return_inverse=True)
+    uf = UnionFind(len(unique))
+    for i, j in hamming_pairs(unique, threshold - 1):
+        uf.union_pairs(i, j)
+
+    roots = np.fromiter((uf.find(u) for u in range(len(unique))), dtype=np.int64, count=len(unique))
+    labels = roots[inverse]
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+    return [g.tolist() for g in np.split(order, boundaries) if len(g) > 1]
+
+
+def mean_pairwise_distance(values: np.ndarray) -> float:
+    """Average Hamming distance over all pairs, computed in bounded blocks."""
+    values = np.asarray(values, dtype=np.uint64)
+    n = len(values)
+    if n < 2:
+        return 0.0
+    total = 0
+    for start in range(0, n, BLOCK_SIZE):
+        block = values[start:start + BLOCK_SIZE]
+        total += int(popcount64(block[:, None] ^ values[None, :]).sum(dtype=np.int64))
+    # Each pair was counted twice, self-distances are zero
+    return total / (n * (n - 1))
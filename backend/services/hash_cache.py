@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple, Union
+
+import config
+
+# (st_dev, st_ino, st_size, st_mtime_ns) - changes whenever the file does
+FileKey = Tuple[int, int, int, int]
+CacheValue = Union[str, bytes]
+
+# Commit pending writes after this many puts
+COMMIT_INTERVAL = 500
+# Only refresh an entry's access time when it is older than this (seconds)
+TOUCH_INTERVAL = 3600
+# Evict down to this fraction of max_bytes once the limit is exceeded
+EVICT_TARGET = 0.9
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    dev INTEGER NOT NULL,
+    ino INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    value BLOB NOT NULL,
+    nbytes INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    PRIMARY KEY (dev, ino, kind)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+def file_key(file_path: str, st: Optional[os.stat_result] = None) -> FileKey:
+    """Build the cache key for a file from its stat metadata."""
+    if st is None:
+        st = os.stat(file_path)
+    return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class HashCache:
+    """
+    Persistent per-file cache of content hashes, partial hashes, pHashes and
+    embeddings. Entries are keyed by (device, inode, kind) and are only
+    returned while the file's size and mtime still match.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._pending = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(nbytes), 0) FROM entries"
+        ).fetchone()[0]
+
+    def get(self, key: FileKey, kind: str) -> Optional[CacheValue]:
+        """Return the cached value, or None if missing or stale."""
+        dev, ino, size, mtime_ns = key
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, value, nbytes, accessed FROM entries "
+                "WHERE dev = ? AND ino = ? AND kind = ?",
+                (dev, ino, kind),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] != size or row[1] != mtime_ns:
+                # File changed since it was cached
+                self._conn.execute(
+                    "DELETE FROM entries WHERE dev = ? AND ino = ? AND kind = ?",
+                    (dev, ino, kind),
+                )
+                self._total_bytes -= row[3]
+                self._mark_dirty()
+                return None
+            now = time.time()
+            if now - row[4] > TOUCH_INTERVAL:
+                self._conn.execute(
+                    "UPDATE entries SET accessed = ? WHERE dev = ? AND ino = ? AND kind = ?",
+                    (now, dev, ino, kind),
+                )
+                self._mark_dirty()
+            return row[2]
+
+    def put(self, key: FileKey, kind: str, value: CacheValue) -> None:
+        """Store a value for the file, replacing any previous entry of this kind."""
+        dev, ino, size, mtime_ns = key
+        nbytes = len(value)
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT nbytes FROM entries WHERE dev = ? AND ino = ? AND kind = ?",
+                (dev, ino, kind),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(dev, ino, kind, size, mtime_ns, value, nbytes, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (dev, ino, kind, size, mtime_ns, value, nbytes, time.time()),
+            )
+            self._total_bytes += nbytes - (old[0] if old else 0)
+            self._mark_dirty()
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def flush(self) -> None:
+        """Commit pending writes."""
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+            self._total_bytes = 0
+            self._pending = 0
+
+    def _mark_dirty(self) -> None:
+        self._pending += 1
+        if self._pending >= COMMIT_INTERVAL:
+            self._conn.commit()
+            self._pending = 0
+
+    def _evict(self) -> None:
+        """Drop least recently accessed entries until under the size budget."""
+        target = int(self.max_bytes * EVICT_TARGET)
+        while self._total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT dev, ino, kind, nbytes FROM entries ORDER BY accessed LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for dev, ino, kind, nbytes in rows:
+                self._conn.execute(
+                    "DELETE FROM entries WHERE dev = ? AND ino = ? AND kind = ?",
+                    (dev, ino, kind),
+                )
+                self._total_bytes -= nbytes
+                if self._total_bytes <= target:
+                    break
+        self._conn.commit()
+        self._pending = 0
+
+
+# Lazy singleton
+_cache: Optional[HashCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_hash_cache() -> Optional[HashCache]:
+    """Return the shared cache, or None when caching is disabled."""
+    global _cache
+    if not config.CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HashCache(config.CACHE_PATH, config.CACHE_MAX_BYTES)
+    return _cache
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import config
+from services.io_limits import lower_thread_priority
+
+# Upper bound on tasks scheduled on the event loop at once
+SUBMIT_BATCH_SIZE = 4096
+
+
+def classify_device(dev: int) -> str:
+    """
+    Classify the block device behind st_dev as "hdd", "ssd" or "nvme".
+    Devices that cannot be inspected (network mounts, tmpfs, non-Linux) are
+    treated as "ssd".
+    """
+    try:
+        sys_path = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    except (OSError, ValueError):
+        return "ssd"
+    if not os.path.exists(sys_path):
+        return "ssd"
+    if os.path.basename(sys_path).startswith("nvme"):
+        return "nvme"
+    # Partitions keep their queue settings on the parent device
+    for candidate in (sys_path, os.path.dirname(sys_path)):
+        try:
+            with open(os.path.join(candidate, "queue", "rotational")) as f:
+                return "hdd" if f.read().strip() == "1" else "ssd"
+        except OSError:
+            continue
+    return "ssd"
+
+
+DEVICE_CONCURRENCY = {
+    "hdd": config.HASH_HDD_CONCURRENCY,
+    "ssd": config.HASH_SSD_CONCURRENCY,
+    "nvme": config.HASH_NVME_CONCURRENCY,
+}
+
+
+# Per-device semaphores shared by every executor, so the normal and idle
+# pools together stay within one device's limit. They belong to the loop
+# that first waits on them.
+_device_semaphores: Dict[int, asyncio.Semaphore] = {}
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _device_semaphore(dev: int, limit: Callable[[int], int]) -> asyncio.Semaphore:
+    global _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore_loop is not loop:
+        _device_semaphores.clear()
+        _semaphore_loop = loop
+    if dev not in _device_semaphores:
+        _device_semaphores[dev] = asyncio.Semaphore(limit(dev))
+    return _device_semaphores[dev]
+
+
+class HashExecutor:
+    """
+    Thread pool for file hashing. hashlib releases the GIL while digesting,
+    so threads scale across cores. Each device gets its own concurrency limit
+    so spinning disks see sequential reads while flash gets deep queues.
+    """
+
+    def __init__(self, max_workers: int, initializer: Optional[Callable[[], None]] = None, name: str = "hash"):
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name, initializer=initializer)
+        self._device_kinds: Dict[int, str] = {}
+
+    def device_limit(self, dev: int) -> int:
+        if dev not in self._device_kinds:
+            self._device_kinds[dev] = classify_device(dev)
+        return min(self.max_workers, DEVICE_CONCURRENCY[self._device_kinds[dev]])
+
+    def _semaphore(self, dev: int) -> asyncio.Semaphore:
+        return _device_semaphore(dev, self.device_limit)
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Run a blocking function on the pool without a device limit."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, func, *args)
+
+    async def map_paths(
+        self,
+        func: Callable[[str], Any],
+        paths: Sequence[str],
+        devices: Sequence[int],
+    ) -> List[Any]:
+        """
+        Apply func to every path on the pool, honouring per-device limits.
+        Results keep the order of paths; a failing call yields its exception.
+        """
+        loop = asyncio.get_running_loop()
+
+        async def _one(path: str, dev: int) -> Any:
+            async with self._semaphore(dev):
+                return await loop.run_in_executor(self._pool, func, path)
+
+        results: List[Any] = []
+        for start in range(0, len(paths), SUBMIT_BATCH_SIZE):
+            batch = zip(paths[start:start + SUBMIT_BATCH_SIZE], devices[start:start + SUBMIT_BATCH_SIZE])
+            results.extend(await asyncio.gather(
+                *(_one(p, d) for p, d in batch), return_exceptions=True
+            ))
+        return results
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Lazy singletons: the shared pool, and one whose threads run at idle I/O
+# and CPU priority for jobs that asked for it
+_executor: Optional[HashExecutor] = None
+_idle_executor: Optional[HashExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_hash_executor(idle: bool = False) -> HashExecutor:
+    global _executor, _idle_executor
+    with _executor_lock:
+        if idle:
+            if _idle_executor is None:
+                _idle_executor = HashExecutor(config.HASH_WORKERS, lower_thread_priority, "hash-idle")
+            return _idle_executor
+        if _executor is None:
+            _executor = HashExecutor(config.HASH_WORKERS)
+    return _executor
+
+
+def shutdown_hash_executors() -> None:
+    """Stop the pools' threads, dropping queued work; called on app shutdown."""
+    global _executor, _idle_executor
+    with _executor_lock:
+        for executor in (_executor, _idle_executor):
+            if executor is not None:
+                executor.shutdown()
+        _executor = _idle_executor = None
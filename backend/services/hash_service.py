@@ -1,81 +1,964 @@
 import hashlib
-import os
-from typing import Dict, List
-from models.schemas import FileInfo, DuplicateGroup, ExactDuplicateResponse
-from utils.helpers import get_file_info
+import threading
+from contextlib import ExitStack
+from itertools import groupby
+from operator import itemgetter
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 
-def compute_sha256(file_path: str, chunk_size: int = 8192) -> str:
+import config
+from models.schemas import FileInfo, DuplicateGroup, ExactDuplicateResponse, HardlinkSet, HashStageStats
+from services.extents import shared_extent_bytes
+from services.external_sort import ExternalSorter
+from services.hash_cache import FileKey, HashCache, get_hash_cache
+from services.hash_executor import get_hash_executor
+from services.io_limits import IOLimits
+from services.job_manager import JobProgress
+from services.scan_index import ScanIndex, load_scan_index
+
+# Bytes hashed from each end of a file in the partial-hash stage
+EDGE_BLOCK_SIZE = 4096
+# Bytes hashed from the middle of a file in the sample stage
+SAMPLE_BLOCK_SIZE = 64 * 1024
+
+# Read size for full-content hashing
+READ_BUFFER_SIZE = 1024 * 1024
+
+# Candidate groups this small, of files at least this large, are compared
+# in lockstep instead of hashed, so reading stops at the first difference
+COMPARE_MAX_FILES = 4
+COMPARE_MIN_SIZE = 4 * READ_BUFFER_SIZE
+
+# Bounded-memory grouping: files handed to the hash executor at once, and
+# a rough estimate of the in-memory pipeline's bookkeeping per file, used
+# to decide when config.GROUPING_MEMORY_BUDGET calls for the bounded one
+SPILL_CHUNK_FILES = 16384
+IN_MEMORY_BYTES_PER_FILE = 400
+
+# Supported full-content digests; blake3 and xxh3_128 need optional packages
+HASH_ALGORITHMS = ("sha256", "blake3", "xxh3_128")
+# Algorithm used to confirm groups found with a non-cryptographic digest
+VERIFY_ALGORITHM = "sha256"
+
+# Hash cache kinds; partial hashes depend on the block sizes used and full
+# hashes are cached under the algorithm name
+EDGE_CACHE_KIND = f"edge:{EDGE_BLOCK_SIZE}"
+SAMPLE_CACHE_KIND = f"sample:{EDGE_BLOCK_SIZE}:{SAMPLE_BLOCK_SIZE}"
+
+# Records of the bounded-memory pipeline; keys are stored as hex digests,
+# which have a fixed width per stage and never end in NUL padding
+_INODE_RECORD = np.dtype([("size", "<i8"), ("dev", "<u8"), ("ino", "<u8"), ("row", "<i8")])
+_GROUP_RECORD = np.dtype([("group", "<i8"), ("row", "<i8")])
+_KEY_RECORD = np.dtype([("group", "<i8"), ("key", "S64"), ("row", "<i8")])
+_LINK_RECORD = np.dtype([("rep", "<i8"), ("row", "<i8")])
+_LABEL_RECORD = np.dtype([("group", "<i8"), ("key", "S64")])
+
+# One reusable read buffer per hashing thread
+_buffers = threading.local()
+
+
+def new_hasher(algorithm: str):
+    """Return a fresh hash object for algorithm."""
+    if algorithm == "sha256":
+        return hashlib.sha256()
+    if algorithm == "blake3":
+        try:
+            from blake3 import blake3
+        except ImportError:
+            raise ValueError("Hash algorithm 'blake3' requires the blake3 package")
+        return blake3()
+    if algorithm == "xxh3_128":
+        try:
+            import xxhash
+        except ImportError:
+            raise ValueError("Hash algorithm 'xxh3_128' requires the xxhash package")
+        return xxhash.xxh3_128()
+    raise ValueError(f"Unknown hash algorithm: {algorithm}. Choose from {', '.join(HASH_ALGORITHMS)}")
+
+
+def _read_buffer(size: int) -> bytearray:
+    buf = getattr(_buffers, "buf", None)
+    if buf is None or len(buf) != size:
+        buf = bytearray(size)
+        _buffers.buf = buf
+    return buf
+
+
+def compute_file_hash(
+    file_path: str,
+    algorithm: str = "sha256",
+    buffer_size: int = READ_BUFFER_SIZE,
+    io: Optional[IOLimits] = None,
+) -> str:
+    """
+    Hash the full content of a file with the given algorithm.
+    Reads with readinto into a per-thread buffer, so the loop allocates nothing.
+    Every read is charged to io when given.
+    """
+    hasher = new_hasher(algorithm)
+    buf = _read_buffer(buffer_size)
+    view = memoryview(buf)
+    with open(file_path, "rb", buffering=0) as f:
+        while n := f.readinto(buf):
+            hasher.update(view[:n])
+            if io:
+                io.charge(n)
+        if io:
+            io.done(f.fileno())
+    return hasher.hexdigest()
+
+
+def compute_sha256(file_path: str, chunk_size: int = READ_BUFFER_SIZE) -> str:
     """Compute SHA256 hash of a file efficiently using chunked reading."""
+    return compute_file_hash(file_path, "sha256", chunk_size)
+
+
+def compute_edge_hash(
+    file_path: str,
+    size: int,
+    block_size: int = EDGE_BLOCK_SIZE,
+    io: Optional[IOLimits] = None,
+) -> Tuple[str, int]:
+    """
+    Hash the first and last block_size bytes of a file.
+    Returns (hexdigest, bytes_read).
+    """
     sha256 = hashlib.sha256()
     with open(file_path, "rb") as f:
-        while chunk := f.read(chunk_size):
-            sha256.update(chunk)
-    return sha256.hexdigest()
+        head = f.read(block_size)
+        sha256.update(head)
+        bytes_read = len(head)
+        reads = 1
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            tail = f.read(block_size)
+            sha256.update(tail)
+            bytes_read += len(tail)
+            reads += 1
+        if io:
+            io.charge(bytes_read, reads)
+            io.done(f.fileno())
+    return sha256.hexdigest(), bytes_read
 
 
-async def find_exact_duplicates(directory_path: str) -> ExactDuplicateResponse:
+def compute_sample_hash(
+    file_path: str,
+    size: int,
+    block_size: int = SAMPLE_BLOCK_SIZE,
+    io: Optional[IOLimits] = None,
+) -> Tuple[str, int]:
     """
-    Find exact duplicate files using two-pass approach:
-    1. Group files by size (quick filter)
-    2. Compute SHA256 for same-size groups
+    Hash a block from the middle of a file.
+    Files already covered by the edge blocks need no sample and read nothing.
+    Returns (hexdigest, bytes_read).
     """
-    # Step 1: Group by size
-    size_map: Dict[int, List[str]] = {}
-    for root, dirs, files in os.walk(directory_path):
-        dirs[:] = [d for d in dirs if not d.startswith(".")]
-        for filename in files:
-            if filename.startswith("."):
-                continue
-            path = os.path.join(root, filename)
+    if size <= 2 * EDGE_BLOCK_SIZE:
+        return "", 0
+    offset = max(EDGE_BLOCK_SIZE, (size - block_size) // 2)
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        block = f.read(min(block_size, size - EDGE_BLOCK_SIZE - offset))
+        if io:
+            io.charge(len(block))
+            io.done(f.fileno())
+    return hashlib.sha256(block).hexdigest(), len(block)
+
+
+def _same_block(a: bytearray, a_len: int, b: bytearray, b_len: int) -> bool:
+    if a_len != b_len:
+        return False
+    # Whole bytearrays compare with memcmp; slicing copies, so only the last block is sliced
+    return a == b if a_len == len(a) else a[:a_len] == b[:b_len]
+
+
+def compare_files(
+    paths: List[str],
+    algorithm: str,
+    block_size: int = READ_BUFFER_SIZE,
+    progress: Optional[JobProgress] = None,
+    io: Optional[IOLimits] = None,
+) -> Tuple[List[Tuple[str, List[str]]], int]:
+    """
+    Read same-size files in lockstep, block_size bytes at a time, and split
+    them into groups of byte-identical files as soon as their contents
+    diverge; a file left without a partner is not read any further.
+    Each group's content is digested as it is read, forking the digest when
+    a group splits, so the result can be labelled and cached like a hash.
+    Unreadable files are left out; reads are charged to io when given.
+    Returns ([(hexdigest, paths)], bytes_read).
+    """
+    bytes_read = 0
+    done: List[Tuple[str, List[str]]] = []
+    with ExitStack() as stack:
+        files = []
+        for path in paths:
             try:
-                size = os.path.getsize(path)
-                if size == 0:
-                    continue
-                size_map.setdefault(size, []).append(path)
+                files.append((path, stack.enter_context(open(path, "rb", buffering=0))))
             except OSError:
                 continue
+        buffers = [bytearray(block_size) for _ in files]
+        lengths = [0] * len(files)
+        groups = [(new_hasher(algorithm), list(range(len(files))))] if len(files) >= 2 else []
+        while groups:
+            if progress:
+                progress.check_cancelled()
+            next_groups = []
+            for hasher, members in groups:
+                for m in members:
+                    lengths[m] = files[m][1].readinto(buffers[m])
+                    bytes_read += lengths[m]
+                    if io:
+                        io.charge(lengths[m])
+                    if progress:
+                        progress.add_processed(0, lengths[m])
 
-    # Step 2: Hash candidates (files sharing same size)
-    hash_map: Dict[str, List[str]] = {}
-    for size, paths in size_map.items():
-        if len(paths) < 2:
+                # Partition the members by the block just read
+                parts: List[List[int]] = []
+                for m in members:
+                    for part in parts:
+                        if _same_block(buffers[part[0]], lengths[part[0]], buffers[m], lengths[m]):
+                            part.append(m)
+                            break
+                    else:
+                        parts.append([m])
+                parts = [part for part in parts if len(part) >= 2]
+
+                for k, part in enumerate(parts):
+                    # Every part shares the content read so far
+                    part_hasher = hasher if k == len(parts) - 1 else hasher.copy()
+                    n = lengths[part[0]]
+                    if n == 0:
+                        done.append((part_hasher.hexdigest(), [files[m][0] for m in part]))
+                    else:
+                        part_hasher.update(memoryview(buffers[part[0]])[:n])
+                        next_groups.append((part_hasher, part))
+            groups = next_groups
+        if io:
+            for _, f in files:
+                io.done(f.fileno())
+    return done, bytes_read
+
+
+async def _compare_candidates(
+    groups: List[List[str]],
+    algorithm: str,
+    file_keys: Dict[str, FileKey],
+    cache: Optional[HashCache] = None,
+    progress: Optional[JobProgress] = None,
+    sizes: Optional[Dict[str, int]] = None,
+    io: Optional[IOLimits] = None,
+) -> Tuple[List[Tuple[str, List[str]]], HashStageStats]:
+    """
+    Run compare_files over candidate groups on the hash executor. Digests
+    of confirmed duplicates are cached under algorithm, as if hashed.
+    Returns the (hexdigest, paths) groups and the stage statistics.
+    """
+    executor = get_hash_executor(idle=bool(io and io.idle))
+    by_first = {group[0]: group for group in groups}
+
+    def _compare(first: str) -> Tuple[List[Tuple[str, List[str]]], int]:
+        group = by_first[first]
+        result, n = compare_files(group, algorithm, progress=progress, io=io)
+        if cache:
+            for digest, paths in result:
+                for p in paths:
+                    cache.put(file_keys[p], algorithm, digest)
+        if progress:
+            progress.add_processed(len(group))
+        return result, n
+
+    if progress:
+        progress.set_stage(
+            "compare", files_total=sum(len(g) for g in groups),
+            bytes_total=sum(sizes[p] for g in groups for p in g) if sizes else 0,
+        )
+    firsts = list(by_first)
+    results = await executor.map_paths(_compare, firsts, [file_keys[p][0] for p in firsts])
+    compared: List[Tuple[str, List[str]]] = []
+    bytes_read = 0
+    for result in results:
+        if isinstance(result, BaseException):
+            if not isinstance(result, OSError):
+                raise result
             continue
-        for path in paths:
-            try:
-                h = compute_sha256(path)
-                hash_map.setdefault(h, []).append(path)
-            except (OSError, PermissionError):
-                continue
+        compared.extend(result[0])
+        bytes_read += result[1]
+
+    stats = HashStageStats(
+        stage="compare",
+        candidates=sum(len(g) for g in groups),
+        remaining=sum(len(p) for _, p in compared),
+        bytes_read=bytes_read,
+    )
+    return compared, stats
+
 
-    # Step 3: Build result groups
-    duplicate_groups: List[DuplicateGroup] = []
-    total_recoverable = 0
+async def _lookup_keys(
+    paths: List[str],
+    cache_kind: str,
+    file_keys: Dict[str, FileKey],
+    cache: Optional[HashCache] = None,
+) -> Dict[str, str]:
+    """Keys of paths found in the hash cache under cache_kind."""
+    keys: Dict[str, str] = {}
+    if cache:
+        def _lookup() -> None:
+            for p in paths:
+                value = cache.get(file_keys[p], cache_kind)
+                if value is not None:
+                    keys[p] = value
+        await get_hash_executor().run(_lookup)
+    return keys
 
-    for hash_val, paths in hash_map.items():
-        if len(paths) < 2:
+
+async def _compute_keys(
+    paths: List[str],
+    key_func: Callable[[str], Tuple[str, int]],
+    cache_kind: str,
+    file_keys: Dict[str, FileKey],
+    cache: Optional[HashCache] = None,
+    progress: Optional[JobProgress] = None,
+    idle: bool = False,
+) -> Tuple[Dict[str, str], int]:
+    """
+    Run key_func over paths on the hash executor (its idle-priority
+    counterpart when idle is set) and cache the keys.
+    Unreadable files are left out. Returns (keys, bytes_read).
+    """
+    def _compute(path: str) -> Tuple[str, int]:
+        if progress:
+            progress.check_cancelled()
+        key, n = key_func(path)
+        if cache:
+            cache.put(file_keys[path], cache_kind, key)
+        if progress:
+            progress.add_processed(1, n)
+        return key, n
+
+    results = await get_hash_executor(idle).map_paths(_compute, paths, [file_keys[p][0] for p in paths])
+    keys: Dict[str, str] = {}
+    bytes_read = 0
+    for path, result in zip(paths, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, OSError):
+                # Cancellation and programming errors abort the scan
+                raise result
             continue
-        file_infos = []
-        for p in paths:
-            try:
-                file_infos.append(get_file_info(p))
-            except OSError:
+        keys[path], n = result
+        bytes_read += n
+    return keys, bytes_read
+
+
+async def _refine_candidates(
+    groups: List[List[str]],
+    key_func: Callable[[str], Tuple[str, int]],
+    stage: str,
+    cache_kind: str,
+    file_keys: Dict[str, FileKey],
+    cache: Optional[HashCache] = None,
+    progress: Optional[JobProgress] = None,
+    sizes: Optional[Dict[str, int]] = None,
+    idle: bool = False,
+) -> Tuple[List[Tuple[str, List[str]]], HashStageStats]:
+    """
+    Split every candidate group by key_func and drop keys with a single member.
+    key_func returns (key, bytes_read) for a path and runs on the hash executor.
+    Keys are read through the hash cache under cache_kind, so unchanged files
+    are never re-read. When sizes is given, progress reports bytes against
+    the total size of the files still to hash.
+    Returns the surviving (key, paths) groups and the stage statistics.
+    """
+    paths = [p for group in groups for p in group]
+
+    # Cache lookups first; only misses touch the disk
+    keys = await _lookup_keys(paths, cache_kind, file_keys, cache)
+    cache_hits = len(keys)
+
+    misses = [p for p in paths if p not in keys]
+    if progress:
+        progress.set_stage(
+            stage, files_total=len(misses),
+            bytes_total=sum(sizes[p] for p in misses) if sizes else 0,
+        )
+    computed, bytes_read = await _compute_keys(misses, key_func, cache_kind, file_keys, cache, progress, idle)
+    keys.update(computed)
+
+    refined: List[Tuple[str, List[str]]] = []
+    for group in groups:
+        key_map: Dict[str, List[str]] = {}
+        for path in group:
+            if path in keys:
+                key_map.setdefault(keys[path], []).append(path)
+        refined.extend((k, p) for k, p in key_map.items() if len(p) >= 2)
+
+    stats = HashStageStats(
+        stage=stage,
+        candidates=len(paths),
+        remaining=sum(len(p) for _, p in refined),
+        bytes_read=bytes_read,
+        cache_hits=cache_hits,
+    )
+    return refined, stats
+
+
+def group_by_size(index: ScanIndex) -> Dict[int, List[int]]:
+    """Bucket the index rows of non-empty files by size."""
+    size_map: Dict[int, List[int]] = {}
+    for i, size in enumerate(index.sizes):
+        if size > 0:
+            size_map.setdefault(size, []).append(i)
+    return size_map
+
+
+def split_links(index: ScanIndex, rows: List[int]) -> List[List[int]]:
+    """
+    Split rows into one list per physical file: hardlinks and bind-mounted
+    views of a file share (st_dev, st_ino). Order of first appearance is kept.
+    """
+    by_inode: Dict[Tuple[int, int], List[int]] = {}
+    for i in rows:
+        by_inode.setdefault((index.devices[i], index.inodes[i]), []).append(i)
+    return list(by_inode.values())
+
+
+def recoverable_bytes(index: ScanIndex, inodes: List[List[int]]) -> int:
+    """
+    Bytes freed by keeping the first of a group of identical inodes and
+    deleting the rest. Blocks a copy already shares with another file
+    (reflinks, snapshots) are not counted; which file it shares them with
+    is unknown, so the estimate errs low.
+    """
+    size = index.sizes[inodes[0][0]]
+    recoverable = 0
+    for links in inodes[1:]:
+        shared = shared_extent_bytes(index.paths[links[0]], size) if config.DETECT_SHARED_EXTENTS else 0
+        recoverable += size - shared
+    return recoverable
+
+
+def _hardlink_set(index: ScanIndex, links: List[int]) -> HardlinkSet:
+    return HardlinkSet(size=index.sizes[links[0]], files=[index.file_info(i) for i in links])
+
+
+def find_hardlink_sets(index: ScanIndex, size_map: Dict[int, List[int]]) -> List[HardlinkSet]:
+    """Every file reachable through more than one path in the index."""
+    hardlink_sets: List[HardlinkSet] = []
+    for rows in size_map.values():
+        if len(rows) < 2:
+            continue
+        hardlink_sets.extend(_hardlink_set(index, links) for links in split_links(index, rows) if len(links) >= 2)
+    return hardlink_sets
+
+
+class ExactGroups:
+    """
+    Exact duplicate groups kept as index rows rather than models: per group
+    its hash, one row per physical copy followed by the copies' other links,
+    the file size and the recoverable bytes. DuplicateGroup models are built
+    one group at a time on demand, so pages and streams of a large result do
+    not hold a model per file. Groups that turn out to be a single inode are
+    dropped. recoverable gives each group's recoverable bytes when they are
+    already known; otherwise they are measured, which reads extent maps.
+    """
+
+    def __init__(
+        self,
+        index: ScanIndex,
+        hash_groups: List[Tuple[str, List[int]]],
+        recoverable: Optional[List[int]] = None,
+        hardlink_sets: Optional[List[HardlinkSet]] = None,
+        stage_stats: Optional[List[HashStageStats]] = None,
+    ):
+        self.index = index
+        self.hardlink_sets = hardlink_sets or []
+        self.stage_stats = stage_stats or []
+        self.hashes: List[str] = []
+        rows: List[int] = []
+        offsets = [0]
+        copies: List[int] = []
+        measured: List[int] = []
+        for k, (hash_val, group_rows) in enumerate(hash_groups):
+            inodes = split_links(index, group_rows)
+            if len(inodes) < 2:
                 continue
-        if len(file_infos) < 2:
+            self.hashes.append(hash_val)
+            rows.extend(links[0] for links in inodes)
+            rows.extend(i for links in inodes for i in links[1:])
+            offsets.append(len(rows))
+            copies.append(len(inodes))
+            # Keep one copy; the other copies' unshared blocks are recoverable
+            measured.append(recoverable[k] if recoverable is not None else recoverable_bytes(index, inodes))
+        self.rows = np.array(rows, dtype=np.int64)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.copies = np.array(copies, dtype=np.int64)
+        self.recoverable = np.array(measured, dtype=np.int64)
+        self.sizes = np.array([index.sizes[i] for i in self.rows[self.offsets[:-1]].tolist()], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def copy_rows(self, k: int) -> List[int]:
+        """Rows of group k's physical copies, one per inode."""
+        start = int(self.offsets[k])
+        return self.rows[start:start + int(self.copies[k])].tolist()
+
+    def __getitem__(self, k: int) -> DuplicateGroup:
+        rows = self.rows[self.offsets[k]:self.offsets[k + 1]].tolist()
+        copies = int(self.copies[k])
+        return DuplicateGroup(
+            hash=self.hashes[k],
+            files=[self.index.file_info(i) for i in rows[:copies]],
+            recoverable_space=int(self.recoverable[k]),
+            hardlinks=[self.index.file_info(i) for i in rows[copies:]],
+        )
+
+    def groups(self) -> List[DuplicateGroup]:
+        return [self[k] for k in range(len(self))]
+
+    def response(self) -> ExactDuplicateResponse:
+        return ExactDuplicateResponse(
+            duplicate_groups=self.groups(),
+            recoverable_space=int(self.recoverable.sum()),
+            total_duplicate_files=int(self.copies.sum()) - len(self),
+            stage_stats=self.stage_stats,
+            hardlink_sets=self.hardlink_sets,
+        )
+
+
+async def hash_size_groups(
+    index: ScanIndex,
+    size_groups: List[List[int]],
+    algorithm: str,
+    verify: bool = False,
+    progress: Optional[JobProgress] = None,
+    io: Optional[IOLimits] = None,
+) -> Tuple[List[Tuple[str, List[int]]], List[HashStageStats]]:
+    """
+    Run the hashing stages over buckets of same-size index rows.
+    Each inode is hashed through one of its paths only; its other links
+    rejoin the group afterwards. Small groups of large files are compared
+    byte for byte in lockstep rather than hashed (see compare_files).
+    Reads are paced and prioritized by io when given.
+    Returns ("<algorithm>:<hexdigest>", rows) for every group of identical
+    content spanning two or more inodes, plus per-stage statistics.
+    """
+    executor = get_hash_executor()
+    idle = bool(io and io.idle)
+    candidates: List[List[str]] = []
+    rows: Dict[str, int] = {}
+    links: Dict[int, List[int]] = {}
+    for group in size_groups:
+        inodes = split_links(index, group)
+        if len(inodes) < 2:
             continue
+        for inode_rows in inodes:
+            rows[index.paths[inode_rows[0]]] = inode_rows[0]
+            links[inode_rows[0]] = inode_rows
+        candidates.append([index.paths[inode_rows[0]] for inode_rows in inodes])
+    sizes = {p: index.sizes[i] for p, i in rows.items()}
+    file_keys = {p: index.file_key(i) for p, i in rows.items()}
+    stage_stats: List[HashStageStats] = [HashStageStats(
+        stage="links",
+        candidates=sum(len(g) for g in size_groups),
+        remaining=len(rows),
+        bytes_read=0,
+    )]
 
-        # Recoverable = (n-1) * size (keep one copy)
-        recoverable = file_infos[0].size * (len(file_infos) - 1)
-        total_recoverable += recoverable
+    cache = get_hash_cache()
 
-        duplicate_groups.append(DuplicateGroup(
-            hash=hash_val,
-            files=file_infos,
-            recoverable_space=recoverable,
-        ))
+    # Narrow candidates with cheap partial hashes
+    refined, stats = await _refine_candidates(
+        candidates, lambda p: compute_edge_hash(p, sizes[p], io=io), "edges",
+        EDGE_CACHE_KIND, file_keys, cache, progress, idle=idle,
+    )
+    stage_stats.append(stats)
+    refined, stats = await _refine_candidates(
+        [paths for _, paths in refined], lambda p: compute_sample_hash(p, sizes[p], io=io), "sample",
+        SAMPLE_CACHE_KIND, file_keys, cache, progress, idle=idle,
+    )
+    stage_stats.append(stats)
+
+    # Small groups of large files are compared in lockstep, unless every
+    # member's digest is already cached
+    def _split_methods() -> Tuple[List[List[str]], List[List[str]]]:
+        to_compare: List[List[str]] = []
+        to_hash: List[List[str]] = []
+        for _, paths in refined:
+            if (
+                len(paths) <= COMPARE_MAX_FILES
+                and sizes[paths[0]] >= COMPARE_MIN_SIZE
+                and not (cache and all(cache.get(file_keys[p], algorithm) is not None for p in paths))
+            ):
+                to_compare.append(paths)
+            else:
+                to_hash.append(paths)
+        return to_compare, to_hash
+    to_compare, to_hash = await executor.run(_split_methods)
 
-    return ExactDuplicateResponse(
-        duplicate_groups=duplicate_groups,
-        recoverable_space=total_recoverable,
-        total_duplicate_files=sum(len(g.files) - 1 for g in duplicate_groups),
+    # Compared groups are byte-identical, so they need no verify stage, but
+    # are digested with its algorithm to be labelled like the verified ones
+    compare_algorithm = VERIFY_ALGORITHM if verify else algorithm
+    compared: List[Tuple[str, List[str]]] = []
+    if to_compare:
+        compared, stats = await _compare_candidates(
+            to_compare, compare_algorithm, file_keys, cache, progress, sizes, io
+        )
+        stage_stats.append(stats)
+    compared_labels = [(f"{compare_algorithm}:{h}", paths) for h, paths in compared]
+
+    # Full hash of surviving candidates
+    hash_groups, stats = await _refine_candidates(
+        to_hash, lambda p: (compute_file_hash(p, algorithm, io=io), sizes[p]), "full",
+        algorithm, file_keys, cache, progress, sizes, idle,
     )
+    stage_stats.append(stats)
+
+    # Cryptographic confirmation; compared groups are already byte-identical
+    if verify and algorithm != VERIFY_ALGORITHM:
+        algorithm = VERIFY_ALGORITHM
+        hash_groups, stats = await _refine_candidates(
+            [paths for _, paths in hash_groups], lambda p: (compute_file_hash(p, algorithm, io=io), sizes[p]),
+            "verify", algorithm, file_keys, cache, progress, sizes, idle,
+        )
+        stage_stats.append(stats)
+    if cache:
+        await executor.run(cache.flush)
+
+    labelled = compared_labels + [(f"{algorithm}:{h}", paths) for h, paths in hash_groups]
+    return [
+        (label, [i for p in paths for i in links[rows[p]]]) for label, paths in labelled
+    ], stage_stats
+
+
+def _sort_inodes(index: ScanIndex, budget: int, temp_dir: Optional[str]) -> ExternalSorter:
+    """(size, dev, ino, row) records of every non-empty file, externally sorted."""
+    sorter = ExternalSorter(_INODE_RECORD, _INODE_RECORD.names, budget, temp_dir)
+    step = sorter.buffer_records
+    for start in range(0, len(index), step):
+        count = min(step, len(index) - start)
+
+        def column(values, dtype):
+            return np.frombuffer(values, dtype=dtype, count=count, offset=start * values.itemsize)
+
+        sizes = column(index.sizes, np.int64)
+        keep = np.flatnonzero(sizes > 0)
+        records = np.empty(len(keep), dtype=_INODE_RECORD)
+        records["size"] = sizes[keep]
+        records["dev"] = column(index.devices, np.uint64)[keep]
+        records["ino"] = column(index.inodes, np.uint64)[keep]
+        records["row"] = keep + start
+        sorter.add(records)
+    return sorter
+
+
+def _collapse_sorted_links(
+    inodes: ExternalSorter,
+    budget: int,
+    temp_dir: Optional[str],
+) -> Tuple[ExternalSorter, ExternalSorter, int, ExternalSorter]:
+    """
+    Walk sorted inode records once. Every size shared by two or more inodes
+    becomes a candidate group holding one row per inode, as (group, row)
+    records; the inodes' other links become (first row, row) records.
+    Returns (candidates, links, files sharing a size, hardlinks), where
+    hardlinks holds (first row, row) records for every link of every
+    inode with more than one, its first row included.
+    """
+    candidates = ExternalSorter(_GROUP_RECORD, ("group", "row"), budget, temp_dir)
+    links = ExternalSorter(_LINK_RECORD, ("rep", "row"), budget, temp_dir)
+    hardlinks = ExternalSorter(_LINK_RECORD, ("rep", "row"), budget, temp_dir)
+    same_size_files = 0
+    group = 0
+    for _, same_size in groupby(inodes, key=itemgetter(0)):
+        inode_rows = [[r[3] for r in same] for _, same in groupby(same_size, key=itemgetter(1, 2))]
+        files = sum(len(rows) for rows in inode_rows)
+        if files < 2:
+            continue
+        same_size_files += files
+        for rows in inode_rows:
+            if len(rows) >= 2:
+                hardlinks.extend((rows[0], i) for i in rows)
+                links.extend((rows[0], i) for i in rows[1:])
+        if len(inode_rows) >= 2:
+            candidates.extend((group, rows[0]) for rows in inode_rows)
+            group += 1
+    return candidates, links, same_size_files, hardlinks
+
+
+def _sorted_hardlink_sets(index: ScanIndex, hardlinks: ExternalSorter) -> List[HardlinkSet]:
+    """Hardlink sets from sorted (first row, row) records, one inode at a time."""
+    with hardlinks:
+        return [_hardlink_set(index, [r[1] for r in records]) for _, records in groupby(hardlinks, key=itemgetter(0))]
+
+
+def _group_sorted_keys(
+    keyed: ExternalSorter,
+    budget: int,
+    temp_dir: Optional[str],
+    labels: Optional[ExternalSorter],
+) -> ExternalSorter:
+    """
+    Turn sorted (group, key, row) records into (group, row) records of the
+    keys shared by two or more rows, and (group, key) records into labels.
+    """
+    refined = ExternalSorter(_GROUP_RECORD, ("group", "row"), budget, temp_dir)
+    group = 0
+    with keyed:
+        for (_, key), members in groupby(keyed, key=itemgetter(0, 1)):
+            rows = [r[2] for r in members]
+            if len(rows) >= 2:
+                refined.extend((group, i) for i in rows)
+                if labels is not None:
+                    labels.append((group, key))
+                group += 1
+    return refined
+
+
+async def _refine_sorted(
+    index: ScanIndex,
+    candidates: ExternalSorter,
+    key_func: Callable[[str, int], Tuple[str, int]],
+    stage: str,
+    cache_kind: str,
+    budget: int,
+    temp_dir: Optional[str],
+    cache: Optional[HashCache] = None,
+    progress: Optional[JobProgress] = None,
+    labels: Optional[ExternalSorter] = None,
+    idle: bool = False,
+) -> Tuple[ExternalSorter, HashStageStats]:
+    """
+    _refine_candidates over (group, row) records in bounded memory: keys are
+    computed SPILL_CHUNK_FILES files at a time and written out as
+    (group, key, row) records, which an external sort brings together.
+    key_func takes (path, size). When labels is given, a (group, key)
+    record is added to it for every surviving group.
+    """
+    executor = get_hash_executor()
+    keyed = ExternalSorter(_KEY_RECORD, ("group", "key", "row"), budget, temp_dir)
+    if progress:
+        progress.set_stage(stage, files_total=candidates.count)
+    cache_hits = 0
+    bytes_read = 0
+    try:
+        with candidates:
+            chunks = candidates.chunks(SPILL_CHUNK_FILES)
+            while (chunk := await executor.run(next, chunks, None)) is not None:
+                if progress:
+                    progress.check_cancelled()
+                rows = chunk["row"].tolist()
+                paths = [index.paths[i] for i in rows]
+                sizes = {p: index.sizes[i] for p, i in zip(paths, rows)}
+                file_keys = {p: index.file_key(i) for p, i in zip(paths, rows)}
+                keys = await _lookup_keys(paths, cache_kind, file_keys, cache)
+                cache_hits += len(keys)
+                if progress:
+                    progress.add_processed(len(keys))
+                computed, n = await _compute_keys(
+                    [p for p in paths if p not in keys], lambda p: key_func(p, sizes[p]),
+                    cache_kind, file_keys, cache, progress, idle,
+                )
+                keys.update(computed)
+                bytes_read += n
+                keyed.extend(
+                    (g, keys[p].encode(), i) for g, p, i in zip(chunk["group"].tolist(), paths, rows) if p in keys
+                )
+    except BaseException:
+        keyed.close()
+        raise
+    refined = await executor.run(_group_sorted_keys, keyed, budget, temp_dir, labels)
+
+    stats = HashStageStats(
+        stage=stage,
+        candidates=candidates.count,
+        remaining=refined.count,
+        bytes_read=bytes_read,
+        cache_hits=cache_hits,
+    )
+    return refined, stats
+
+
+def _expand_sorted_links(
+    groups: ExternalSorter,
+    links: ExternalSorter,
+    budget: int,
+    temp_dir: Optional[str],
+) -> Iterator[Tuple[int, List[int]]]:
+    """Rejoin every inode's other links to its group; yields (group, rows)."""
+    by_rep = ExternalSorter(_GROUP_RECORD, ("row", "group"), budget, temp_dir)
+    with groups:
+        by_rep.extend(groups)
+    expanded = ExternalSorter(_GROUP_RECORD, ("group", "row"), budget, temp_dir)
+    with by_rep, links:
+        link_records = iter(links)
+        link = next(link_records, None)
+        for group, rep in by_rep:
+            expanded.append((group, rep))
+            while link is not None and link[0] < rep:
+                link = next(link_records, None)
+            while link is not None and link[0] == rep:
+                expanded.append((group, link[1]))
+                link = next(link_records, None)
+    with expanded:
+        for group, records in groupby(expanded, key=itemgetter(0)):
+            yield group, [r[1] for r in records]
+
+
+def _label_sorted_groups(
+    groups: ExternalSorter,
+    links: ExternalSorter,
+    labels: ExternalSorter,
+    algorithm: str,
+    budget: int,
+    temp_dir: Optional[str],
+) -> List[Tuple[str, List[int]]]:
+    """Expanded groups paired with their labels; both come in group order."""
+    with labels:
+        label_records = iter(labels)
+        return [
+            (f"{algorithm}:{next(label_records)[1].decode()}", rows)
+            for _, rows in _expand_sorted_links(groups, links, budget, temp_dir)
+        ]
+
+
+async def hash_sorted_groups(
+    index: ScanIndex,
+    algorithm: str,
+    verify: bool = False,
+    progress: Optional[JobProgress] = None,
+    budget: Optional[int] = None,
+    temp_dir: Optional[str] = None,
+    io: Optional[IOLimits] = None,
+) -> Tuple[List[Tuple[str, List[int]]], List[HashStageStats], List[HardlinkSet]]:
+    """
+    Bounded-memory counterpart of grouping by size plus hash_size_groups,
+    for trees whose candidate bookkeeping would not fit in memory. Every
+    grouping step is an external merge sort over fixed-size records, with
+    runs spilled to temp_dir once budget bytes are buffered: files by
+    (size, inode), then each stage's keys by (group, key). Stages and the
+    hash cache are the same as in memory; the lockstep comparison of small
+    groups is not used. Hardlinks and group labels are spilled the same
+    way. Returns (hash groups, stage statistics, hardlink sets).
+    """
+    budget = budget or config.GROUPING_MEMORY_BUDGET
+    temp_dir = temp_dir or config.SPILL_DIR
+    executor = get_hash_executor()
+    cache = get_hash_cache()
+
+    inodes = await executor.run(_sort_inodes, index, budget, temp_dir)
+    with inodes:
+        candidates, links, same_size_files, hardlinks = await executor.run(
+            _collapse_sorted_links, inodes, budget, temp_dir
+        )
+    stage_stats = [
+        HashStageStats(stage="size", candidates=inodes.count, remaining=same_size_files, bytes_read=0),
+        HashStageStats(stage="links", candidates=same_size_files, remaining=candidates.count, bytes_read=0),
+    ]
+
+    stages: List[Tuple[str, str, Callable[[str, int], Tuple[str, int]]]] = [
+        ("edges", EDGE_CACHE_KIND, lambda p, size: compute_edge_hash(p, size, io=io)),
+        ("sample", SAMPLE_CACHE_KIND, lambda p, size: compute_sample_hash(p, size, io=io)),
+        ("full", algorithm, lambda p, size: (compute_file_hash(p, algorithm, io=io), size)),
+    ]
+    if verify and algorithm != VERIFY_ALGORITHM:
+        stages.append((
+            "verify", VERIFY_ALGORITHM, lambda p, size: (compute_file_hash(p, VERIFY_ALGORITHM, io=io), size)
+        ))
+    labels = ExternalSorter(_LABEL_RECORD, ("group",), budget, temp_dir)
+    try:
+        for k, (stage, cache_kind, key_func) in enumerate(stages):
+            candidates, stats = await _refine_sorted(
+                index, candidates, key_func, stage, cache_kind, budget, temp_dir,
+                cache, progress, labels if k == len(stages) - 1 else None, bool(io and io.idle),
+            )
+            stage_stats.append(stats)
+    except BaseException:
+        # Cancelled or failed: drop the spilled runs
+        candidates.close()
+        links.close()
+        hardlinks.close()
+        labels.close()
+        raise
+    if cache:
+        await executor.run(cache.flush)
+
+    with hardlinks:
+        hash_groups = await executor.run(
+            _label_sorted_groups, candidates, links, labels, stages[-1][1], budget, temp_dir
+        )
+        hardlink_sets = await executor.run(_sorted_hardlink_sets, index, hardlinks)
+    return hash_groups, stage_stats, hardlink_sets
+
+
+async def find_exact_groups(
+    directory_path: str,
+    algorithm: Optional[str] = None,
+    verify: bool = False,
+    index: Optional[ScanIndex] = None,
+    progress: Optional[JobProgress] = None,
+    io: Optional[IOLimits] = None,
+) -> ExactGroups:
+    """
+    Find exact duplicate files using a staged pipeline:
+    1. Group files by size (quick filter), then collapse hardlinks so each
+       inode is hashed once
+    2. Hash the first and last EDGE_BLOCK_SIZE bytes
+    3. Hash a SAMPLE_BLOCK_SIZE block from the middle
+    4. Compute the full-content digest for candidates that survived every
+       stage, or compare small groups of large files block by block
+    5. Optionally confirm the groups with SHA256 when a fast digest was used
+    Blocking work runs on the hash executor so the event loop stays free.
+    Group hashes are reported as "<algorithm>:<hexdigest>". Extra paths to
+    one inode are listed as hardlinks, not copies, and free no space.
+    With config.GROUPING_MEMORY_BUDGET set, trees too large for it are
+    grouped by external sorting instead (see hash_sorted_groups).
+    io caps, deprioritizes and uncaches this job's reads (see IOLimits).
+    Pass an existing index to reuse its walk.
+    """
+    algorithm = algorithm or config.HASH_ALGORITHM
+    new_hasher(algorithm)  # Fail fast on unknown or unavailable algorithms
+    executor = get_hash_executor()
+
+    if index is None:
+        index = await load_scan_index(directory_path, progress)
+
+    budget = config.GROUPING_MEMORY_BUDGET
+    if budget and len(index) * IN_MEMORY_BYTES_PER_FILE > budget:
+        # Steps 1-5 with externally sorted, spilled records
+        hash_groups, stage_stats, hardlink_sets = await hash_sorted_groups(
+            index, algorithm, verify, progress, io=io
+        )
+    else:
+        # Step 1: Group by size
+        size_map = await executor.run(group_by_size, index)
+        size_groups = [group for group in size_map.values() if len(group) >= 2]
+        stage_stats = [HashStageStats(
+            stage="size",
+            candidates=sum(len(g) for g in size_map.values()),
+            remaining=sum(len(g) for g in size_groups),
+            bytes_read=0,
+        )]
+
+        # Steps 2-5: Hash the candidates
+        hash_groups, stats = await hash_size_groups(index, size_groups, algorithm, verify, progress, io)
+        stage_stats.extend(stats)
+        hardlink_sets = await executor.run(find_hardlink_sets, index, size_map)
+
+    # Step 6: Measure the space each group frees
+    if progress:
+        progress.set_stage("report")
+    return await executor.run(ExactGroups, index, hash_groups, None, hardlink_sets, stage_stats)
+
+
+async def find_exact_duplicates(
+    directory_path: str,
+    algorithm: Optional[str] = None,
+    verify: bool = False,
+    index: Optional[ScanIndex] = None,
+    progress: Optional[JobProgress] = None,
+    io: Optional[IOLimits] = None,
+) -> ExactDuplicateResponse:
+    """find_exact_groups with every group materialized in one response."""
+    groups = await find_exact_groups(directory_path, algorithm, verify, index, progress, io)
+    return await get_hash_executor().run(groups.response)
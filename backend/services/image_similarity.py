@@ -1,47 +1,248 @@
+import asyncio
+import multiprocessing
 import os
-from typing import List, Tuple, Optional
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Optional
+import numpy as np
 from PIL import Image
 import imagehash
 
+import config
 from models.schemas import FileInfo, ImageDuplicateGroup, ImageDuplicateResponse
-from utils.helpers import get_file_info, is_image
+from services.hamming_index import cluster_hashes, mean_pairwise_distance, pack_hash
+from services.hash_cache import FileKey, file_key, get_hash_cache
+from services.job_manager import JobProgress
+from services.scan_index import FILE_TYPE_IMAGE, ScanIndex, load_scan_index
 
 # Hamming distance threshold for near-duplicate detection
 HASH_THRESHOLD = 10
+IMAGE_FEATURES_CACHE_KIND = "image"
+# Files per group checked for faces
+FACE_CHECK_LIMIT = 3
+# JPEGs are decoded at the smallest DCT scale still at least this big;
+# pHash only looks at a 32x32 thumbnail
+DRAFT_SIZE = (256, 256)
+# Fewer uncached images than this are decoded in-process
+POOL_MIN_IMAGES = 32
+POOL_CHUNK_SIZE = 8
+# Face detection decodes JPEGs at this draft size and runs the detector on
+# a copy no larger than FACE_DETECT_SIZE on its longest side
+FACE_DRAFT_SIZE = (640, 640)
+FACE_DETECT_SIZE = 640
+# Face checks are slow enough that a handful is worth sending to the pool
+FACE_POOL_MIN_IMAGES = 4
 
 
-def compute_phash(image_path: str) -> Optional[imagehash.ImageHash]:
-    """Compute perceptual hash of an image."""
+class ImageFeatures:
+    """
+    Everything the image pipeline needs from one decode of a file: its
+    perceptual hash, dimensions and (once requested) whether it has faces.
+    """
+
+    def __init__(self, phash: imagehash.ImageHash, width: int, height: int, has_faces: Optional[bool] = None):
+        self.phash = phash
+        self.width = width
+        self.height = height
+        self.has_faces = has_faces  # None until face detection has run
+
+    @property
+    def pixels(self) -> int:
+        return self.width * self.height
+
+    def encode(self) -> str:
+        faces = "" if self.has_faces is None else str(int(self.has_faces))
+        return f"{self.phash}|{self.width}|{self.height}|{faces}"
+
+    @classmethod
+    def decode(cls, value) -> "ImageFeatures":
+        if isinstance(value, bytes):
+            value = value.decode("ascii")
+        phash, width, height, faces = value.split("|")
+        return cls(imagehash.hex_to_hash(phash), int(width), int(height), None if faces == "" else faces == "1")
+
+
+def _resolve_key(image_path: str, key: Optional[FileKey]) -> Optional[FileKey]:
+    if key is not None:
+        return key
     try:
-        with Image.open(image_path) as img:
-            img = img.convert("L")  # Grayscale
-            return imagehash.phash(img)
+        return file_key(image_path)
+    except OSError:
+        return None
+
+
+def _open_gray(
+    image_path: str,
+    draft: bool = True,
+    draft_size: Tuple[int, int] = DRAFT_SIZE,
+) -> Tuple[int, int, Image.Image]:
+    """
+    Decode an image to grayscale. JPEGs are decoded at reduced size in
+    draft mode, falling back to a full decode if that fails.
+    """
+    if draft:
+        try:
+            with Image.open(image_path) as img:
+                if img.format == "JPEG":
+                    width, height = img.size
+                    img.draft("L", draft_size)
+                    return width, height, img.convert("L")
+        except Exception:
+            pass  # Retry below with a plain full decode
+    with Image.open(image_path) as img:
+        width, height = img.size
+        return width, height, img.convert("L")
+
+
+def decode_image_features(image_path: str, with_faces: bool = False, draft: bool = True) -> Optional[ImageFeatures]:
+    """Decode an image once and compute its feature record, bypassing the cache."""
+    try:
+        width, height, gray = _open_gray(image_path, draft, FACE_DRAFT_SIZE if with_faces else DRAFT_SIZE)
+        phash = imagehash.phash(gray)
     except Exception:
         return None
+    return ImageFeatures(phash, width, height, _detect_faces_gray(gray) if with_faces else None)
 
 
-def detect_faces(image_path: str) -> bool:
+def cached_image_features(image_path: str, key: Optional[FileKey] = None) -> Optional[ImageFeatures]:
+    """Return the cached feature record for an image without decoding it."""
+    cache = get_hash_cache()
+    key = _resolve_key(image_path, key) if cache else None
+    if key is None:
+        return None
+    value = cache.get(key, IMAGE_FEATURES_CACHE_KIND)
+    return ImageFeatures.decode(value) if value is not None else None
+
+
+def get_image_features(
+    image_path: str,
+    key: Optional[FileKey] = None,
+    with_faces: bool = False,
+) -> Optional[ImageFeatures]:
     """
-    Detect if image contains faces using a simple heuristic.
-    Falls back gracefully if opencv not available.
+    Return an image's feature record, reading through the hash cache.
+    The image is decoded at most once; with_faces adds face detection to
+    that decode (or to a cached record that lacks it).
+    """
+    # Without OpenCV there is nothing to detect, and nothing worth caching
+    with_faces = with_faces and _face_detection_available()
+    cache = get_hash_cache()
+    if cache:
+        key = _resolve_key(image_path, key)
+    features = cached_image_features(image_path, key) if cache and key is not None else None
+    if features is not None and (not with_faces or features.has_faces is not None):
+        return features
+    decoded = decode_image_features(image_path, with_faces)
+    if decoded is None:
+        return None
+    if features is not None:
+        decoded.phash = features.phash  # Keep hashes stable across decodes
+    features = decoded
+    if cache and key is not None:
+        cache.put(key, IMAGE_FEATURES_CACHE_KIND, features.encode())
+    return features
+
+
+def compute_phash(image_path: str, key: Optional[FileKey] = None) -> Optional[imagehash.ImageHash]:
+    """
+    Compute perceptual hash of an image, reading through the hash cache.
+    key is the file's cache key when the caller already has its stat.
     """
+    features = get_image_features(image_path, key)
+    return features.phash if features is not None else None
+
+
+def _face_detection_available() -> bool:
     try:
+        import cv2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# Haar cascades, loaded once per thread (classifiers are not thread-safe),
+# and so once per decode pool worker
+_cascades = threading.local()
+
+
+def _face_cascade():
+    cascade = getattr(_cascades, "face", None)
+    if cascade is None:
         import cv2
-        img = cv2.imread(image_path)
-        if img is None:
-            return False
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # Use Haar cascade if available
-        cascade_path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
-        face_cascade = cv2.CascadeClassifier(cascade_path)
-        faces = face_cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5)
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+        _cascades.face = cascade
+    return cascade
+
+
+def _detect_faces_gray(gray: Image.Image) -> bool:
+    """Run the Haar face detector on an already decoded grayscale image, downscaled."""
+    try:
+        if max(gray.size) > FACE_DETECT_SIZE:
+            gray = gray.copy()
+            gray.thumbnail((FACE_DETECT_SIZE, FACE_DETECT_SIZE))
+        faces = _face_cascade().detectMultiScale(np.asarray(gray), scaleFactor=1.1, minNeighbors=5)
         return len(faces) > 0
     except Exception:
         return False
 
 
+def _decode_with_faces(image_path: str) -> Optional[ImageFeatures]:
+    return decode_image_features(image_path, with_faces=True)
+
+
+def detect_faces_many(paths: List[str], keys: Optional[Dict[str, FileKey]] = None) -> Dict[str, bool]:
+    """
+    Whether each image has faces. Results are memoized in the file's
+    cached feature record; images not checked before are decoded and
+    checked across the image pool, so checks for many groups run at once.
+    """
+    if not _face_detection_available():
+        return {path: False for path in paths}
+    keys = keys or {}
+    cache = get_hash_cache()
+    found: Dict[str, bool] = {}
+    pending: List[Tuple[str, Optional[FileKey], Optional[ImageFeatures]]] = []
+    for path in paths:
+        key = _resolve_key(path, keys.get(path)) if cache else None
+        record = cached_image_features(path, key) if key is not None else None
+        if record is not None and record.has_faces is not None:
+            found[path] = record.has_faces
+        else:
+            pending.append((path, key, record))
+
+    misses = [path for path, _, _ in pending]
+    pool = get_image_pool() if len(misses) >= FACE_POOL_MIN_IMAGES else None
+    if pool is not None:
+        results = pool.map(_decode_with_faces, misses, chunksize=1)
+    else:
+        results = map(_decode_with_faces, misses)
+    for (path, key, record), decoded in zip(pending, results):
+        if decoded is None:
+            found[path] = False
+            continue
+        if record is not None:
+            decoded.phash = record.phash  # Keep hashes stable across decodes
+        found[path] = bool(decoded.has_faces)
+        if cache and key is not None:
+            cache.put(key, IMAGE_FEATURES_CACHE_KIND, decoded.encode())
+    if cache and pending:
+        cache.flush()
+    return found
+
+
+def detect_faces(image_path: str) -> bool:
+    """
+    Detect if image contains faces using a simple heuristic.
+    Falls back gracefully if opencv not available.
+    """
+    return detect_faces_many([image_path])[image_path]
+
+
 def get_image_resolution(image_path: str) -> Tuple[int, int]:
     """Return (width, height) of an image."""
+    features = cached_image_features(image_path)
+    if features is not None:
+        return features.width, features.height
     try:
         with Image.open(image_path) as img:
             return img.size
@@ -49,90 +250,177 @@ def get_image_resolution(image_path: str) -> Tuple[int, int]:
         return (0, 0)
 
 
-async def find_image_duplicates(directory_path: str, threshold: int = HASH_THRESHOLD) -> ImageDuplicateResponse:
+# Lazy process pool for decoding, shared by all scans
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_image_pool() -> Optional[ProcessPoolExecutor]:
+    """Return the decode process pool, or None when configured for one worker."""
+    global _pool
+    if config.IMAGE_WORKERS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process with live threads and SQLite handles is unsafe
+            _pool = ProcessPoolExecutor(config.IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _compute_features(
+    index: ScanIndex,
+    rows: Dict[str, int],
+    progress: Optional[JobProgress] = None,
+) -> List[Tuple[str, ImageFeatures]]:
     """
-    Find near-duplicate images using perceptual hashing.
-    Groups images whose perceptual hash Hamming distance < threshold.
+    Return a feature record for every decodable image in rows. Cached
+    records are reused; the rest are decoded across the process pool.
     """
-    # Collect all images
-    image_files: List[str] = []
-    for root, dirs, files in os.walk(directory_path):
-        dirs[:] = [d for d in dirs if not d.startswith(".")]
-        for f in files:
-            path = os.path.join(root, f)
-            if is_image(path):
-                image_files.append(path)
-
-    # Compute hashes
-    hashes: List[Tuple[str, imagehash.ImageHash]] = []
-    for path in image_files:
-        h = compute_phash(path)
-        if h is not None:
-            hashes.append((path, h))
-
-    # Cluster by Hamming distance (greedy grouping)
-    visited = set()
-    groups: List[List[str]] = []
-
-    for i, (path_i, hash_i) in enumerate(hashes):
-        if path_i in visited:
+    if progress:
+        progress.set_stage("phash", files_total=len(rows))
+    cache = get_hash_cache()
+    found: Dict[str, ImageFeatures] = {}
+    misses: List[str] = []
+    for path, row in rows.items():
+        f = cached_image_features(path, index.file_key(row)) if cache else None
+        if f is None:
+            misses.append(path)
             continue
-        group = [path_i]
-        visited.add(path_i)
-        for j, (path_j, hash_j) in enumerate(hashes):
-            if path_j in visited:
-                continue
-            distance = hash_i - hash_j
-            if distance < threshold:
-                group.append(path_j)
-                visited.add(path_j)
-        if len(group) > 1:
-            groups.append(group)
+        found[path] = f
+        if progress:
+            progress.add_processed(1, index.sizes[row])
 
-    # Build response
-    duplicate_groups: List[ImageDuplicateGroup] = []
-    total_recoverable = 0
-
-    for group in groups:
-        file_infos = []
-        for p in group:
-            try:
-                file_infos.append(get_file_info(p))
-            except OSError:
-                continue
+    pool = get_image_pool() if len(misses) >= POOL_MIN_IMAGES else None
+    if pool is not None:
+        results = pool.map(decode_image_features, misses, chunksize=POOL_CHUNK_SIZE)
+    else:
+        results = map(decode_image_features, misses)
+    for path, f in zip(misses, results):
+        if progress:
+            # Leaving the loop cancels the pool work not yet started
+            progress.check_cancelled()
+            progress.add_processed(1, index.sizes[rows[path]])
+        if f is None:
+            continue
+        found[path] = f
+        if cache:
+            cache.put(index.file_key(rows[path]), IMAGE_FEATURES_CACHE_KIND, f.encode())
+    if cache:
+        cache.flush()
+    return [(path, found[path]) for path in rows if path in found]
 
-        if len(file_infos) < 2:
+
+def load_image_features(paths: List[str]) -> Dict[str, ImageFeatures]:
+    """
+    Feature records for images outside a scan (e.g. from a request), from
+    the cache where possible; the rest are decoded across the process pool.
+    """
+    cache = get_hash_cache()
+    keys = {p: _resolve_key(p, None) for p in paths}
+    found: Dict[str, ImageFeatures] = {}
+    misses: List[str] = []
+    for path in paths:
+        f = cached_image_features(path, keys[path]) if cache and keys[path] else None
+        if f is None:
+            misses.append(path)
+        else:
+            found[path] = f
+    pool = get_image_pool() if len(misses) >= POOL_MIN_IMAGES else None
+    if pool is not None:
+        results = pool.map(decode_image_features, misses, chunksize=POOL_CHUNK_SIZE)
+    else:
+        results = map(decode_image_features, misses)
+    for path, f in zip(misses, results):
+        if f is None:
             continue
+        found[path] = f
+        if cache and keys[path]:
+            cache.put(keys[path], IMAGE_FEATURES_CACHE_KIND, f.encode())
+    if cache:
+        cache.flush()
+    return found
 
-        # Representative = largest resolution
-        best = max(file_infos, key=lambda f: os.path.getsize(f.path))
-        recoverable = sum(fi.size for fi in file_infos) - best.size
-        total_recoverable += recoverable
 
-        has_faces = any(detect_faces(fi.path) for fi in file_infos[:3])  # Check first 3 to save time
+def _build_groups(
+    index: ScanIndex,
+    rows: Dict[str, int],
+    features: List[Tuple[str, ImageFeatures]],
+    values: np.ndarray,
+    clusters: List[List[int]],
+) -> List[ImageDuplicateGroup]:
+    # Check the first few files of each group for faces, one position per
+    # round: a group stops at its first face, and each round's checks for
+    # every group run across the pool together
+    has_faces = [False] * len(clusters)
+    for position in range(FACE_CHECK_LIMIT):
+        unchecked: Dict[str, int] = {}
+        for g, members in enumerate(clusters):
+            if has_faces[g] or position >= len(members):
+                continue
+            path, record = features[members[position]]
+            if record.has_faces is None:
+                unchecked[path] = g
+            elif record.has_faces:
+                has_faces[g] = True
+        if unchecked and _face_detection_available():
+            keys = {path: index.file_key(rows[path]) for path in unchecked}
+            for path, found in detect_faces_many(list(unchecked), keys).items():
+                has_faces[unchecked[path]] = has_faces[unchecked[path]] or found
+
+    duplicate_groups: List[ImageDuplicateGroup] = []
+    for g, members in enumerate(clusters):
+        file_infos = [index.file_info(rows[features[m][0]]) for m in members]
+        records = [features[m][1] for m in members]
+
+        # Representative = largest resolution, then largest file
+        best_pos = max(range(len(members)), key=lambda k: (records[k].pixels, file_infos[k].size))
+        best = file_infos[best_pos]
+        recoverable = sum(fi.size for fi in file_infos) - best.size
 
         # Calculate average similarity
-        phash_vals = [compute_phash(fi.path) for fi in file_infos]
-        phash_vals = [h for h in phash_vals if h is not None]
-        if len(phash_vals) > 1:
-            distances = []
-            for a in range(len(phash_vals)):
-                for b in range(a + 1, len(phash_vals)):
-                    distances.append(phash_vals[a] - phash_vals[b])
-            avg_distance = sum(distances) / len(distances)
-            similarity = max(0.0, 1.0 - avg_distance / 64.0)
-        else:
-            similarity = 1.0
+        avg_distance = mean_pairwise_distance(values[members])
+        similarity = max(0.0, 1.0 - avg_distance / 64.0)
 
         duplicate_groups.append(ImageDuplicateGroup(
             representative=best,
             files=file_infos,
             similarity_score=round(similarity, 3),
             recoverable_space=recoverable,
-            has_faces=has_faces,
+            has_faces=has_faces[g],
         ))
+    return duplicate_groups
 
+
+async def find_image_duplicates(
+    directory_path: str,
+    threshold: int = HASH_THRESHOLD,
+    index: Optional[ScanIndex] = None,
+    progress: Optional[JobProgress] = None,
+) -> ImageDuplicateResponse:
+    """
+    Find near-duplicate images using perceptual hashing.
+    Images whose perceptual hash Hamming distance < threshold are linked,
+    and groups are the connected components of those links.
+    Pass an existing index to reuse its walk.
+    """
+    if index is None:
+        index = await load_scan_index(directory_path, progress)
+
+    # Collect all images
+    rows: Dict[str, int] = {index.paths[i]: i for i in index.rows_of_type(FILE_TYPE_IMAGE)}
+
+    # Decode each image once for its hash and dimensions
+    features = await asyncio.to_thread(_compute_features, index, rows, progress)
+    if progress:
+        progress.set_stage("cluster")
+
+    # Cluster by Hamming distance over packed 64-bit hashes
+    values = np.fromiter((pack_hash(f.phash.hash) for _, f in features), dtype=np.uint64, count=len(features))
+    clusters = await asyncio.to_thread(cluster_hashes, values, threshold)
+
+    # Build response
+    duplicate_groups = await asyncio.to_thread(_build_groups, index, rows, features, values, clusters)
     return ImageDuplicateResponse(
         duplicate_groups=duplicate_groups,
-        recoverable_space=total_recoverable,
+        recoverable_space=sum(g.recoverable_space for g in duplicate_groups),
     )
@@ -0,0 +1,126 @@
+import ctypes
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Up to this many seconds of a rate may be spent in one burst
+BURST_SECONDS = 1.0
+
+# ioprio_set(2): syscall numbers per architecture, and the idle class
+_IOPRIO_SET = {"x86_64": 251, "aarch64": 30, "i386": 289, "i686": 289, "armv7l": 314, "ppc64le": 273}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+# Lowest CPU scheduling priority
+IDLE_NICE = 19
+
+
+class IOLimits:
+    """
+    Read budget of one job. charge() is called after every read and sleeps
+    the calling thread once the job runs ahead of bytes_per_sec or
+    ops_per_sec, so the caps hold across all threads hashing for the job.
+    idle jobs hash on threads with idle I/O and CPU priority, and with
+    drop_cache the pages of every file read are dropped from the page cache
+    once it is done, so hashing does not evict other workloads' data.
+    """
+
+    def __init__(
+        self,
+        bytes_per_sec: Optional[int] = None,
+        ops_per_sec: Optional[int] = None,
+        idle: bool = False,
+        drop_cache: bool = False,
+    ):
+        for name, value in (("io_bytes_per_sec", bytes_per_sec), ("io_ops_per_sec", ops_per_sec)):
+            if value is not None and value < 0:
+                raise ValueError(f"{name} must not be negative")
+        # 0 means no cap, as in the configured defaults
+        self.bytes_per_sec = bytes_per_sec or None
+        self.ops_per_sec = ops_per_sec or None
+        self.idle = idle
+        self.drop_cache = drop_cache
+        self._lock = threading.Lock()
+        # Time by which the budget used so far is earned, per cap
+        self._bytes_due = 0.0
+        self._ops_due = 0.0
+
+    @property
+    def throttled(self) -> bool:
+        return bool(self.bytes_per_sec or self.ops_per_sec)
+
+    def charge(self, nbytes: int, ops: int = 1) -> None:
+        """Account for ops reads totalling nbytes, sleeping while over budget."""
+        if not self.throttled:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.bytes_per_sec:
+                self._bytes_due = max(self._bytes_due, now - BURST_SECONDS) + nbytes / self.bytes_per_sec
+                wait = max(wait, self._bytes_due - now)
+            if self.ops_per_sec:
+                self._ops_due = max(self._ops_due, now - BURST_SECONDS) + ops / self.ops_per_sec
+                wait = max(wait, self._ops_due - now)
+        if wait > 0:
+            time.sleep(wait)
+
+    def done(self, fd: int) -> None:
+        """Called with the descriptor of each file once it has been read."""
+        if self.drop_cache and hasattr(os, "posix_fadvise"):
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            except OSError:
+                pass
+
+
+def io_limits(
+    bytes_per_sec: Optional[int] = None,
+    ops_per_sec: Optional[int] = None,
+    idle: Optional[bool] = None,
+    drop_cache: Optional[bool] = None,
+) -> Optional[IOLimits]:
+    """
+    Limits for a job from request settings, falling back to the configured
+    defaults for those not given; a cap of 0 lifts the default. None when
+    nothing is limited.
+    """
+    limits = IOLimits(
+        bytes_per_sec if bytes_per_sec is not None else config.IO_BYTES_PER_SEC,
+        ops_per_sec if ops_per_sec is not None else config.IO_OPS_PER_SEC,
+        idle if idle is not None else config.IO_IDLE,
+        drop_cache if drop_cache is not None else config.IO_DROP_CACHE,
+    )
+    if not (limits.throttled or limits.idle or limits.drop_cache):
+        return None
+    return limits
+
+
+def lower_thread_priority() -> None:
+    """
+    Put the calling thread in the idle I/O class and at the lowest CPU
+    priority. Linux only: elsewhere both apply to the whole process.
+    Unprivileged threads cannot raise them back, so this is meant for
+    threads dedicated to idle work.
+    """
+    if not sys.platform.startswith("linux"):
+        return
+    tid = threading.get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, IDLE_NICE)
+    except OSError as e:
+        logger.debug("Could not lower CPU priority: %s", e)
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is None:
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.syscall(number, _IOPRIO_WHO_PROCESS, tid, _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT) != 0:
+        logger.debug("Could not set idle I/O priority: errno %d", ctypes.get_errno())
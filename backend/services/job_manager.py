@@ -0,0 +1,253 @@
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import config
+from models.schemas import JobProgressInfo, JobStatus
+
+# Seconds between progress events on a job stream
+EVENT_INTERVAL = 0.5
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's work when the job has been cancelled."""
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting to run."""
+
+
+class JobProgress:
+    """
+    Progress counters for a running job. Services update these from worker
+    threads; plain attribute updates are safe enough for reporting.
+    """
+
+    def __init__(self):
+        self.stage = "queued"
+        self.files_walked = 0
+        self.files_processed = 0
+        self.files_total = 0
+        self.bytes_hashed = 0  # Across all stages
+        self.stage_bytes = 0
+        self.bytes_total = 0
+        self.stage_started = time.time()
+        self._cancelled = threading.Event()
+
+    def set_stage(self, stage: str, files_total: int = 0, bytes_total: int = 0) -> None:
+        """Start a new stage; throughput and ETA are measured per stage."""
+        self.stage = stage
+        self.files_processed = 0
+        self.files_total = files_total
+        self.stage_bytes = 0
+        self.bytes_total = bytes_total
+        self.stage_started = time.time()
+
+    def add_walked(self, count: int = 1) -> None:
+        self.files_walked += count
+
+    def add_processed(self, count: int = 1, nbytes: int = 0) -> None:
+        self.files_processed += count
+        self.stage_bytes += nbytes
+        self.bytes_hashed += nbytes
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check_cancelled(self) -> None:
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def snapshot(self) -> JobProgressInfo:
+        elapsed = max(time.time() - self.stage_started, 1e-6)
+        if self.bytes_total:
+            throughput = self.stage_bytes / elapsed
+            remaining = self.bytes_total - self.stage_bytes
+        else:
+            throughput = self.files_processed / elapsed
+            remaining = self.files_total - self.files_processed
+        eta = remaining / throughput if throughput > 0 and remaining > 0 else None
+        return JobProgressInfo(
+            stage=self.stage,
+            files_walked=self.files_walked,
+            files_processed=self.files_processed,
+            files_total=self.files_total,
+            bytes_hashed=self.bytes_hashed,
+            bytes_total=self.bytes_total,
+            throughput=round(throughput, 1),
+            throughput_unit="bytes/s" if self.bytes_total else "files/s",
+            eta_seconds=round(eta, 1) if eta is not None else None,
+        )
+
+
+class Job:
+    def __init__(self, kind: str, directory_path: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.directory_path = directory_path
+        self.status = JOB_QUEUED
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.exception: Optional[BaseException] = None
+        self.result: Any = None
+        self.progress = JobProgress()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    def snapshot(self) -> JobStatus:
+        return JobStatus(
+            job_id=self.id,
+            kind=self.kind,
+            directory_path=self.directory_path,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            progress=self.progress.snapshot(),
+            error=self.error,
+        )
+
+
+JobFunc = Callable[[JobProgress], Awaitable[Any]]
+
+
+class JobManager:
+    """
+    Runs scans as background asyncio tasks, at most max_concurrent at a time.
+    Finished jobs are kept (up to max_history, for result_ttl seconds) so
+    their results can be fetched. Jobs run on behalf of a waiting request
+    are dropped as soon as they finish, since the request has the result.
+    """
+
+    def __init__(self, max_concurrent: int, max_queued: int, max_history: int, result_ttl: float):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.max_history = max_history
+        self.result_ttl = result_ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def submit(self, kind: str, directory_path: str, func: JobFunc, retain: bool = True) -> Job:
+        """
+        Schedule func(progress) as a background job and return it. Without
+        retain the job is forgotten once finished.
+        """
+        queued = sum(1 for j in self._jobs.values() if j.status == JOB_QUEUED)
+        if queued >= self.max_queued:
+            raise JobQueueFull(f"Too many queued jobs ({queued}); try again later")
+        job = Job(kind, directory_path)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, func, retain))
+        self._prune()
+        return job
+
+    async def _run(self, job: Job, func: JobFunc, retain: bool) -> None:
+        try:
+            async with self._slots():
+                job.progress.check_cancelled()
+                job.status = JOB_RUNNING
+                job.started_at = time.time()
+                job.result = await func(job.progress)
+                job.status = JOB_COMPLETED
+        except (asyncio.CancelledError, JobCancelled):
+            job.status = JOB_CANCELLED
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            job.exception = e
+        finally:
+            job.finished_at = time.time()
+            job.progress.stage = job.status
+            if not retain:
+                self._jobs.pop(job.id, None)
+
+    def _prune(self) -> None:
+        expired = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < expired]:
+            del self._jobs[job_id]
+        finished = [j.id for j in self._jobs.values() if j.finished]
+        for job_id in finished[:max(0, len(finished) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        self._prune()
+        return list(self._jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and not job.finished:
+            job.progress.cancel()
+            if job.task is not None:
+                job.task.cancel()
+        return job
+
+    async def wait(self, job: Job) -> Any:
+        """Wait for job and return its result, re-raising its failure."""
+        await asyncio.shield(job.task)
+        if job.status == JOB_FAILED and job.exception is not None:
+            raise job.exception
+        if job.status == JOB_CANCELLED:
+            raise JobCancelled(f"Job {job.id} was cancelled")
+        return job.result
+
+    async def run(self, kind: str, directory_path: str, func: JobFunc) -> Any:
+        """Submit func as a job and wait for its result."""
+        job = self.submit(kind, directory_path, func, retain=False)
+        try:
+            return await self.wait(job)
+        except asyncio.CancelledError:
+            # Caller went away; stop the work it was waiting for
+            self.cancel(job.id)
+            raise
+
+    async def events(self, job: Job) -> AsyncIterator[JobStatus]:
+        """Yield status snapshots until the job finishes."""
+        while True:
+            yield job.snapshot()
+            if job.finished:
+                return
+            await asyncio.sleep(EVENT_INTERVAL)
+
+
+# Lazy singleton
+_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        _manager = JobManager(
+            config.JOB_MAX_CONCURRENT, config.JOB_MAX_QUEUED, config.JOB_HISTORY, config.JOB_RESULT_TTL
+        )
+    return _manager
@@ -0,0 +1,155 @@
+import re
+import zlib
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# MinHash signature length, split into LSH bands of BAND_ROWS rows. With
+# 16 bands of 8 rows, documents with Jaccard similarity 0.8 share a bucket
+# with probability ~0.95, and ones at 0.5 only ~0.06.
+NUM_PERM = 128
+BAND_ROWS = 8
+BANDS = NUM_PERM // BAND_ROWS
+SHINGLE_SIZE = 3
+# Shingles hashed against all permutations at once
+SHINGLE_BLOCK = 4096
+# Signatures cover the whole document, not just the embedded prefix
+MINHASH_CACHE_KIND = f"minhash:{NUM_PERM}:full"
+
+_PRIME = np.uint64((1 << 32) - 5)
+_rng = np.random.default_rng(0x5EED)
+# Fixed permutations, so cached signatures stay comparable across runs
+_PERM_A = _rng.integers(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _mix_shingles(h: np.ndarray) -> np.ndarray:
+    """Rolling hash of each SHINGLE_SIZE-token window of the token hashes h."""
+    mixed = h[:len(h) - SHINGLE_SIZE + 1].copy()
+    for k in range(1, SHINGLE_SIZE):
+        mixed = (mixed * np.uint64(0x9E3779B1) + h[k:len(h) - SHINGLE_SIZE + 1 + k]) & np.uint64(0xFFFFFFFF)
+    return mixed
+
+
+def _token_hashes(tokens: List[str]) -> np.ndarray:
+    return np.fromiter(
+        (zlib.crc32(t.encode("utf-8", "surrogatepass")) for t in tokens), dtype=np.uint64, count=len(tokens)
+    )
+
+
+def shingle_hashes(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct word SHINGLE_SIZE-grams of text."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    h = _token_hashes(tokens)
+    if len(h) >= SHINGLE_SIZE:
+        h = _mix_shingles(h)
+    return np.unique(h)
+
+
+class MinHasher:
+    """
+    MinHash signature built from text fed in pieces, so a document can be
+    fingerprinted while streaming it. The shingle window rolls across piece
+    boundaries, and a word split between pieces is joined back up, so the
+    result equals minhash_signature() of the concatenated text.
+    """
+
+    def __init__(self):
+        self._signature = np.full(NUM_PERM, np.iinfo(np.uint64).max, dtype=np.uint64)
+        self._tail = np.empty(0, dtype=np.uint64)  # Last SHINGLE_SIZE - 1 token hashes
+        self._partial = ""  # Trailing word that may continue in the next piece
+        self.tokens = 0
+
+    def _add_tokens(self, tokens: List[str]) -> None:
+        if not tokens:
+            return
+        self.tokens += len(tokens)
+        h = np.concatenate([self._tail, _token_hashes(tokens)])
+        if len(h) >= SHINGLE_SIZE:
+            self._add_shingles(np.unique(_mix_shingles(h)))
+        self._tail = h[-(SHINGLE_SIZE - 1):]
+
+    def _add_shingles(self, shingles: np.ndarray) -> None:
+        for start in range(0, len(shingles), SHINGLE_BLOCK):
+            block = shingles[start:start + SHINGLE_BLOCK]
+            values = (_PERM_A[:, None] * block[None, :] + _PERM_B[:, None]) % _PRIME
+            np.minimum(self._signature, values.min(axis=1), out=self._signature)
+
+    def update(self, text: str) -> None:
+        text = self._partial + text.lower()
+        tokens = _TOKEN_RE.findall(text)
+        self._partial = ""
+        if tokens and _TOKEN_RE.match(text[-1]):
+            self._partial = tokens.pop()
+        self._add_tokens(tokens)
+
+    def signature(self) -> np.ndarray:
+        """MinHash signature (NUM_PERM uint32 values), or empty for text without words."""
+        if self._partial:
+            self._add_tokens([self._partial])
+            self._partial = ""
+        if not self.tokens:
+            return np.empty(0, dtype=np.uint32)
+        if self.tokens < SHINGLE_SIZE:
+            # Too short for a single shingle: use the tokens themselves
+            self._add_shingles(np.unique(self._tail))
+        return self._signature.astype(np.uint32)
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) of text's shingles, or empty."""
+    hasher = MinHasher()
+    hasher.update(text)
+    return hasher.signature()
+
+
+def estimated_jaccard(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Fraction of agreeing signature slots, row by row."""
+    return (a == b).mean(axis=-1)
+
+
+def candidate_pairs(signatures: np.ndarray) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Yield (i, j) arrays of documents sharing an LSH bucket. Within a bucket
+    every member is paired with the first and with its successor, which is
+    enough for union-find and stays linear in the bucket size.
+    """
+    for band in range(BANDS):
+        keys = np.ascontiguousarray(signatures[:, band * BAND_ROWS:(band + 1) * BAND_ROWS])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * BAND_ROWS))).ravel()
+        _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        shared = counts[inverse] > 1
+        members = np.flatnonzero(shared)
+        if not len(members):
+            continue
+        order = members[np.argsort(inverse[members], kind="stable")]
+        buckets = inverse[order]
+        same = buckets[1:] == buckets[:-1]
+        # Successor pairs
+        yield order[:-1][same], order[1:][same]
+        # Pairs with the first member of each bucket
+        starts = np.flatnonzero(np.r_[True, ~same])
+        first = np.repeat(order[starts], np.diff(np.r_[starts, len(order)]))
+        not_first = first != order
+        yield first[not_first], order[not_first]
+
+
+def similar_pairs(signatures: np.ndarray, threshold: float) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Yield (i, j, estimated Jaccard) for LSH candidates at or above threshold."""
+    for i, j in candidate_pairs(signatures):
+        if not len(i):
+            continue
+        sims = estimated_jaccard(signatures[i], signatures[j])
+        keep = sims >= threshold
+        yield i[keep], j[keep], sims[keep]
+
+
+def decode_signature(value: bytes) -> np.ndarray:
+    return np.frombuffer(value, dtype=np.uint32)
+
+
+def stack_signatures(signatures: List[np.ndarray]) -> np.ndarray:
+    return np.stack(signatures) if signatures else np.empty((0, NUM_PERM), dtype=np.uint32)
@@ -1,8 +1,16 @@
 import os
-from typing import List, Dict
-from PIL import Image
-
-from models.schemas import FileInfo, RecommendationScores, RecommendationResponse
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from models.schemas import (
+    CleanPlanResponse,
+    FileInfo,
+    GroupCleanPlan,
+    RecommendationResponse,
+    RecommendationScores,
+)
+from services.image_similarity import ImageFeatures, detect_faces_many, get_image_resolution, load_image_features
 from utils.helpers import is_image
 
 
@@ -27,23 +35,18 @@ WEIGHTS = {
 }
 
 
-def get_resolution_score(file_path: str) -> float:
-    """Return normalized resolution score for images, 0 for others."""
+def get_resolution_score(file_path: str, features: Optional[ImageFeatures] = None) -> float:
+    """
+    Return normalized resolution score for images, 0 for others.
+    features is the image's ImageFeatures record when the caller has it.
+    """
     if not is_image(file_path):
         return 0.5  # Neutral for non-images
-    try:
-        with Image.open(file_path) as img:
-            w, h = img.size
-            return min(1.0, (w * h) / (4096 * 4096))
-    except Exception:
-        return 0.0
-
-
-def get_recency_score(file_info: FileInfo, min_time: float, max_time: float) -> float:
-    """Newer files score higher."""
-    if max_time == min_time:
-        return 1.0
-    return (file_info.last_modified - min_time) / (max_time - min_time)
+    if features is not None:
+        w, h = features.width, features.height
+    else:
+        w, h = get_image_resolution(file_path)
+    return min(1.0, (w * h) / (4096 * 4096))
 
 
 def get_folder_priority_score(file_path: str) -> float:
@@ -57,71 +60,125 @@ def get_folder_priority_score(file_path: str) -> float:
     return max(0.0, min(1.0, (score + 5) / 10))
 
 
-def get_size_score(file_info: FileInfo, min_size: int, max_size: int) -> float:
-    """Larger files score higher (more data preserved)."""
-    if max_size == min_size:
-        return 1.0
-    return (file_info.size - min_size) / (max_size - min_size)
+def _normalize_in_groups(values: np.ndarray, starts: np.ndarray, group_of: np.ndarray) -> np.ndarray:
+    """Min-max scale values within each group; groups with one distinct value score 1."""
+    low = np.minimum.reduceat(values, starts)[group_of]
+    span = np.maximum.reduceat(values, starts)[group_of] - low
+    return np.where(span > 0, (values - low) / np.where(span > 0, span, 1), 1.0)
 
 
-def compute_recommendation(files: List[FileInfo]) -> RecommendationResponse:
+def recommend_groups(
+    groups: List[List[FileInfo]],
+    features: Optional[Dict[str, ImageFeatures]] = None,
+) -> List[RecommendationResponse]:
     """
-    Score each file and return the best one to keep.
+    Score every file of every group in one pass and return the best file
+    to keep per group. Recency and size are normalized within each group
+    with segmented NumPy reductions, so newer and larger files (more data
+    preserved) score higher.
     Score = weighted sum of (resolution, recency, folder_priority, size)
+    features maps image paths to ImageFeatures already computed for them;
+    other images are looked up in the hash cache before being opened.
     """
-    if not files:
+    features = features or {}
+    if not groups or any(not group for group in groups):
         raise ValueError("No files provided for recommendation")
 
-    min_time = min(f.last_modified for f in files)
-    max_time = max(f.last_modified for f in files)
-    min_size = min(f.size for f in files)
-    max_size = max(f.size for f in files)
-
-    scores_map: Dict[str, RecommendationScores] = {}
-
-    for file in files:
-        resolution = get_resolution_score(file.path)
-        recency = get_recency_score(file, min_time, max_time)
-        folder = get_folder_priority_score(file.path)
-        size = get_size_score(file, min_size, max_size)
-
-        total = (
-            WEIGHTS["resolution"] * resolution
-            + WEIGHTS["recency"] * recency
-            + WEIGHTS["folder_priority"] * folder
-            + WEIGHTS["size"] * size
-        )
-
-        scores_map[file.path] = RecommendationScores(
-            resolution_score=round(resolution, 3),
-            recency_score=round(recency, 3),
-            folder_priority_score=round(folder, 3),
-            size_score=round(size, 3),
-            total_score=round(total, 3),
-        )
-
-    best_path = max(scores_map, key=lambda p: scores_map[p].total_score)
-    recommended = next(f for f in files if f.path == best_path)
-
-    # Check emotional importance (face detection)
-    from services.image_similarity import detect_faces
-    emotional = is_image(best_path) and detect_faces(best_path)
-
-    reason_parts = []
-    best_scores = scores_map[best_path]
-    if best_scores.recency_score > 0.7:
-        reason_parts.append("most recently modified")
-    if best_scores.resolution_score > 0.7:
-        reason_parts.append("highest resolution")
-    if best_scores.folder_priority_score > 0.6:
-        reason_parts.append("preferred folder location")
-    if best_scores.size_score > 0.7:
-        reason_parts.append("largest file size")
-    reason = "Recommended because: " + (", ".join(reason_parts) if reason_parts else "best overall score")
-
-    return RecommendationResponse(
-        recommended_file=recommended,
-        scores={path: score for path, score in scores_map.items()},
-        emotional_importance=emotional,
-        reason=reason,
+    files = [f for group in groups for f in group]
+    counts = np.array([len(group) for group in groups])
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    group_of = np.repeat(np.arange(len(groups)), counts)
+
+    resolution = np.array([get_resolution_score(f.path, features.get(f.path)) for f in files])
+    recency = _normalize_in_groups(np.array([f.last_modified for f in files], dtype=np.float64), starts, group_of)
+    folder = np.array([get_folder_priority_score(f.path) for f in files])
+    size = _normalize_in_groups(np.array([f.size for f in files], dtype=np.float64), starts, group_of)
+    total = (
+        WEIGHTS["resolution"] * resolution
+        + WEIGHTS["recency"] * recency
+        + WEIGHTS["folder_priority"] * folder
+        + WEIGHTS["size"] * size
+    )
+    scores = np.round(np.stack([resolution, recency, folder, size, total]), 3)
+
+    # First file with the highest rounded total in each group
+    order = np.lexsort((np.arange(len(files)), -scores[4], group_of))
+    best_rows = order[starts]
+
+    # Check emotional importance (face detection) of every recommended
+    # image at once, reusing face results already in the feature records
+    emotional: Dict[str, bool] = {}
+    unchecked: List[str] = []
+    for best in best_rows.tolist():
+        path = files[best].path
+        record = features.get(path)
+        if record is not None and record.has_faces is not None:
+            emotional[path] = record.has_faces
+        elif is_image(path):
+            unchecked.append(path)
+    if unchecked:
+        emotional.update(detect_faces_many(unchecked))
+
+    results: List[RecommendationResponse] = []
+    for k, best in enumerate(best_rows.tolist()):
+        rows = range(starts[k], starts[k] + counts[k])
+        scores_map: Dict[str, RecommendationScores] = {
+            files[i].path: RecommendationScores(
+                resolution_score=scores[0, i],
+                recency_score=scores[1, i],
+                folder_priority_score=scores[2, i],
+                size_score=scores[3, i],
+                total_score=scores[4, i],
+            )
+            for i in rows
+        }
+        recommended = files[best]
+
+        reason_parts = []
+        if scores[1, best] > 0.7:
+            reason_parts.append("most recently modified")
+        if scores[0, best] > 0.7:
+            reason_parts.append("highest resolution")
+        if scores[2, best] > 0.6:
+            reason_parts.append("preferred folder location")
+        if scores[3, best] > 0.7:
+            reason_parts.append("largest file size")
+        reason = "Recommended because: " + (", ".join(reason_parts) if reason_parts else "best overall score")
+
+        results.append(RecommendationResponse(
+            recommended_file=recommended,
+            scores=scores_map,
+            emotional_importance=emotional.get(recommended.path, False),
+            reason=reason,
+        ))
+    return results
+
+
+def compute_recommendation(files: List[FileInfo], features: Optional[Dict[str, ImageFeatures]] = None) -> RecommendationResponse:
+    """Score each file of one group and return the best one to keep."""
+    return recommend_groups([files], features)[0]
+
+
+def build_clean_plan(groups: List[List[FileInfo]]) -> CleanPlanResponse:
+    """
+    Recommend a file to keep in every group and list the rest for deletion.
+    Image sizes and face results come from the per-file feature cache; only
+    images never seen before are decoded, across the image pool.
+    """
+    image_paths = list(dict.fromkeys(f.path for group in groups for f in group if is_image(f.path)))
+    features = load_image_features(image_paths) if image_paths else {}
+    plans: List[GroupCleanPlan] = []
+    for group, recommendation in zip(groups, recommend_groups(groups, features)):
+        keep = recommendation.recommended_file.path
+        files_to_delete = [f for f in group if f.path != keep]
+        plans.append(GroupCleanPlan(
+            recommendation=recommendation,
+            files_to_delete=files_to_delete,
+            space_freed=sum(f.size for f in files_to_delete),
+        ))
+    return CleanPlanResponse(
+        groups=plans,
+        files_to_delete=sum(len(p.files_to_delete) for p in plans),
+        space_freed=sum(p.space_freed for p in plans),
+        simulation=True,
     )
@@ -0,0 +1,306 @@
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+import config
+from models.schemas import FileInfo, ResultQuery
+from services.hash_service import ExactGroups
+from services.scan_index import ScanIndex, get_scan_index, iter_tree, lookup_extension_id, make_file_info
+
+FILE_SORT_KEYS = ("path", "name", "size", "modified")
+GROUP_SORT_KEYS = ("recoverable_space", "size", "files", "similarity")
+MAX_PAGE_SIZE = 10000
+# Records serialized per chunk of an NDJSON stream
+STREAM_BATCH = 256
+
+
+class CursorExpired(Exception):
+    pass
+
+
+class _Ordering:
+    """Filtered, sorted positions into a result that pages are cut from."""
+
+    def __init__(self, kind: str, source: Any, order: np.ndarray, total_size: int):
+        self.kind = kind
+        self.source = source
+        self.order = order
+        self.total_size = total_size
+        self.created = time.time()
+
+
+# Orderings by cursor token. Each keeps its source alive, so later pages
+# come from the same snapshot even if the tree has been rescanned since.
+# Sources are a scan index or ExactGroups, both compact rows that models
+# are built from page by page, or the group models of similarity results.
+_orderings: "OrderedDict[str, _Ordering]" = OrderedDict()
+_orderings_lock = threading.Lock()
+
+
+def _register(ordering: _Ordering) -> str:
+    token = secrets.token_urlsafe(9)
+    with _orderings_lock:
+        now = time.time()
+        for key in [k for k, o in _orderings.items() if now - o.created > config.CURSOR_TTL]:
+            del _orderings[key]
+        _orderings[token] = ordering
+        while len(_orderings) > config.CURSOR_MAX_OPEN:
+            _orderings.popitem(last=False)
+    return token
+
+
+def _resume(cursor: str, kind: str) -> Tuple[str, _Ordering, int]:
+    token, _, offset = cursor.partition(".")
+    with _orderings_lock:
+        ordering = _orderings.get(token)
+        if ordering is not None and time.time() - ordering.created > config.CURSOR_TTL:
+            del _orderings[token]
+            ordering = None
+        if ordering is not None:
+            _orderings.move_to_end(token)
+    if ordering is None or ordering.kind != kind or not offset.isdigit():
+        raise CursorExpired("Cursor is invalid or has expired; request the first page again")
+    return token, ordering, int(offset)
+
+
+def _check_limit(limit: int) -> None:
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+
+def _page(ordering: _Ordering, token: str, offset: int, limit: int) -> Tuple[np.ndarray, Optional[str]]:
+    positions = ordering.order[offset:offset + limit]
+    end = offset + len(positions)
+    return positions, f"{token}.{end}" if end < len(ordering.order) else None
+
+
+def _normalize_extensions(extensions: Optional[List[str]]) -> Optional[set]:
+    if not extensions:
+        return None
+    return {e.lower() if e.startswith(".") else "." + e.lower() for e in extensions}
+
+
+def _normalize_directory(directory: Optional[str]) -> Optional[str]:
+    return os.path.join(os.path.abspath(directory), "") if directory else None
+
+
+def _path_matches(path: str, extensions: Optional[set], directory: Optional[str]) -> bool:
+    if extensions is not None and os.path.splitext(path)[1].lower() not in extensions:
+        return False
+    return directory is None or os.path.abspath(path).startswith(directory)
+
+
+def _check_sort(sort_by: Optional[str], keys: Sequence[str]) -> None:
+    if sort_by is not None and sort_by not in keys:
+        raise ValueError(f"Unknown sort key: {sort_by} (expected one of {', '.join(keys)})")
+
+
+def _column(values) -> np.ndarray:
+    return np.frombuffer(values, dtype=np.int64) if len(values) else np.empty(0, dtype=np.int64)
+
+
+def select_rows(index: ScanIndex, query: ResultQuery) -> np.ndarray:
+    """Index rows matching the query's filters, in its sort order."""
+    _check_sort(query.sort_by, FILE_SORT_KEYS)
+    sizes = _column(index.sizes)
+    keep = np.ones(len(index), dtype=bool)
+    if query.min_size is not None:
+        keep &= sizes >= query.min_size
+    if query.max_size is not None:
+        keep &= sizes <= query.max_size
+    extensions = _normalize_extensions(query.extensions)
+    if extensions is not None:
+        wanted = [lookup_extension_id(ext) for ext in extensions]
+        ext_ids = np.frombuffer(index.ext_ids, dtype=np.uint32) if len(index) else np.empty(0, dtype=np.uint32)
+        keep &= np.isin(ext_ids, [w for w in wanted if w is not None])
+    rows = np.flatnonzero(keep)
+    directory = _normalize_directory(query.directory)
+    if directory is not None:
+        rows = np.fromiter(
+            (i for i in rows.tolist() if _path_matches(index.paths[i], None, directory)), dtype=np.int64
+        )
+
+    if query.sort_by == "size":
+        rows = rows[np.argsort(sizes[rows], kind="stable")]
+    elif query.sort_by == "modified":
+        rows = rows[np.argsort(_column(index.mtimes_ns)[rows], kind="stable")]
+    elif query.sort_by == "path":
+        rows = np.array(sorted(rows.tolist(), key=index.paths.__getitem__), dtype=np.int64)
+    elif query.sort_by == "name":
+        rows = np.array(sorted(rows.tolist(), key=lambda i: os.path.basename(index.paths[i])), dtype=np.int64)
+    if query.descending:
+        rows = rows[::-1]
+    return rows
+
+
+def page_files(index: Optional[ScanIndex], query: ResultQuery) -> Tuple[List[FileInfo], int, int, Optional[str]]:
+    """
+    Return (files, matching files, their total size, next cursor) for one
+    page. Without a cursor the query is evaluated against index; with one,
+    against the index the first page was cut from.
+    """
+    _check_limit(query.limit)
+    if query.cursor:
+        token, ordering, offset = _resume(query.cursor, "files")
+    else:
+        rows = select_rows(index, query)
+        ordering = _Ordering("files", index, rows, int(_column(index.sizes)[rows].sum()))
+        token, offset = _register(ordering), 0
+    positions, next_cursor = _page(ordering, token, offset, query.limit)
+    files = [ordering.source.file_info(i) for i in positions.tolist()]
+    return files, len(ordering.order), ordering.total_size, next_cursor
+
+
+def _group_size(group: BaseModel) -> int:
+    return max(f.size for f in group.files)
+
+
+def _group_key(sort_by: str):
+    if sort_by == "recoverable_space":
+        return lambda g: g.recoverable_space
+    if sort_by == "size":
+        return _group_size
+    if sort_by == "files":
+        return lambda g: len(g.files)
+    return lambda g: getattr(g, "similarity_score", 1.0)
+
+
+# Duplicate groups as models, or exact groups as rows
+Groups = Union[List[BaseModel], ExactGroups]
+
+
+def _select_exact_groups(groups: ExactGroups, query: ResultQuery) -> np.ndarray:
+    """select_groups over the row arrays of exact groups, without building models."""
+    keep = np.ones(len(groups), dtype=bool)
+    if query.min_size is not None:
+        keep &= groups.sizes >= query.min_size
+    if query.max_size is not None:
+        keep &= groups.sizes <= query.max_size
+    positions = np.flatnonzero(keep)
+    extensions = _normalize_extensions(query.extensions)
+    directory = _normalize_directory(query.directory)
+    if extensions is not None or directory is not None:
+        paths = groups.index.paths
+        positions = np.fromiter((
+            k for k in positions.tolist()
+            if any(_path_matches(paths[i], extensions, directory) for i in groups.copy_rows(k))
+        ), dtype=np.int64)
+    # Every exact group has similarity 1, so that sort keeps the order
+    values = {"recoverable_space": groups.recoverable, "size": groups.sizes, "files": groups.copies}.get(query.sort_by)
+    if values is not None:
+        positions = positions[np.argsort(values[positions], kind="stable")]
+    if query.descending:
+        positions = positions[::-1]
+    return positions
+
+
+def select_groups(groups: Groups, query: ResultQuery) -> np.ndarray:
+    """
+    Positions of the duplicate groups matching the query, in its sort order.
+    Size filters apply to a group's largest file; extension and directory
+    filters keep groups with at least one matching file.
+    """
+    _check_sort(query.sort_by, GROUP_SORT_KEYS)
+    if isinstance(groups, ExactGroups):
+        return _select_exact_groups(groups, query)
+    extensions = _normalize_extensions(query.extensions)
+    directory = _normalize_directory(query.directory)
+    positions = []
+    for k, group in enumerate(groups):
+        size = _group_size(group)
+        if query.min_size is not None and size < query.min_size:
+            continue
+        if query.max_size is not None and size > query.max_size:
+            continue
+        if (extensions is not None or directory is not None) and not any(
+            _path_matches(f.path, extensions, directory) for f in group.files
+        ):
+            continue
+        positions.append(k)
+    if query.sort_by is not None:
+        key = _group_key(query.sort_by)
+        positions.sort(key=lambda k: key(groups[k]))
+    if query.descending:
+        positions.reverse()
+    return np.array(positions, dtype=np.int64)
+
+
+def page_groups(
+    kind: str,
+    groups: Optional[Groups],
+    query: ResultQuery,
+) -> Tuple[List[BaseModel], int, int, Optional[str]]:
+    """
+    Return (groups, matching groups, their recoverable space, next cursor)
+    for one page of a kind of duplicate result, like page_files. Only the
+    page's groups are built as models.
+    """
+    _check_limit(query.limit)
+    if query.cursor:
+        token, ordering, offset = _resume(query.cursor, kind)
+    else:
+        positions = select_groups(groups, query)
+        if isinstance(groups, ExactGroups):
+            recoverable = int(groups.recoverable[positions].sum())
+        else:
+            recoverable = sum(groups[k].recoverable_space for k in positions.tolist())
+        ordering = _Ordering(kind, groups, positions, recoverable)
+        token, offset = _register(ordering), 0
+    positions, next_cursor = _page(ordering, token, offset, query.limit)
+    return [ordering.source[k] for k in positions.tolist()], len(ordering.order), ordering.total_size, next_cursor
+
+
+def _ndjson(records: Iterator[BaseModel]) -> Iterator[bytes]:
+    batch: List[str] = []
+    for record in records:
+        batch.append(record.model_dump_json())
+        if len(batch) >= STREAM_BATCH:
+            yield ("\n".join(batch) + "\n").encode()
+            batch = []
+    if batch:
+        yield ("\n".join(batch) + "\n").encode()
+
+
+def _walk_files(directory_path: str, query: ResultQuery) -> Iterator[FileInfo]:
+    extensions = _normalize_extensions(query.extensions)
+    directory = _normalize_directory(query.directory)
+    for path, st in iter_tree(directory_path):
+        if query.min_size is not None and st.st_size < query.min_size:
+            continue
+        if query.max_size is not None and st.st_size > query.max_size:
+            continue
+        if not _path_matches(path, extensions, directory):
+            continue
+        yield make_file_info(path, st.st_size, st.st_mtime_ns)
+
+
+def stream_files(query: ResultQuery) -> Iterator[bytes]:
+    """
+    NDJSON lines of FileInfo records for a directory. Unsorted queries
+    stream straight from the directory walk, so nothing is accumulated and
+    the first records go out before the walk has finished. Sorted ones need
+    the whole index first.
+    """
+    _check_sort(query.sort_by, FILE_SORT_KEYS)
+    if not os.path.isdir(query.directory_path):
+        raise FileNotFoundError(f"Directory not found: {query.directory_path}")
+    if query.sort_by is None:
+        return _ndjson(_walk_files(query.directory_path, query))
+    index = get_scan_index(query.directory_path)
+    rows = select_rows(index, query)
+    return _ndjson(index.file_info(i) for i in rows.tolist())
+
+
+def stream_groups(groups: Groups, query: ResultQuery) -> Iterator[bytes]:
+    """
+    NDJSON lines of the duplicate groups matching the query, one group per
+    line. Exact groups are built as models one at a time as they are sent.
+    """
+    positions = select_groups(groups, query)
+    return _ndjson(groups[k] for k in positions.tolist())
@@ -0,0 +1,388 @@
+import asyncio
+import mimetypes
+import os
+import threading
+import time
+from array import array
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import config
+from models.schemas import FileInfo
+from services.hash_cache import FileKey
+from services.job_manager import JobProgress
+from utils.helpers import is_image, is_text_document
+
+# Check for cancellation every this many files
+CANCEL_CHECK_INTERVAL = 1024
+
+# Directory listings queued on the walk pool per worker, so threads stay
+# busy while the walk waits for the oldest listing
+WALK_QUEUE_PER_WORKER = 4
+
+# (st_mtime_ns, visible subdirectory names) recorded for every walked directory
+DirRecord = Tuple[int, List[str]]
+
+# File type codes stored in ScanIndex.types
+FILE_TYPE_OTHER = 0
+FILE_TYPE_IMAGE = 1
+FILE_TYPE_TEXT = 2
+
+# Extensions seen by any scan, interned: ScanIndex.ext_ids holds positions
+# in these tables rather than a string per file, and the file type and MIME
+# type are looked up once per extension instead of once per file
+_extensions: List[str] = []
+_extension_ids: Dict[str, int] = {}
+_extension_types: List[int] = []
+_extension_mimes: List[str] = []
+_extensions_lock = threading.Lock()
+
+
+def _file_type(ext: str) -> int:
+    name = "file" + ext
+    if is_image(name):
+        return FILE_TYPE_IMAGE
+    if is_text_document(name):
+        return FILE_TYPE_TEXT
+    return FILE_TYPE_OTHER
+
+
+def extension_id(ext: str) -> int:
+    """Intern a lower-case extension (with its dot, or empty)."""
+    ext_id = _extension_ids.get(ext)
+    if ext_id is None:
+        with _extensions_lock:
+            ext_id = _extension_ids.get(ext)
+            if ext_id is None:
+                ext_id = len(_extensions)
+                _extensions.append(ext)
+                _extension_types.append(_file_type(ext))
+                _extension_mimes.append(mimetypes.guess_type("file" + ext)[0] or "application/octet-stream")
+                _extension_ids[ext] = ext_id
+    return ext_id
+
+
+def lookup_extension_id(ext: str) -> Optional[int]:
+    """Id of an extension already interned, without adding it."""
+    return _extension_ids.get(ext)
+
+
+def extension_name(ext_id: int) -> str:
+    return _extensions[ext_id]
+
+
+def path_extension_id(path: str) -> int:
+    return extension_id(os.path.splitext(path)[1].lower())
+
+
+def make_file_info(path: str, size: int, mtime_ns: int, ext_id: Optional[int] = None) -> FileInfo:
+    """Build the API model for one file; the only place FileInfo is created from scan data."""
+    if ext_id is None:
+        ext_id = path_extension_id(path)
+    return FileInfo(
+        path=path,
+        name=os.path.basename(path),
+        size=size,
+        extension=_extensions[ext_id],
+        last_modified=mtime_ns / 1e9,
+        mime_type=_extension_mimes[ext_id],
+    )
+
+
+class ScanIndex:
+    """
+    Columnar table of every file found by a single walk of a directory tree.
+    Row i describes paths[i]; stat fields and interned extension ids live
+    in typed arrays so millions of rows stay compact. FileInfo models are
+    only built, with file_info(), for rows that leave through the API.
+    dirs records every walked directory so a later rescan can tell which
+    directories changed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.created = time.time()
+        self.paths: List[str] = []
+        self.sizes = array("q")
+        self.mtimes_ns = array("q")
+        self.devices = array("Q")
+        self.inodes = array("Q")
+        self.types = array("b")
+        self.ext_ids = array("I")
+        self.dirs: Dict[str, DirRecord] = {}
+        self._rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_rows"] = None
+        # Extension ids are only meaningful with this process's table
+        state["extension_table"] = list(_extensions)
+        return state
+
+    def __setstate__(self, state):
+        table = state.pop("extension_table", None)
+        self.__dict__.update(state)
+        if table is None or "ext_ids" not in state:
+            self.ext_ids = array("I", (path_extension_id(p) for p in self.paths))
+        elif self.ext_ids:
+            remap = np.array([extension_id(ext) for ext in table], dtype=np.uint32)
+            ext_ids = array("I")
+            ext_ids.frombytes(remap[np.frombuffer(self.ext_ids, dtype=np.uint32)].tobytes())
+            self.ext_ids = ext_ids
+
+    def row_of(self, path: str) -> Optional[int]:
+        """Return the row for path, or None if it is not in the index."""
+        if self._rows is None or len(self._rows) != len(self.paths):
+            self._rows = {p: i for i, p in enumerate(self.paths)}
+        return self._rows.get(path)
+
+    def append_row(self, other: "ScanIndex", i: int) -> None:
+        """Copy row i of another index without touching the filesystem."""
+        self.paths.append(other.paths[i])
+        self.sizes.append(other.sizes[i])
+        self.mtimes_ns.append(other.mtimes_ns[i])
+        self.devices.append(other.devices[i])
+        self.inodes.append(other.inodes[i])
+        self.types.append(other.types[i])
+        self.ext_ids.append(other.ext_ids[i])
+
+    def append(self, path: str, st: os.stat_result) -> None:
+        self.paths.append(path)
+        self.sizes.append(st.st_size)
+        self.mtimes_ns.append(st.st_mtime_ns)
+        self.devices.append(st.st_dev)
+        self.inodes.append(st.st_ino)
+        ext_id = path_extension_id(path)
+        self.ext_ids.append(ext_id)
+        self.types.append(_extension_types[ext_id])
+
+    @property
+    def total_size(self) -> int:
+        return sum(self.sizes)
+
+    def file_key(self, i: int) -> FileKey:
+        return (self.devices[i], self.inodes[i], self.sizes[i], self.mtimes_ns[i])
+
+    def file_info(self, i: int) -> FileInfo:
+        """Materialize row i as a FileInfo without touching the filesystem."""
+        return make_file_info(self.paths[i], self.sizes[i], self.mtimes_ns[i], self.ext_ids[i])
+
+    def extension(self, i: int) -> str:
+        return _extensions[self.ext_ids[i]]
+
+    def rows_of_type(self, file_type: int) -> List[int]:
+        if not self.types:
+            return []
+        return np.flatnonzero(np.frombuffer(self.types, dtype=np.int8) == file_type).tolist()
+
+
+def list_directory(directory_path: str) -> Tuple[List[Tuple[str, os.stat_result]], List[Tuple[str, int]]]:
+    """
+    List one directory with os.scandir, reusing each DirEntry's stat.
+    Returns (files as (path, stat), subdirectories as (path, st_mtime_ns)).
+    Hidden entries are skipped and directory symlinks are not followed,
+    matching os.walk's defaults.
+    """
+    files: List[Tuple[str, os.stat_result]] = []
+    subdirs: List[Tuple[str, int]] = []
+    with os.scandir(directory_path) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            try:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append((entry.path, entry.stat(follow_symlinks=False).st_mtime_ns))
+                    continue
+                files.append((entry.path, entry.stat()))
+            except OSError:
+                continue
+    return files, subdirs
+
+
+# Lazy singleton pool listing directories for parallel walks
+_walk_pool: Optional[ThreadPoolExecutor] = None
+_walk_pool_lock = threading.Lock()
+
+
+def _get_walk_pool() -> ThreadPoolExecutor:
+    global _walk_pool
+    with _walk_pool_lock:
+        if _walk_pool is None:
+            _walk_pool = ThreadPoolExecutor(max_workers=config.WALK_WORKERS, thread_name_prefix="walk")
+    return _walk_pool
+
+
+def _iter_tree_parallel(
+    directory_path: str,
+    dirs: Optional[Dict[str, DirRecord]],
+    workers: int,
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    iter_tree with directories listed on workers threads, up to
+    WALK_QUEUE_PER_WORKER per worker ahead of the consumer. Walks with
+    config.WALK_WORKERS workers share the walk pool; others get a pool of
+    their own for the walk. Listings are consumed in submission order, so
+    the walk is breadth-first and its order does not depend on thread timing.
+    """
+    shared = workers == config.WALK_WORKERS
+    pool = _get_walk_pool() if shared else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="walk")
+    limit = workers * WALK_QUEUE_PER_WORKER
+    waiting = deque([(directory_path, os.stat(directory_path).st_mtime_ns)])
+    listing: "deque[Tuple[str, int, Future]]" = deque()
+    try:
+        while waiting or listing:
+            while waiting and len(listing) < limit:
+                current, mtime_ns = waiting.popleft()
+                listing.append((current, mtime_ns, pool.submit(list_directory, current)))
+            current, mtime_ns, future = listing.popleft()
+            try:
+                files, subdirs = future.result()
+            except OSError:
+                continue
+            if dirs is not None:
+                dirs[current] = (mtime_ns, [os.path.basename(p) for p, _ in subdirs])
+            waiting.extend(subdirs)
+            yield from files
+    finally:
+        # The consumer stopped early; drop listings not yet started
+        for _, _, future in listing:
+            future.cancel()
+        if not shared:
+            pool.shutdown(wait=False)
+
+
+def iter_tree(
+    directory_path: str,
+    dirs: Optional[Dict[str, DirRecord]] = None,
+    workers: Optional[int] = None,
+) -> Iterator[Tuple[str, os.stat_result]]:
+    """
+    Yield (path, stat) for every visible file under directory_path, as the
+    walk goes. When dirs is given, a DirRecord is stored in it for every
+    directory. With more than one worker (config.WALK_WORKERS by default)
+    directories are listed in parallel, which hides the round-trip of every
+    readdir and stat on network filesystems; one worker walks depth-first
+    in the calling thread.
+    """
+    if workers is None:
+        workers = config.WALK_WORKERS
+    if workers > 1:
+        yield from _iter_tree_parallel(directory_path, dirs, workers)
+        return
+    stack = [(directory_path, os.stat(directory_path).st_mtime_ns)]
+    while stack:
+        current, mtime_ns = stack.pop()
+        try:
+            files, subdirs = list_directory(current)
+        except OSError:
+            continue
+        if dirs is not None:
+            dirs[current] = (mtime_ns, [os.path.basename(p) for p, _ in subdirs])
+        yield from files
+        # Reverse so directories are visited in listing order
+        stack.extend(reversed(subdirs))
+
+
+def build_scan_index(directory_path: str, progress: Optional[JobProgress] = None) -> ScanIndex:
+    """Walk directory_path once and return its index."""
+    if not os.path.exists(directory_path):
+        raise FileNotFoundError(f"Directory not found: {directory_path}")
+    if not os.path.isdir(directory_path):
+        raise NotADirectoryError(f"Path is not a directory: {directory_path}")
+
+    index = ScanIndex(directory_path)
+    if progress:
+        progress.set_stage("walk")
+    for path, st in iter_tree(directory_path, index.dirs):
+        index.append(path, st)
+        if progress:
+            progress.add_walked()
+            if len(index) % CANCEL_CHECK_INTERVAL == 0:
+                progress.check_cancelled()
+    return index
+
+
+# Recently built indexes, so back-to-back requests for one tree share a walk.
+# These registries are keyed by the root's real path, so every spelling of
+# a directory shares one entry.
+_indexes: Dict[str, ScanIndex] = {}
+_indexes_lock = threading.Lock()
+_build_locks: Dict[str, threading.Lock] = {}
+# Indexes kept current by a watcher; these never expire
+_live_indexes: Dict[str, ScanIndex] = {}
+
+
+def set_live_index(root: str, index: Optional[ScanIndex]) -> None:
+    """Publish (or with None, withdraw) the watcher-maintained index for root."""
+    root = os.path.realpath(root)
+    with _indexes_lock:
+        if index is None:
+            _live_indexes.pop(root, None)
+        else:
+            _live_indexes[root] = index
+
+
+def get_scan_index(
+    directory_path: str,
+    max_age: Optional[float] = None,
+    progress: Optional[JobProgress] = None,
+) -> ScanIndex:
+    """
+    Return an index for directory_path, reusing one built within max_age
+    seconds (config.SCAN_INDEX_TTL by default). Watched roots are served
+    from their live index. Indexes are built for the real path of
+    directory_path.
+    """
+    if max_age is None:
+        max_age = config.SCAN_INDEX_TTL
+    directory_path = os.path.realpath(directory_path)
+    with _indexes_lock:
+        live = _live_indexes.get(directory_path)
+        if live is not None:
+            if progress:
+                progress.add_walked(len(live))
+            return live
+        build_lock = _build_locks.setdefault(directory_path, threading.Lock())
+    # Concurrent requests for the same tree wait for a single walk
+    with build_lock:
+        index = _indexes.get(directory_path)
+        if index is not None and time.time() - index.created <= max_age:
+            if progress:
+                progress.add_walked(len(index))
+            return index
+        try:
+            index = build_scan_index(directory_path, progress)
+        except BaseException:
+            # Paths that never get an index must not leave a lock behind
+            with _indexes_lock:
+                if directory_path not in _indexes:
+                    _build_locks.pop(directory_path, None)
+            raise
+        register_scan_index(index, max_age)
+        return index
+
+
+def register_scan_index(index: ScanIndex, max_age: Optional[float] = None) -> None:
+    """Make index the current one for its root, dropping expired entries."""
+    if max_age is None:
+        max_age = config.SCAN_INDEX_TTL
+    with _indexes_lock:
+        now = time.time()
+        for path in [p for p, idx in _indexes.items() if now - idx.created > max_age]:
+            del _indexes[path]
+            build_lock = _build_locks.get(path)
+            if build_lock is not None and not build_lock.locked():
+                del _build_locks[path]
+        _indexes[os.path.realpath(index.root)] = index
+
+
+async def load_scan_index(directory_path: str, progress: Optional[JobProgress] = None) -> ScanIndex:
+    """Get the index for directory_path without blocking the event loop."""
+    return await asyncio.to_thread(get_scan_index, directory_path, None, progress)
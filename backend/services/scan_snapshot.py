@@ -0,0 +1,238 @@
+import hashlib
+import os
+import pickle
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import config
+from services.job_manager import JobProgress
+from services.scan_index import ScanIndex, build_scan_index, iter_tree, list_directory
+
+
+class ScanDiff:
+    """Files that changed between two indexes of the same tree."""
+
+    def __init__(self, added: List[int], removed: List[int], modified: List[Tuple[int, int]]):
+        self.added = added  # Rows in the new index
+        self.removed = removed  # Rows in the old index
+        self.modified = modified  # (old row, new row)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.modified)
+
+
+class RescanStats:
+    def __init__(self):
+        self.directories_listed = 0
+        self.directories_reused = 0
+
+
+def snapshot_path(root: str) -> str:
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8", "surrogateescape")).hexdigest()
+    return os.path.join(config.SNAPSHOT_DIR, f"{digest}.pickle")
+
+
+def save_snapshot(index: ScanIndex) -> None:
+    """Persist an index so the next rescan of its root can be incremental."""
+    path = snapshot_path(index.root)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(index, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(root: str) -> Optional[ScanIndex]:
+    """Load the last persisted index for root, or None."""
+    try:
+        with open(snapshot_path(root), "rb") as f:
+            index = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        return None
+    if not isinstance(index, ScanIndex) or index.root != root:
+        return None
+    return index
+
+
+def rescan_index(
+    root: str,
+    previous: ScanIndex,
+    trust_dir_mtime: bool = False,
+    progress: Optional[JobProgress] = None,
+    stats: Optional[RescanStats] = None,
+) -> ScanIndex:
+    """
+    Walk root again, reusing the listing of every directory whose mtime has
+    not changed since previous was taken.
+
+    A directory's mtime only changes when entries are added, removed or
+    renamed in it, so reused directories still have their files stat'ed to
+    catch in-place edits. With trust_dir_mtime, their file rows are copied
+    from previous without any syscall, which is fastest but misses files
+    rewritten in place.
+    """
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Directory not found: {root}")
+    if stats is None:
+        stats = RescanStats()
+
+    old_rows: Dict[str, List[int]] = {}
+    for i, path in enumerate(previous.paths):
+        old_rows.setdefault(os.path.dirname(path), []).append(i)
+
+    index = ScanIndex(root)
+    if progress:
+        progress.set_stage("rescan")
+    stack = [(root, os.stat(root).st_mtime_ns)]
+    while stack:
+        current, mtime_ns = stack.pop()
+        if progress:
+            progress.check_cancelled()
+        record = previous.dirs.get(current)
+        if record is not None and record[0] == mtime_ns:
+            stats.directories_reused += 1
+            for i in old_rows.get(current, []):
+                if trust_dir_mtime:
+                    index.append_row(previous, i)
+                    continue
+                try:
+                    index.append(previous.paths[i], os.stat(previous.paths[i]))
+                except OSError:
+                    continue
+            subdirs = []
+            for name in record[1]:
+                path = os.path.join(current, name)
+                try:
+                    subdirs.append((path, os.stat(path, follow_symlinks=False).st_mtime_ns))
+                except OSError:
+                    continue
+            index.dirs[current] = record
+        else:
+            stats.directories_listed += 1
+            try:
+                files, subdirs = list_directory(current)
+            except OSError:
+                continue
+            for path, st in files:
+                index.append(path, st)
+            index.dirs[current] = (mtime_ns, [os.path.basename(p) for p, _ in subdirs])
+        if progress:
+            progress.files_walked = len(index)
+        stack.extend(reversed(subdirs))
+    return index
+
+
+def _is_hidden(root: str, path: str) -> bool:
+    rel = os.path.relpath(path, root)
+    return rel != "." and any(part.startswith(".") for part in rel.split(os.sep))
+
+
+def patch_index(previous: ScanIndex, changed: Iterable[str]) -> Tuple[ScanIndex, ScanDiff]:
+    """
+    Build a new index from previous with the changed paths refreshed from disk.
+    Each changed path may be a file or directory that was created, modified
+    or deleted; directories are re-walked in full. Everything else is copied
+    from previous without touching the filesystem.
+    """
+    root = previous.root
+    tops: Set[str] = set()
+    for path in sorted(set(changed), key=len):
+        if path != root and not path.startswith(root + os.sep):
+            continue
+        if _is_hidden(root, path):
+            continue
+        tops.add(path)
+    if not tops:
+        return previous, ScanDiff([], [], [])
+
+    def covered(path: str) -> bool:
+        while True:
+            if path in tops:
+                return True
+            if path == root or len(path) <= len(root):
+                return False
+            path = os.path.dirname(path)
+
+    # Keep only changed paths that are not inside another changed path
+    tops = {p for p in tops if p == root or not covered(os.path.dirname(p))}
+
+    index = ScanIndex(root)
+    dropped: List[int] = []
+    for i, path in enumerate(previous.paths):
+        if covered(path):
+            dropped.append(i)
+        else:
+            index.append_row(previous, i)
+    kept = len(index)
+    index.dirs = {d: record for d, record in previous.dirs.items() if not covered(d)}
+
+    for top in tops:
+        if os.path.isdir(top) and not os.path.islink(top):
+            for path, st in iter_tree(top, index.dirs):
+                index.append(path, st)
+        else:
+            try:
+                index.append(top, os.stat(top))
+            except OSError:
+                pass  # Deleted
+        # The parent gained or lost an entry
+        parent = os.path.dirname(top)
+        if top != root and parent in index.dirs:
+            try:
+                _, subdirs = list_directory(parent)
+                index.dirs[parent] = (
+                    os.stat(parent).st_mtime_ns,
+                    [os.path.basename(p) for p, _ in subdirs],
+                )
+            except OSError:
+                pass
+
+    old_rows = {previous.paths[i]: i for i in dropped}
+    added: List[int] = []
+    modified: List[Tuple[int, int]] = []
+    for j in range(kept, len(index)):
+        i = old_rows.pop(index.paths[j], None)
+        if i is None:
+            added.append(j)
+        elif previous.file_key(i) != index.file_key(j):
+            modified.append((i, j))
+    return index, ScanDiff(added, sorted(old_rows.values()), modified)
+
+
+def diff_indexes(old: ScanIndex, new: ScanIndex) -> ScanDiff:
+    """Compare two indexes of the same tree by path and stat metadata."""
+    added: List[int] = []
+    modified: List[Tuple[int, int]] = []
+    seen = set()
+    for j, path in enumerate(new.paths):
+        i = old.row_of(path)
+        if i is None:
+            added.append(j)
+            continue
+        seen.add(i)
+        if old.file_key(i) != new.file_key(j):
+            modified.append((i, j))
+    removed = [i for i in range(len(old)) if i not in seen]
+    return ScanDiff(added, removed, modified)
+
+
+def incremental_scan(
+    root: str,
+    trust_dir_mtime: bool = False,
+    progress: Optional[JobProgress] = None,
+) -> Tuple[ScanIndex, Optional[ScanIndex], ScanDiff, RescanStats]:
+    """
+    Rescan root against its persisted snapshot and save the new snapshot.
+    Returns (new index, previous index or None, diff, walk statistics).
+    Without a snapshot every file is reported as added.
+    """
+    stats = RescanStats()
+    previous = load_snapshot(root)
+    if previous is None:
+        index = build_scan_index(root, progress)
+        stats.directories_listed = len(index.dirs)
+        diff = ScanDiff(list(range(len(index))), [], [])
+    else:
+        index = rescan_index(root, previous, trust_dir_mtime, progress, stats)
+        diff = diff_indexes(previous, index)
+    save_snapshot(index)
+    return index, previous, diff, stats
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+import config
+from services.job_manager import JobProgress
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+TEXT_BACKENDS = ("torch", "int8", "onnx")
+
+# Lazy load model
+_model = None
+_model_lock = threading.Lock()
+
+
+class EncodeStats:
+    """Throughput of the most recent encode call."""
+
+    def __init__(self, documents: int, tokens: int, padded_tokens: int, batches: int, seconds: float):
+        self.documents = documents
+        self.tokens = tokens
+        self.padded_tokens = padded_tokens
+        self.batches = batches
+        self.seconds = seconds
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        padding = 1 - self.tokens / self.padded_tokens if self.padded_tokens else 0.0
+        return (
+            f"{self.documents} documents in {self.batches} batches, {self.seconds:.2f}s: "
+            f"{self.documents_per_second:.1f} docs/s, {self.tokens_per_second:.0f} tokens/s, "
+            f"{padding:.0%} padding"
+        )
+
+
+last_encode_stats: Optional[EncodeStats] = None
+
+
+def load_model(backend: str):
+    """Load the sentence transformer for a CPU backend: torch, int8 or onnx."""
+    if backend not in TEXT_BACKENDS:
+        raise ValueError(f"Unknown text backend: {backend} (expected one of {', '.join(TEXT_BACKENDS)})")
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(MODEL_NAME, backend="onnx")
+        except TypeError:
+            raise ValueError("The onnx backend needs sentence-transformers>=3.2 with the [onnx] extra")
+    model = SentenceTransformer(MODEL_NAME, device="cpu" if backend == "int8" else None)
+    if backend == "int8":
+        import torch
+        # Dynamic int8 quantization of the linear layers, which dominate CPU time
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+def embedding_space() -> str:
+    """
+    Name for the vectors the configured backend produces; int8 vectors
+    differ slightly from full-precision ones, so they are stored apart.
+    """
+    return f"{MODEL_NAME}-int8" if config.TEXT_BACKEND == "int8" else MODEL_NAME
+
+
+def get_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            _model = load_model(config.TEXT_BACKEND)
+    return _model
+
+
+def warm_up() -> None:
+    """Load the model and run one encode so the first request does not pay for it."""
+    start = time.perf_counter()
+    encode_texts(["warm up"])
+    logger.info("Text model %s (%s) ready in %.1fs", MODEL_NAME, config.TEXT_BACKEND, time.perf_counter() - start)
+
+
+def _token_lengths(model, texts: List[str]) -> List[int]:
+    tokenizer = getattr(model, "tokenizer", None)
+    max_length = getattr(model, "max_seq_length", None) or 512
+    if tokenizer is None:
+        # Rough estimate: about four characters per token
+        return [min(max_length, len(t) // 4 + 2) for t in texts]
+    ids = tokenizer(texts, add_special_tokens=True, truncation=True, max_length=max_length)["input_ids"]
+    return [len(i) for i in ids]
+
+
+def _token_batches(lengths: List[int], token_budget: int, max_batch: int) -> List[List[int]]:
+    """
+    Group text positions, longest first, into batches whose padded size
+    (rows x longest row) stays within token_budget.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: -lengths[i])
+    batches: List[List[int]] = []
+    current: List[int] = []
+    for i in order:
+        # The first text of a batch is its longest, since lengths only fall
+        if current and ((len(current) + 1) * lengths[current[0]] > token_budget or len(current) >= max_batch):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def encode_texts(
+    texts: List[str],
+    model=None,
+    token_budget: Optional[int] = None,
+    progress: Optional[JobProgress] = None,
+) -> np.ndarray:
+    """
+    Encode texts to float32 embeddings in their original order.
+    Texts are sorted by token length and packed into batches of about
+    token_budget padded tokens, so short documents are not padded to the
+    length of long ones and long ones do not blow up a batch.
+    """
+    global last_encode_stats
+    if model is None:
+        model = get_model()
+    token_budget = token_budget or config.TEXT_BATCH_TOKENS
+    start = time.perf_counter()
+    lengths = _token_lengths(model, texts)
+    batches = _token_batches(lengths, token_budget, config.TEXT_MAX_BATCH)
+    out: Optional[np.ndarray] = None
+    for batch in batches:
+        if progress:
+            progress.check_cancelled()
+        encoded = model.encode([texts[i] for i in batch], batch_size=len(batch), show_progress_bar=False)
+        encoded = np.asarray(encoded, dtype=np.float32)
+        if out is None:
+            out = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        out[batch] = encoded
+        if progress:
+            progress.add_processed(len(batch))
+    if out is None:
+        out = np.empty((0, 0), dtype=np.float32)
+    last_encode_stats = EncodeStats(
+        len(texts),
+        sum(lengths),
+        sum(len(b) * lengths[b[0]] for b in batches),
+        len(batches),
+        time.perf_counter() - start,
+    )
+    logger.info("Encoded %s", last_encode_stats)
+    return out
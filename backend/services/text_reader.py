@@ -0,0 +1,102 @@
+import codecs
+from typing import Optional
+
+import numpy as np
+
+from services.lexical_similarity import MinHasher
+
+# Bytes inspected to pick an encoding
+SAMPLE_BYTES = 64 * 1024
+# Bytes decoded at a time while streaming the rest of the file
+READ_CHUNK_BYTES = 1024 * 1024
+# Characters kept for embedding; the model truncates long inputs anyway
+PREFIX_CHARS = 5000
+
+_BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+class TextDocument:
+    """Bounded prefix of a text file plus a fingerprint of all of it."""
+
+    def __init__(self, prefix: str, signature: Optional[np.ndarray], encoding: str, truncated: bool):
+        self.prefix = prefix
+        self.signature = signature
+        self.encoding = encoding
+        self.truncated = truncated  # The file has more text than the prefix
+
+
+def detect_encoding(sample: bytes, complete: bool = False) -> Optional[str]:
+    """
+    Guess the encoding of a file from its first bytes (complete when the
+    sample is the whole file): a BOM if there is one, else UTF-8 if the
+    sample decodes, else cp1252 or latin-1.
+    Returns None for binary content (NUL bytes without a UTF-16 BOM).
+    """
+    for bom, encoding in _BOMS:
+        if sample.startswith(bom):
+            return encoding
+    if b"\x00" in sample:
+        return None
+    try:
+        # A multi-byte character may be cut off at the end of the sample
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def read_text_document(
+    path: str,
+    max_chars: int = PREFIX_CHARS,
+    with_signature: bool = True,
+) -> Optional[TextDocument]:
+    """
+    Read a text file in one pass: the file is opened once, decoded
+    incrementally in READ_CHUNK_BYTES pieces, and each piece is fed to a
+    MinHash fingerprint before being dropped, so memory stays bounded
+    however large the file is. Only the first max_chars characters are
+    kept. Without with_signature reading stops as soon as the text
+    runs past the prefix.
+    Returns None for unreadable, binary or blank files.
+    """
+    try:
+        with open(path, "rb") as f:
+            data = f.read(SAMPLE_BYTES)
+            encoding = detect_encoding(data, complete=len(data) < SAMPLE_BYTES)
+            if encoding is None:
+                return None
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            hasher = MinHasher() if with_signature else None
+            prefix = []
+            prefix_len = 0
+            truncated = False
+            while True:
+                final = not data
+                text = decoder.decode(data, final=final)
+                kept = text[:max(0, max_chars - prefix_len)]
+                if kept:
+                    prefix.append(kept)
+                    prefix_len += len(kept)
+                truncated = truncated or len(kept) < len(text)
+                if hasher:
+                    hasher.update(text)
+                elif truncated:
+                    break
+                if final:
+                    break
+                data = f.read(READ_CHUNK_BYTES)
+    except OSError:
+        return None
+    content = "".join(prefix)
+    if not content.strip():
+        return None
+    return TextDocument(content, hasher.signature() if hasher else None, encoding, truncated)
@@ -1,124 +1,275 @@
+import asyncio
+import logging
 import os
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 
+import config
 from models.schemas import FileInfo, TextDuplicateGroup, TextDuplicateResponse
-from utils.helpers import get_file_info, is_text_document
+from services.embedding_index import mean_pairwise_similarity, normalize
+from services.embedding_index import similar_pairs as semantic_pairs
+from services.embedding_store import content_digest, get_embedding_store
+from services.hash_cache import get_hash_cache
+from services.job_manager import JobProgress
+from services.lexical_similarity import (
+    MINHASH_CACHE_KIND,
+    decode_signature,
+    stack_signatures,
+)
+from services.lexical_similarity import similar_pairs as lexical_pairs
+from services.scan_index import FILE_TYPE_TEXT, ScanIndex, load_scan_index
+from services.text_encoder import embedding_space, encode_texts
+from services.text_reader import PREFIX_CHARS, read_text_document
+from utils.union_find import UnionFind
+
+logger = logging.getLogger(__name__)
 
 # Similarity threshold
 SIMILARITY_THRESHOLD = 0.85
-MODEL_NAME = "all-MiniLM-L6-v2"
+TEXT_MODES = ("hybrid", "semantic", "lexical")
+# Per-file cache of the digest of the embedded prefix, which keys the
+# embedding store, followed by one byte: 1 if the file runs past the prefix
+TEXT_DIGEST_CACHE_KIND = "text_prefix"
 
-# Lazy load model
-_model = None
 
+def read_text_file(path: str, max_chars: int = PREFIX_CHARS) -> Optional[str]:
+    """Read the first max_chars characters of a text file, detecting its encoding."""
+    document = read_text_document(path, max_chars, with_signature=False)
+    return document.prefix if document else None
 
-def get_model():
-    global _model
-    if _model is None:
-        from sentence_transformers import SentenceTransformer
-        _model = SentenceTransformer(MODEL_NAME)
-    return _model
 
+def _read_documents(
+    index: ScanIndex,
+    rows: Dict[str, int],
+    with_signatures: bool,
+    progress: Optional[JobProgress] = None,
+) -> Tuple[List[str], List[bytes], List[bool], List[Optional[np.ndarray]], Dict[bytes, str]]:
+    """
+    Return the readable documents in rows with the digests of their
+    prefixes, whether they were truncated and, if requested, MinHash
+    signatures of the whole file (None for text without words), plus the
+    prefix of every document that had to be read. All but the prefix are
+    cached per file, so an unchanged file is not even re-read.
+    """
+    if progress:
+        progress.set_stage("read", files_total=len(rows))
+    cache = get_hash_cache()
+    paths: List[str] = []
+    digests: List[bytes] = []
+    truncated: List[bool] = []
+    signatures: List[Optional[np.ndarray]] = []
+    contents: Dict[bytes, str] = {}
+    for path, row in rows.items():
+        if progress:
+            progress.check_cancelled()
+            progress.add_processed(1, index.sizes[row])
+        key = index.file_key(row)
+        value = cache.get(key, TEXT_DIGEST_CACHE_KIND) if cache else None
+        digest = value[:-1] if value is not None else None
+        signature = None
+        if with_signatures and cache:
+            cached = cache.get(key, MINHASH_CACHE_KIND)
+            signature = decode_signature(cached) if cached is not None else None
+        if digest is None or (with_signatures and signature is None):
+            document = read_text_document(path, with_signature=with_signatures)
+            if document is None:
+                continue
+            if digest is None:
+                digest = content_digest(document.prefix)
+                value = digest + (b"\x01" if document.truncated else b"\x00")
+                if cache:
+                    cache.put(key, TEXT_DIGEST_CACHE_KIND, value)
+            if with_signatures and signature is None:
+                signature = document.signature
+                if cache:
+                    cache.put(key, MINHASH_CACHE_KIND, signature.tobytes())
+            contents[digest] = document.prefix
+        paths.append(path)
+        digests.append(digest)
+        truncated.append(value[-1:] == b"\x01")
+        signatures.append(signature if signature is not None and len(signature) else None)
+    if cache:
+        cache.flush()
+    return paths, digests, truncated, signatures, contents
 
-def read_text_file(path: str, max_chars: int = 5000) -> Optional[str]:
-    """Read text file content with encoding fallback."""
-    for encoding in ["utf-8", "latin-1", "cp1252"]:
-        try:
-            with open(path, "r", encoding=encoding) as f:
-                content = f.read(max_chars)
-                if content.strip():
-                    return content
-        except (UnicodeDecodeError, OSError):
-            continue
-    return None
 
+def _load_embeddings(
+    paths: List[str],
+    digests: List[bytes],
+    contents: Dict[bytes, str],
+    progress: Optional[JobProgress] = None,
+) -> Tuple[Optional[np.ndarray], List[int]]:
+    """
+    Return (embeddings, positions of the documents they belong to).
+    Embeddings are looked up by content digest, so only text never seen
+    before is encoded, and identical documents are encoded once. Documents
+    whose text can no longer be read are left out.
+    """
+    store = get_embedding_store(embedding_space())
+    unique = list(dict.fromkeys(digests))
+    vectors = store.get_many(unique) if store else {}
+    missing = {d for d in unique if d not in vectors}
+
+    for path, digest in zip(paths, digests):
+        if digest in missing and digest not in contents:
+            # Digest was cached but its vector was compacted away
+            text = read_text_file(path)
+            if text is not None:
+                contents[digest] = text
+    missing = [d for d in unique if d in missing and d in contents]
+
+    # Encode text the store has not seen with sentence transformer
+    if missing:
+        if progress:
+            progress.set_stage("embed", files_total=len(missing))
+        encoded = encode_texts([contents[d] for d in missing], progress=progress)
+        vectors.update(zip(missing, encoded))
+        if store:
+            store.put_many(missing, encoded)
+    kept = [k for k, d in enumerate(digests) if d in vectors]
+    if not kept:
+        return None, []
+    return np.stack([vectors[digests[k]] for k in kept]), kept
 
-async def find_text_duplicates(directory_path: str, threshold: float = SIMILARITY_THRESHOLD) -> TextDuplicateResponse:
+
+def _cluster_documents(
+    paths: List[str],
+    digests: List[bytes],
+    truncated: List[bool],
+    signatures: List[Optional[np.ndarray]],
+    contents: Dict[bytes, str],
+    mode: str,
+    threshold: float,
+    progress: Optional[JobProgress] = None,
+) -> List[Tuple[List[int], float, str]]:
     """
-    Find similar text documents using sentence embeddings + cosine similarity.
+    Link documents lexically (MinHash LSH) and/or semantically (embeddings)
+    and return (members, similarity, method) for each connected group.
+    In hybrid mode only one document per lexical group, plus every document
+    without a lexical match, is sent to the encoder, and documents longer
+    than the embedded prefix are matched on their full-text fingerprint
+    alone, so files sharing only a long header are not linked.
     """
-    # Collect text files
-    text_files: List[str] = []
-    for root, dirs, files in os.walk(directory_path):
-        dirs[:] = [d for d in dirs if not d.startswith(".")]
-        for f in files:
-            path = os.path.join(root, f)
-            if is_text_document(path):
-                text_files.append(path)
-
-    if len(text_files) < 2:
-        return TextDuplicateResponse(duplicate_groups=[], recoverable_space=0)
+    uf = UnionFind(len(paths))
+    links: List[Tuple[np.ndarray, np.ndarray, np.ndarray, str]] = []
 
-    # Read content
-    contents: List[str] = []
-    valid_paths: List[str] = []
-    for path in text_files:
-        content = read_text_file(path)
-        if content:
-            contents.append(content)
-            valid_paths.append(path)
+    if mode in ("lexical", "hybrid"):
+        if progress:
+            progress.set_stage("lexical")
+        signed = np.array([i for i, sig in enumerate(signatures) if sig is not None], dtype=np.int64)
+        matrix = stack_signatures([signatures[i] for i in signed])
+        for i, j, sims in lexical_pairs(matrix, config.TEXT_LEXICAL_THRESHOLD):
+            links.append((signed[i], signed[j], sims, "lexical"))
+            uf.union_pairs(signed[i], signed[j])
 
-    if len(valid_paths) < 2:
-        return TextDuplicateResponse(duplicate_groups=[], recoverable_space=0)
+    embedded: Dict[int, int] = {}
+    embeddings: Optional[np.ndarray] = None
+    if mode in ("semantic", "hybrid"):
+        to_embed: List[int] = []
+        chosen = set()
+        for i in range(len(paths)):
+            root = uf.find(i)
+            if (mode == "semantic" or not truncated[i]) and root not in chosen:
+                chosen.add(root)
+                to_embed.append(i)
+        try:
+            if len(to_embed) >= 2:
+                embeddings, kept = _load_embeddings(
+                    [paths[i] for i in to_embed], [digests[i] for i in to_embed], contents, progress
+                )
+                to_embed = [to_embed[k] for k in kept]
+                if embeddings is not None:
+                    embeddings = normalize(embeddings)
+        except ImportError:
+            if mode == "semantic":
+                raise
+            logger.warning("sentence-transformers is not installed; text matching is lexical only")
+        if embeddings is not None:
+            embedded = {doc: pos for pos, doc in enumerate(to_embed)}
+            if progress:
+                progress.set_stage("cluster")
+            positions = np.array(to_embed, dtype=np.int64)
+            for i, j, sims in semantic_pairs(embeddings, threshold):
+                links.append((positions[i], positions[j], sims, "semantic"))
+                uf.union_pairs(positions[i], positions[j])
 
-    # Encode with sentence transformer
-    model = get_model()
-    embeddings = model.encode(contents, batch_size=32, show_progress_bar=False)
+    groups = uf.groups()
+    root_of = {uf.find(g[0]): k for k, g in enumerate(groups)}
+    link_sums = np.zeros(len(groups))
+    link_counts = np.zeros(len(groups), dtype=np.int64)
+    methods: List[set] = [set() for _ in groups]
+    for i, _, sims, method in links:
+        for a, sim in zip(i.tolist(), sims.tolist()):
+            k = root_of[uf.find(a)]
+            link_sums[k] += sim
+            link_counts[k] += 1
+            methods[k].add(method)
 
-    # Compute cosine similarity matrix
-    sim_matrix = cosine_similarity(embeddings)
+    result: List[Tuple[List[int], float, str]] = []
+    for k, members in enumerate(groups):
+        if embeddings is not None and all(m in embedded for m in members):
+            # Average pairwise similarity
+            similarity = mean_pairwise_similarity(embeddings[[embedded[m] for m in members]])
+        else:
+            # Average similarity of the links that formed the group
+            similarity = link_sums[k] / max(link_counts[k], 1)
+        method = methods[k].pop() if len(methods[k]) == 1 else "mixed"
+        result.append((members, float(similarity), method))
+    return result
 
-    # Greedy clustering
-    visited = set()
-    groups: List[List[int]] = []
 
-    for i in range(len(valid_paths)):
-        if i in visited:
-            continue
-        group = [i]
-        visited.add(i)
-        for j in range(i + 1, len(valid_paths)):
-            if j in visited:
-                continue
-            if sim_matrix[i][j] >= threshold:
-                group.append(j)
-                visited.add(j)
-        if len(group) > 1:
-            groups.append(group)
+async def find_text_duplicates(
+    directory_path: str,
+    threshold: float = SIMILARITY_THRESHOLD,
+    index: Optional[ScanIndex] = None,
+    progress: Optional[JobProgress] = None,
+    mode: Optional[str] = None,
+) -> TextDuplicateResponse:
+    """
+    Find similar text documents. mode is "semantic" (sentence embeddings +
+    cosine similarity), "lexical" (MinHash over word shingles, no model
+    needed) or "hybrid": lexical first, then embeddings for the rest.
+    Linked documents form groups transitively.
+    Pass an existing index to reuse its walk.
+    """
+    mode = mode or config.TEXT_SIMILARITY_MODE
+    if mode not in TEXT_MODES:
+        raise ValueError(f"Unknown text mode: {mode} (expected one of {', '.join(TEXT_MODES)})")
+    if index is None:
+        index = await load_scan_index(directory_path, progress)
+
+    # Collect text files
+    rows: Dict[str, int] = {index.paths[i]: i for i in index.rows_of_type(FILE_TYPE_TEXT)}
+
+    if len(rows) < 2:
+        return TextDuplicateResponse(duplicate_groups=[], recoverable_space=0)
+
+    paths, digests, truncated, signatures, contents = await asyncio.to_thread(
+        _read_documents, index, rows, mode != "semantic", progress
+    )
+    if len(paths) < 2:
+        return TextDuplicateResponse(duplicate_groups=[], recoverable_space=0)
+    groups = await asyncio.to_thread(
+        _cluster_documents, paths, digests, truncated, signatures, contents, mode, threshold, progress
+    )
 
     # Build response
     duplicate_groups: List[TextDuplicateGroup] = []
     total_recoverable = 0
 
-    for group_indices in groups:
-        file_infos = []
-        for idx in group_indices:
-            try:
-                file_infos.append(get_file_info(valid_paths[idx]))
-            except OSError:
-                continue
-
-        if len(file_infos) < 2:
-            continue
+    for members, similarity, method in groups:
+        file_infos = [index.file_info(rows[paths[m]]) for m in members]
 
         representative = max(file_infos, key=lambda f: f.size)
         recoverable = sum(fi.size for fi in file_infos) - representative.size
         total_recoverable += recoverable
 
-        # Average pairwise similarity
-        pair_sims = []
-        for a in range(len(group_indices)):
-            for b in range(a + 1, len(group_indices)):
-                pair_sims.append(sim_matrix[group_indices[a]][group_indices[b]])
-        avg_sim = float(np.mean(pair_sims)) if pair_sims else 1.0
-
         duplicate_groups.append(TextDuplicateGroup(
             representative=representative,
             files=file_infos,
-            similarity_score=round(avg_sim, 3),
+            similarity_score=round(similarity, 3),
             recoverable_space=recoverable,
+            match_method=method,
         ))
 
     return TextDuplicateResponse(
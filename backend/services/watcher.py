@@ -0,0 +1,344 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Set
+
+import config
+from models.schemas import ExactDuplicateResponse, WatchStatus
+from services.duplicate_index import DuplicateIndex
+from services.hash_service import ExactGroups
+from services.io_limits import io_limits
+from services.scan_index import ScanIndex, register_scan_index, set_live_index
+from services.scan_snapshot import (
+    diff_indexes,
+    incremental_scan,
+    patch_index,
+    rescan_index,
+    save_snapshot,
+)
+
+logger = logging.getLogger(__name__)
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+READ_SIZE = 64 * 1024
+
+
+class InotifyUnavailable(Exception):
+    """Raised when inotify cannot be used and polling must take over."""
+
+
+class _Inotify:
+    """Minimal ctypes binding for recursive inotify watches."""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name or not hasattr(os, "O_NONBLOCK"):
+            raise InotifyUnavailable("inotify is not available on this platform")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise InotifyUnavailable("inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise InotifyUnavailable(os.strerror(ctypes.get_errno()))
+        self.paths: Dict[int, str] = {}
+
+    def add_watch(self, path: str) -> None:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                raise InotifyUnavailable("inotify watch limit reached (fs.inotify.max_user_watches)")
+            return  # Directory vanished or is unreadable
+        self.paths[wd] = path
+
+    def add_tree(self, root: str) -> None:
+        """Watch root and every visible, non-symlink directory below it."""
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            self.add_watch(current)
+            try:
+                with os.scandir(current) as it:
+                    for entry in it:
+                        if entry.name.startswith("."):
+                            continue
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+            except OSError:
+                continue
+
+    def read_events(self) -> List[tuple]:
+        """Return (path, mask) for every pending event."""
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            base = self.paths.get(wd)
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            if mask & IN_Q_OVERFLOW or base is None:
+                events.append((None, mask))
+                continue
+            events.append((os.path.join(base, os.fsdecode(name)) if name else base, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class TreeWatcher:
+    """
+    Keeps the scan index and exact duplicate groups of one root current.
+    Filesystem events are debounced: changes are applied once the tree has
+    been quiet for debounce seconds, or after max_delay during a long storm
+    such as a bulk copy. Hashing follows the configured I/O limits.
+    """
+
+    def __init__(self, root: str, backend: str = "auto"):
+        self.root = os.path.abspath(root)
+        self.requested_backend = backend
+        self.backend = "starting"
+        self.index: Optional[ScanIndex] = None
+        self.dup_index: Optional[DuplicateIndex] = None
+        self.ready = False
+        self.events_seen = 0
+        self.updates_applied = 0
+        self.last_update: Optional[float] = None
+        self.error: Optional[str] = None
+        self._pending: Set[str] = set()
+        self._last_event = 0.0
+        self._wake = asyncio.Event()
+        self._inotify: Optional[_Inotify] = None
+        self._tasks: List[asyncio.Task] = []
+        self._io = io_limits()
+
+    async def start(self) -> None:
+        self._tasks.append(asyncio.create_task(self._run()))
+
+    async def _run(self) -> None:
+        try:
+            # Subscribe before the initial walk so no change slips between them
+            if self.requested_backend in ("auto", "inotify"):
+                try:
+                    self._inotify = await asyncio.to_thread(self._open_inotify)
+                    asyncio.get_running_loop().add_reader(self._inotify.fd, self._on_readable)
+                    self.backend = "inotify"
+                except InotifyUnavailable as e:
+                    if self.requested_backend == "inotify":
+                        raise
+                    logger.warning("Watching %s by polling: %s", self.root, e)
+            if self._inotify is None:
+                self.backend = "poll"
+
+            index, _, _, _ = await asyncio.to_thread(incremental_scan, self.root)
+            # Kept apart from the rescan registry so rescans cannot race it
+            dup_index = DuplicateIndex(self.root, config.HASH_ALGORITHM)
+            await dup_index.rebuild(index, io=self._io)
+            self._publish(index, dup_index)
+            self.ready = True
+
+            if self.backend == "poll":
+                await self._poll_loop()
+            else:
+                await self._debounce_loop()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = str(e)
+            logger.exception("Watcher for %s stopped", self.root)
+
+    def _open_inotify(self) -> _Inotify:
+        inotify = _Inotify()
+        try:
+            inotify.add_tree(self.root)
+        except InotifyUnavailable:
+            inotify.close()
+            raise
+        return inotify
+
+    def _publish(self, index: ScanIndex, dup_index: DuplicateIndex) -> None:
+        self.index = index
+        self.dup_index = dup_index
+        set_live_index(self.root, index)
+        register_scan_index(index)
+        self.last_update = time.time()
+
+    def _on_readable(self) -> None:
+        for path, mask in self._inotify.read_events():
+            self.events_seen += 1
+            if path is None:
+                # Queue overflow: fall back to re-walking the whole tree
+                path = self.root
+            elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._inotify.add_tree(path)
+                except InotifyUnavailable as e:
+                    logger.warning("Cannot watch new directory %s: %s", path, e)
+            self._pending.add(path)
+            self._last_event = time.monotonic()
+        if self._pending:
+            self._wake.set()
+
+    async def _debounce_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            first = time.monotonic()
+            while True:
+                deadline = min(self._last_event + config.WATCH_DEBOUNCE, first + config.WATCH_MAX_DELAY)
+                delay = deadline - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            changed, self._pending = self._pending, set()
+            await self._apply(changed)
+
+    async def _apply(self, changed: Set[str]) -> None:
+        previous = self.index
+        index, diff = await asyncio.to_thread(patch_index, previous, changed)
+        if diff:
+            await self.dup_index.update(previous, index, diff, io=self._io)
+            self.updates_applied += 1
+        self._publish(index, self.dup_index)
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(config.WATCH_POLL_INTERVAL)
+            previous = self.index
+            index = await asyncio.to_thread(rescan_index, self.root, previous)
+            diff = await asyncio.to_thread(diff_indexes, previous, index)
+            if diff:
+                await self.dup_index.update(previous, index, diff, io=self._io)
+                self.updates_applied += 1
+            self._publish(index, self.dup_index)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._inotify is not None:
+            asyncio.get_running_loop().remove_reader(self._inotify.fd)
+            self._inotify.close()
+            self._inotify = None
+        set_live_index(self.root, None)
+        if self.index is not None:
+            try:
+                await asyncio.to_thread(save_snapshot, self.index)
+            except OSError:
+                pass
+
+    def status(self) -> WatchStatus:
+        return WatchStatus(
+            directory_path=self.root,
+            backend=self.backend,
+            ready=self.ready,
+            total_files=len(self.index) if self.index is not None else 0,
+            events_seen=self.events_seen,
+            pending_changes=len(self._pending),
+            updates_applied=self.updates_applied,
+            last_update=self.last_update,
+            error=self.error,
+        )
+
+
+# Active watchers by absolute root
+_watchers: Dict[str, TreeWatcher] = {}
+
+
+async def start_watching(root: str, backend: Optional[str] = None) -> TreeWatcher:
+    root = os.path.abspath(root)
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Directory not found: {root}")
+    watcher = _watchers.get(root)
+    if watcher is None:
+        watcher = TreeWatcher(root, backend or config.WATCH_BACKEND)
+        _watchers[root] = watcher
+        await watcher.start()
+    return watcher
+
+
+async def stop_watching(root: str) -> Optional[TreeWatcher]:
+    watcher = _watchers.pop(os.path.abspath(root), None)
+    if watcher is not None:
+        await watcher.stop()
+    return watcher
+
+
+async def stop_all() -> None:
+    for root in list(_watchers):
+        await stop_watching(root)
+
+
+def list_watchers() -> List[TreeWatcher]:
+    return list(_watchers.values())
+
+
+def _live_dup_index(directory_path: str, algorithm: Optional[str], verify: bool) -> Optional[DuplicateIndex]:
+    watcher = _watchers.get(os.path.abspath(directory_path))
+    if watcher is None or not watcher.ready or verify:
+        return None
+    if (algorithm or config.HASH_ALGORITHM) != watcher.dup_index.algorithm:
+        return None
+    return watcher.dup_index
+
+
+async def live_exact_duplicates(
+    directory_path: str,
+    algorithm: Optional[str] = None,
+    verify: bool = False,
+) -> Optional[ExactDuplicateResponse]:
+    """
+    Answer an exact duplicate query from a watcher's in-memory groups, or
+    return None when the directory is not watched with matching settings.
+    """
+    dup_index = _live_dup_index(directory_path, algorithm, verify)
+    if dup_index is None:
+        return None
+    # Building the models for a large tree takes a while; keep it off the loop
+    return await asyncio.to_thread(dup_index.response)
+
+
+async def live_exact_groups(
+    directory_path: str,
+    algorithm: Optional[str] = None,
+    verify: bool = False,
+) -> Optional[ExactGroups]:
+    """live_exact_duplicates as ExactGroups, for pages and streams."""
+    dup_index = _live_dup_index(directory_path, algorithm, verify)
+    if dup_index is None:
+        return None
+    return await asyncio.to_thread(dup_index.exact_groups)
@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+# config reads the environment on import: keep caches, snapshots and the
+# embedding store out of the user's directories, and skip model warm-up
+_STATE_DIR = tempfile.mkdtemp(prefix="dupfinder-tests-")
+os.environ.setdefault("DUPFINDER_CACHE_PATH", os.path.join(_STATE_DIR, "hash_cache.sqlite3"))
+os.environ.setdefault("DUPFINDER_CACHE_ENABLED", "0")
+os.environ.setdefault("DUPFINDER_TEXT_WARMUP", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def write_file():
+    """Write bytes to a path, creating its directory."""
+    def write(path, data: bytes) -> str:
+        path = str(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        return path
+    return write
@@ -0,0 +1,60 @@
+import asyncio
+import os
+
+from services import hash_service
+from services.extents import shared_extent_bytes
+from services.hash_service import find_exact_duplicates
+from services.scan_index import build_scan_index
+
+SIZE = 10000
+
+
+def _find(root):
+    return asyncio.run(find_exact_duplicates(str(root), index=build_scan_index(str(root))))
+
+
+def test_hardlinks_are_listed_apart_from_copies(tmp_path, write_file):
+    original = write_file(tmp_path / "a", b"x" * SIZE)
+    write_file(tmp_path / "copy", b"x" * SIZE)
+    os.link(original, tmp_path / "link")
+
+    result = _find(tmp_path)
+
+    assert len(result.duplicate_groups) == 1
+    group = result.duplicate_groups[0]
+    assert len(group.files) == 2
+    assert len(group.hardlinks) == 1
+    assert {f.name for f in group.files + group.hardlinks} == {"a", "copy", "link"}
+    assert group.recoverable_space == SIZE
+    assert result.total_duplicate_files == 1
+    assert [sorted(f.name for f in s.files) for s in result.hardlink_sets] == [["a", "link"]]
+
+
+def test_links_to_one_inode_are_not_duplicates(tmp_path, write_file):
+    original = write_file(tmp_path / "a", b"x" * SIZE)
+    os.link(original, tmp_path / "link")
+
+    result = _find(tmp_path)
+
+    assert result.duplicate_groups == []
+    assert result.recoverable_space == 0
+    assert len(result.hardlink_sets) == 1
+
+
+def test_shared_extents_are_not_recoverable(tmp_path, write_file, monkeypatch):
+    for name in ("a", "b", "c"):
+        write_file(tmp_path / name, b"y" * SIZE)
+    # As if every copy shared half its blocks with a reflink or snapshot
+    monkeypatch.setattr(hash_service, "shared_extent_bytes", lambda path, size: size // 2)
+    monkeypatch.setattr(hash_service.config, "DETECT_SHARED_EXTENTS", True)
+
+    result = _find(tmp_path)
+
+    assert result.recoverable_space == 2 * (SIZE - SIZE // 2)
+
+
+def test_shared_extent_bytes_is_bounded(tmp_path, write_file):
+    path = write_file(tmp_path / "a", b"z" * SIZE)
+    assert 0 <= shared_extent_bytes(path, SIZE) <= SIZE
+    assert shared_extent_bytes(path, 0) == 0
+    assert shared_extent_bytes(str(tmp_path / "missing"), SIZE) == 0
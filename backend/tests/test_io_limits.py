@@ -0,0 +1,102 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services import io_limits as io_module
+from services.io_limits import IOLimits, io_limits
+
+MB = 1024 * 1024
+
+
+@pytest.fixture
+def no_defaults(monkeypatch):
+    monkeypatch.setattr(io_module.config, "IO_BYTES_PER_SEC", 0)
+    monkeypatch.setattr(io_module.config, "IO_OPS_PER_SEC", 0)
+    monkeypatch.setattr(io_module.config, "IO_IDLE", False)
+    monkeypatch.setattr(io_module.config, "IO_DROP_CACHE", False)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(io_module.time, "sleep", recorded.append)
+    return recorded
+
+
+def test_zero_caps_mean_no_cap(no_defaults):
+    assert io_limits() is None
+    assert io_limits(bytes_per_sec=0, ops_per_sec=0) is None
+    assert not IOLimits(0, 0).throttled
+
+
+def test_zero_on_a_request_lifts_the_configured_cap(no_defaults, monkeypatch):
+    monkeypatch.setattr(io_module.config, "IO_BYTES_PER_SEC", 5 * MB)
+
+    assert io_limits().bytes_per_sec == 5 * MB
+    assert io_limits(bytes_per_sec=0) is None
+    assert io_limits(bytes_per_sec=MB).bytes_per_sec == MB
+
+
+@pytest.mark.parametrize("caps", [{"bytes_per_sec": -1}, {"ops_per_sec": -1}])
+def test_negative_caps_are_rejected(caps):
+    with pytest.raises(ValueError):
+        IOLimits(**caps)
+
+
+def test_unthrottled_limits_never_sleep(sleeps):
+    limits = IOLimits(idle=True)
+    for _ in range(100):
+        limits.charge(100 * MB)
+    assert sleeps == []
+
+
+def test_bandwidth_cap_sleeps_once_the_burst_is_spent(sleeps):
+    limits = IOLimits(bytes_per_sec=1000)
+
+    limits.charge(1000)
+    limits.charge(1000)
+
+    assert len(sleeps) == 1
+    assert 0.9 < sleeps[0] <= 1.0
+
+
+def test_ops_cap_counts_reads(sleeps):
+    limits = IOLimits(ops_per_sec=10)
+
+    for _ in range(10):
+        limits.charge(0)
+    limits.charge(0, ops=5)
+
+    assert len(sleeps) == 1
+    assert 0.4 < sleeps[0] <= 0.5
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.mark.parametrize("endpoint", ["/duplicates/exact", "/scan/rescan"])
+def test_endpoints_accept_zero_and_reject_negative_caps(tmp_path, write_file, client, endpoint):
+    write_file(tmp_path / "a", b"x" * 100)
+    write_file(tmp_path / "b", b"x" * 100)
+
+    for field in ("io_bytes_per_sec", "io_ops_per_sec"):
+        ok = client.post(endpoint, json={"directory_path": str(tmp_path), field: 0})
+        rejected = client.post(endpoint, json={"directory_path": str(tmp_path), field: -1})
+        assert ok.status_code == 200
+        assert rejected.status_code == 400
+
+
+def test_rescan_reads_are_charged_to_the_request_limits(tmp_path, write_file, client, monkeypatch):
+    charged = []
+    monkeypatch.setattr(IOLimits, "charge", lambda self, nbytes, ops=1: charged.append(nbytes))
+    write_file(tmp_path / "a", b"x" * 100)
+    write_file(tmp_path / "b", b"x" * 100)
+
+    response = client.post("/scan/rescan", json={"directory_path": str(tmp_path), "io_bytes_per_sec": MB})
+
+    assert response.status_code == 200
+    assert response.json()["total_duplicate_files"] == 1
+    assert sum(charged) >= 200
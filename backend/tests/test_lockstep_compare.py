@@ -0,0 +1,61 @@
+import asyncio
+import hashlib
+
+from services.hash_service import COMPARE_MIN_SIZE, compare_files, find_exact_duplicates
+from services.scan_index import build_scan_index
+
+BLOCK = 4096
+
+
+def test_compare_splits_on_a_mid_file_difference(tmp_path, write_file):
+    data = bytes(range(256)) * 64
+    changed = bytearray(data)
+    changed[len(data) // 2] ^= 0xFF
+    a = write_file(tmp_path / "a", data)
+    b = write_file(tmp_path / "b", data)
+    c = write_file(tmp_path / "c", bytes(changed))
+
+    groups, bytes_read = compare_files([a, b, c], "sha256", block_size=BLOCK)
+
+    assert groups == [(hashlib.sha256(data).hexdigest(), [a, b])]
+    # c is dropped once it diverges instead of being read to the end
+    assert bytes_read < 3 * len(data)
+
+
+def test_compare_catches_a_difference_in_the_last_byte(tmp_path, write_file):
+    data = b"q" * (3 * BLOCK + 10)
+    a = write_file(tmp_path / "a", data)
+    b = write_file(tmp_path / "b", data[:-1] + b"r")
+
+    groups, _ = compare_files([a, b], "sha256", block_size=BLOCK)
+
+    assert groups == []
+
+
+def test_compare_forks_digests_when_a_group_splits(tmp_path, write_file):
+    head = b"h" * BLOCK
+    x = head + b"x" * BLOCK
+    y = head + b"y" * BLOCK
+    paths = [write_file(tmp_path / name, data) for name, data in (("x1", x), ("y1", y), ("x2", x), ("y2", y))]
+
+    groups, _ = compare_files(paths, "sha256", block_size=BLOCK)
+
+    assert sorted(groups) == sorted([
+        (hashlib.sha256(x).hexdigest(), [paths[0], paths[2]]),
+        (hashlib.sha256(y).hexdigest(), [paths[1], paths[3]]),
+    ])
+
+
+def test_pipeline_compares_large_candidates_in_lockstep(tmp_path, write_file):
+    data = bytearray(b"\0" * COMPARE_MIN_SIZE)
+    write_file(tmp_path / "a", bytes(data))
+    write_file(tmp_path / "b", bytes(data))
+    # Away from the edge and middle blocks the earlier stages look at
+    data[COMPARE_MIN_SIZE // 4] = 1
+    write_file(tmp_path / "c", bytes(data))
+
+    result = asyncio.run(find_exact_duplicates(str(tmp_path), index=build_scan_index(str(tmp_path))))
+
+    assert "compare" in [s.stage for s in result.stage_stats]
+    assert [sorted(f.name for f in g.files) for g in result.duplicate_groups] == [["a", "b"]]
+    assert result.duplicate_groups[0].hash.startswith("sha256:")
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from models.schemas import ResultQuery
+from services import result_pages
+from services.hash_service import find_exact_groups
+from services.result_pages import CursorExpired, page_files, page_groups, stream_groups
+from services.scan_index import build_scan_index
+
+
+@pytest.fixture
+def dup_tree(tmp_path, write_file):
+    """30 groups of 2-4 copies, sized so groups sort differently by each key."""
+    for g in range(30):
+        for c in range(2 + g % 3):
+            write_file(tmp_path / f"d{c}" / f"g{g}.{'txt' if g % 2 else 'bin'}", bytes([g]) * (1000 + 37 * g))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def groups(dup_tree):
+    return asyncio.run(find_exact_groups(dup_tree, index=build_scan_index(dup_tree)))
+
+
+def _query(root, **kwargs):
+    return ResultQuery(directory_path=root, **kwargs)
+
+
+def _all_pages(kind, groups, query):
+    page, total, recoverable, cursor = page_groups(kind, groups, query)
+    pages = [page]
+    while cursor:
+        page, _, _, cursor = page_groups(kind, None, query.model_copy(update={"cursor": cursor}))
+        pages.append(page)
+    return pages, total, recoverable
+
+
+def test_pages_cover_the_full_result_in_sort_order(dup_tree, groups):
+    query = _query(dup_tree, sort_by="recoverable_space", descending=True, limit=7)
+
+    pages, total, recoverable = _all_pages("exact", groups, query)
+
+    full = groups.response()
+    paged = [g for page in pages for g in page]
+    assert [len(page) for page in pages] == [7, 7, 7, 7, 2]
+    assert total == len(full.duplicate_groups) == 30
+    assert recoverable == full.recoverable_space
+    assert sorted(g.hash for g in paged) == sorted(g.hash for g in full.duplicate_groups)
+    spaces = [g.recoverable_space for g in paged]
+    assert spaces == sorted(spaces, reverse=True)
+
+
+def test_filters_apply_to_exact_groups(dup_tree, groups):
+    query = _query(dup_tree, extensions=["txt"], min_size=1000 + 37 * 10, sort_by="files")
+
+    pages, total, _ = _all_pages("exact", groups, query)
+
+    expected = [
+        g for g in groups.response().duplicate_groups
+        if g.files[0].extension == ".txt" and g.files[0].size >= 1000 + 37 * 10
+    ]
+    paged = [g for page in pages for g in page]
+    assert total == len(expected)
+    assert sorted(g.hash for g in paged) == sorted(g.hash for g in expected)
+    assert [len(g.files) for g in paged] == sorted(len(g.files) for g in paged)
+
+
+def test_cursor_resumes_from_the_snapshot_it_was_cut_from(tmp_path, write_file):
+    for i in range(5):
+        write_file(tmp_path / f"f{i}", b"x" * (i + 1))
+    query = _query(str(tmp_path), sort_by="size", limit=2)
+    files, total, _, cursor = page_files(build_scan_index(str(tmp_path)), query)
+    write_file(tmp_path / "late", b"y")
+
+    rest, _, _, _ = page_files(None, query.model_copy(update={"cursor": cursor}))
+
+    assert total == 5
+    assert [f.size for f in files + rest] == [1, 2, 3, 4]
+
+
+def test_cursor_expires_after_ttl(dup_tree, groups, monkeypatch):
+    query = _query(dup_tree, limit=5)
+    _, _, _, cursor = page_groups("exact", groups, query)
+    monkeypatch.setattr(result_pages.config, "CURSOR_TTL", 0.05)
+    time.sleep(0.1)
+
+    with pytest.raises(CursorExpired):
+        page_groups("exact", None, query.model_copy(update={"cursor": cursor}))
+
+
+@pytest.mark.parametrize("cursor", ["garbage", "garbage.5", "{token}.x"])
+def test_invalid_cursors_are_rejected(dup_tree, groups, cursor):
+    query = _query(dup_tree, limit=5)
+    _, _, _, valid = page_groups("exact", groups, query)
+    cursor = cursor.format(token=valid.partition(".")[0])
+
+    with pytest.raises(CursorExpired):
+        page_groups("exact", None, query.model_copy(update={"cursor": cursor}))
+
+
+def test_cursor_of_another_kind_is_rejected(dup_tree, groups):
+    query = _query(dup_tree, limit=5)
+    _, _, _, cursor = page_groups("exact", groups, query)
+
+    with pytest.raises(CursorExpired):
+        page_groups("text", None, query.model_copy(update={"cursor": cursor}))
+
+
+def test_stream_yields_one_group_per_line(dup_tree, groups):
+    lines = b"".join(stream_groups(groups, _query(dup_tree, sort_by="size"))).decode().splitlines()
+
+    streamed = [json.loads(line) for line in lines]
+    assert len(streamed) == 30
+    assert [max(f["size"] for f in g["files"]) for g in streamed] == [1000 + 37 * g for g in range(30)]
+
+
+def test_expired_cursor_is_410(dup_tree, monkeypatch):
+    with TestClient(app) as client:
+        body = {"directory_path": dup_tree, "limit": 5}
+        first = client.post("/duplicates/exact/page", json=body).json()
+        monkeypatch.setattr(result_pages.config, "CURSOR_TTL", 0)
+        time.sleep(0.01)
+
+        response = client.post("/duplicates/exact/page", json=dict(body, cursor=first["next_cursor"]))
+
+    assert first["total_groups"] == 30
+    assert response.status_code == 410
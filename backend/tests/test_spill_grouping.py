@@ -0,0 +1,103 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+from services import external_sort, hash_service
+from services.external_sort import ExternalSorter
+from services.hash_service import find_exact_duplicates, hash_sorted_groups, hash_size_groups, group_by_size
+from services.scan_index import build_scan_index
+
+RECORD = np.dtype([("key", "<i8"), ("value", "<i8")])
+
+
+@pytest.fixture
+def spills(monkeypatch):
+    """Force tiny sorter buffers and count the runs spilled to disk."""
+    monkeypatch.setattr(external_sort, "MIN_BUFFER_RECORDS", 16)
+    count = [0]
+    spill = ExternalSorter._spill
+
+    def counting_spill(self):
+        count[0] += 1
+        spill(self)
+
+    monkeypatch.setattr(ExternalSorter, "_spill", counting_spill)
+    return count
+
+
+@pytest.fixture
+def linked_tree(tmp_path, write_file):
+    """Files of 50 distinct contents, most of them with extra hardlinks."""
+    root = tmp_path / "tree"
+    for i in range(400):
+        path = write_file(root / f"d{i % 7}" / f"f{i}", str(i % 50).encode() * (100 + i % 50))
+        for k in range(i % 4):
+            os.link(path, root / f"d{i % 7}" / f"f{i}_link{k}")
+    return str(root)
+
+
+def _normalize(hash_groups):
+    return sorted((h, sorted(rows)) for h, rows in hash_groups)
+
+
+def _groups(duplicate_groups):
+    return sorted(
+        (g.hash, sorted(f.path for f in g.files + g.hardlinks), len(g.files), g.recoverable_space)
+        for g in duplicate_groups
+    )
+
+
+def _link_sets(hardlink_sets):
+    return sorted(sorted(f.path for f in s.files) for s in hardlink_sets)
+
+
+def test_external_sorter_matches_in_memory_sort(tmp_path, spills):
+    rng = np.random.default_rng(0)
+    records = np.zeros(5000, dtype=RECORD)
+    records["key"] = rng.integers(0, 100, len(records))
+    records["value"] = np.arange(len(records))
+
+    with ExternalSorter(RECORD, ("key", "value"), 0, str(tmp_path)) as sorter:
+        for start in range(0, len(records), 100):
+            sorter.add(records[start:start + 100])
+        merged = list(sorter)
+
+    assert spills[0] > 1
+    assert merged == np.sort(records, order=("key", "value")).tolist()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spilled_grouping_matches_memory_with_many_hardlinks(tmp_path, linked_tree, spills):
+    index = build_scan_index(linked_tree)
+    spill_dir = tmp_path / "spill"
+    spill_dir.mkdir()
+
+    sorted_groups, _, sorted_links = asyncio.run(
+        hash_sorted_groups(index, "sha256", budget=1, temp_dir=str(spill_dir))
+    )
+    size_map = group_by_size(index)
+    memory_groups, _ = asyncio.run(
+        hash_size_groups(index, [rows for rows in size_map.values() if len(rows) >= 2], "sha256")
+    )
+
+    assert spills[0] > 0
+    assert len(sorted_groups) == 50
+    assert _normalize(sorted_groups) == _normalize(memory_groups)
+    assert _link_sets(sorted_links) == _link_sets(hash_service.find_hardlink_sets(index, size_map))
+    assert len(sorted_links) == 300
+    assert os.listdir(spill_dir) == []
+
+
+def test_budget_routes_large_trees_through_sorted_grouping(linked_tree, spills, monkeypatch):
+    index = build_scan_index(linked_tree)
+    in_memory = asyncio.run(find_exact_duplicates(linked_tree, index=index))
+    monkeypatch.setattr(hash_service.config, "GROUPING_MEMORY_BUDGET", 1)
+
+    spilled = asyncio.run(find_exact_duplicates(linked_tree, index=index))
+
+    assert spills[0] > 0
+    assert _groups(spilled.duplicate_groups) == _groups(in_memory.duplicate_groups)
+    assert spilled.recoverable_space == in_memory.recoverable_space
+    assert _link_sets(spilled.hardlink_sets) == _link_sets(in_memory.hardlink_sets)